@@ -4,13 +4,16 @@
 # from langgraph.prebuilt import create_react_agent 
 
 # 파이썬의 타입 힌팅을 위한 모듈들을 임포트합니다.
-from typing import List, Any, Optional, Tuple, Dict
+from typing import List, Any, Optional, Tuple, Dict, Callable, Awaitable, AsyncIterator, Set, TypedDict, Annotated
 # LangChain의 기본 채팅 모델 타입을 임포트합니다.
 from langchain_core.language_models import BaseChatModel 
 # LangChain의 Ollama 챗 모델 래퍼를 임포트합니다.
 from langchain_ollama import ChatOllama 
 # LangChain의 메시지 클래스(HumanMessage, AIMessage)를 임포트합니다.
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+# LangGraph의 StateGraph로 '에이전트 -> 도구 -> 에이전트' 반복 루프를 구성합니다.
+from langgraph.graph import StateGraph, START, END
 
 # FastAPI에서 HTTP 예외를 발생시키기 위해 임포트합니다.
 from fastapi import HTTPException 
@@ -20,135 +23,566 @@ import os
 import uuid 
 from datetime import datetime 
 import asyncio 
-import re # 정규 표현식 사용을 위해 임포트 (도구 호출 파싱)
+import time 
+import operator 
 
 # --- RAG(검색 증강 생성) 구현을 위한 LangChain 컴포넌트 임포트 ---
-from langchain_community.document_loaders import TextLoader 
-from langchain.text_splitter import RecursiveCharacterTextSplitter 
-from langchain_chroma import Chroma 
-from langchain_core.tools import Tool as LangChainTool 
+from langchain_core.tools import BaseTool, StructuredTool 
+from langchain_core.documents import Document 
 
 # --- 외부 모듈에서 핵심 함수들을 임포트합니다. ---
-from db import init_db, save_chat_session, load_chat_session, get_all_session_titles, delete_chat_session
-from model import load_llm_and_embedding_instance 
-from agent import file_tools # agent.py에서 파일 시스템 제어 도구들을 임포트합니다.
+from db import load_chat_session_async, append_chat_messages_async
+from history import build_history_window # 토큰 예산 기반 대화 창 + 롤링 요약
+from prompt import assemble_prompt, build_system_prompt # KV 캐시 친화적인 프롬프트 조립
+from model import load_llm_and_embedding_instance
+from ingest import DATA_DIR, CHROMA_DB_DIR, open_vectorstore, ingest, index_file_lock, get_index_state # RAG 문서 점진적 수집 (프로세스 간 파일 잠금)
+from retrieval_cache import CachedRetriever # 질문 임베딩/검색 결과 캐시
+from hybrid_retriever import HybridSearcher # BM25 + 벡터 하이브리드 검색 (RRF, 재정렬)
+from tool_calling import (supports_native_tools, mark_native_unsupported, is_tools_unsupported_error,
+                          native_tool_calls, parse_text_tool_calls, validate_tool_args,
+                          ToolCallRequest, ToolArgumentError, MUTATING_TOOLS) # 도구 호출 해석/검증
+from agent import file_tools, truncate_tool_output # agent.py에서 파일 시스템 제어 도구들과 도구 결과 크기 제한 함수를 임포트합니다.
+from coalesce import SessionLocks, SingleFlight, EventBroadcast # 세션별 턴 직렬화 + 중복 요청 병합
+from ollama_pool import ollama_pool # 여러 Ollama 서버 간 라우팅(세션 고정, 최소 부하) + 장애 조치
+from response_cache import response_cache, ResponseCacheRequest # 반복 질문 응답 캐시 (선택 사용)
+from metrics import span, record_stage, record_llm_usage, request_tag, format_trace, tool_calls_total # 단계별 시간/토큰 지표, 요청 ID
+from llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE, PRIORITY_FOLLOWUP, PRIORITY_BACKGROUND # Ollama 동시 호출 수 제한 + 우선순위 대기열
 
 # --- 전역 변수: LLM 인스턴스 및 RAG/도구 컴포넌트 관리 (싱글톤 패턴) ---
 _global_llm_instance: Optional[ChatOllama] = None 
 _global_embedding_model: Optional[Any] = None 
-_global_rag_tool: Optional[LangChainTool] = None 
-_initialization_lock = asyncio.Lock() 
+_global_rag_tool: Optional[BaseTool] = None 
+
+# --- 공유 초기화 작업과 준비 상태(readiness) ---
+# _init_tasks (변수): 컴포넌트 이름별로 진행 중이거나 끝난 초기화 태스크입니다.
+#   워밍업이 끝나기 전에 들어온 요청은 새 초기화를 시작하지 않고 이 태스크를 함께 기다립니다.
+_init_tasks: Dict[str, asyncio.Task] = {}
+# _component_status (변수): /health/ready에서 보고하는 컴포넌트별 상태입니다.
+#   status: "pending"(대기/진행 중) | "ready"(완료) | "failed"(실패)
+READINESS_COMPONENTS = ["llm", "llm_preload", "embeddings", "embeddings_preload", "rag"]
+_component_status: Dict[str, Dict[str, Any]] = {
+    name: {"status": "pending", "error": None, "duration_ms": None} for name in READINESS_COMPONENTS
+}
+
+# _global_vectorstore (변수): RAG 검색과 백그라운드 수집 작업이 함께 사용하는 ChromaDB 인스턴스입니다.
+_global_vectorstore: Optional[Any] = None
+# _global_retriever (변수): RAG 도구가 사용하는 캐시 검색기입니다. 응답 캐시의 검색 문맥 해시 계산에도 사용합니다.
+_global_retriever: Optional[CachedRetriever] = None
+# _global_index_state (변수): 이 프로세스가 마지막으로 연 벡터 저장소의 인덱스 상태 토큰(get_index_state)입니다.
+#   멀티 워커 서버에서 다른 프로세스가 수집하여 토큰이 바뀌면, 이 프로세스의 ChromaDB 메모리 인덱스를 다시 엽니다.
+_global_index_state: Optional[Tuple[int, int]] = None
+# RAG_INGEST_INTERVAL_SECONDS (변수 - 사용자 정의): 백그라운드에서 ./data 변경분을 다시 확인하는 주기(초)입니다.
+RAG_INGEST_INTERVAL_SECONDS = 60
+
+async def _run_tracked(name: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    초기화 함수를 실행하고 소요 시간과 결과를 _component_status에 기록합니다.
+    결과가 None이거나 예외가 발생하면 'failed'로 기록하고 None을 반환합니다.
+    """
+    _component_status[name].update(status="pending", error=None)
+    started = time.perf_counter()
+    try:
+        result = await factory()
+    except Exception as e:
+        print(f"[LangGraph DEBUG] ERROR initializing '{name}': {type(e).__name__} - {e}")
+        import traceback; traceback.print_exc()
+        result = None
+        _component_status[name]["error"] = f"{type(e).__name__}: {e}"
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    if result is None:
+        _component_status[name].update(status="failed", duration_ms=duration_ms)
+        _component_status[name]["error"] = _component_status[name]["error"] or "initialization returned no result"
+    else:
+        _component_status[name].update(status="ready", duration_ms=duration_ms)
+    return result
 
-# RAG 데이터 저장소 경로 설정
-DATA_DIR = "./data"
-CHROMA_DB_DIR = "./chroma_db"
+async def _shared_init(name: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    같은 컴포넌트의 초기화를 한 번만 실행하고, 동시에 들어온 호출들은 같은 태스크를 기다리게 합니다.
+    이전 시도가 실패했다면(None) 다음 호출에서 다시 시도합니다.
+    asyncio.shield로 감싸서, 기다리던 요청 하나가 취소되어도 공유 초기화는 계속 진행됩니다.
+    """
+    task = _init_tasks.get(name)
+    if task is None or (task.done() and (task.cancelled() or task.result() is None)):
+        task = asyncio.create_task(_run_tracked(name, factory))
+        _init_tasks[name] = task
+    return await asyncio.shield(task)
 
 # --- LLM 로드 함수 ---
+async def _create_llm_instance() -> Optional[ChatOllama]:
+    """LLM 클라이언트 인스턴스를 만들어 전역 변수에 저장합니다."""
+    global _global_llm_instance 
+    print("[LangGraph DEBUG] Loading LLM instance...") 
+    # model.py의 공통 설정(keep_alive, num_ctx 포함)으로 만든 백엔드 풀의 첫 번째 서버 클라이언트를 기준 LLM으로 사용합니다.
+    # 실제 호출은 _call_llm에서 ollama_pool이 서버를 골라 보냅니다.
+    llm = ollama_pool.primary.llm
+    _global_llm_instance = llm
+    print("[LangGraph DEBUG] LLM instance loaded successfully.") 
+    return llm
+
 async def _load_llm_instance() -> Optional[ChatOllama]: 
     """
     Ollama 서버에서 LLM 인스턴스를 로드하는 비동기 함수입니다.
     """
-    global _global_llm_instance 
-
     if _global_llm_instance:
         return _global_llm_instance
-    
-    async with _initialization_lock: 
-        if _global_llm_instance:
-            return _global_llm_instance
-            
-        print("[LangGraph DEBUG] Loading LLM instance...") 
-        try:
-            OLLAMA_LLM_MODEL_NAME = "aroxima/eeve-korean_instruct-10.8b-expo:latest" 
-            OLLAMA_BASE_URL = "http://localhost:11434"
-            OLLAMA_REQUEST_TIMEOUT = 120.0
-
-            llm = ChatOllama(
-                model=OLLAMA_LLM_MODEL_NAME,
-                base_url=OLLAMA_BASE_URL,
-                request_timeout=OLLAMA_REQUEST_TIMEOUT
-            )
-            _global_llm_instance = llm
-            print("[LangGraph DEBUG] LLM instance loaded successfully.") 
-            return llm
-        except Exception as e:
-            print(f"[LangGraph DEBUG] ERROR loading LLM instance: {type(e).__name__} - {e}") 
-            import traceback; traceback.print_exc() 
-            return None
-
-# --- RAG 초기화 및 도구 생성 함수 ---
-async def _initialize_rag_components() -> Optional[LangChainTool]: 
-    """
-    RAG에 필요한 구성 요소들을 초기화하고 검색 도구를 반환합니다.
-    """
-    global _global_embedding_model, _global_rag_tool 
-
-    if _global_rag_tool: 
-        return _global_rag_tool
+    return await _shared_init("llm", _create_llm_instance)
 
+# --- 임베딩 모델 로드 함수 ---
+async def _create_embedding_model() -> Optional[Any]:
+    """임베딩 모델 인스턴스를 만들어 전역 변수에 저장합니다."""
+    global _global_embedding_model
     llm_instance, embed_model_instance = await load_llm_and_embedding_instance() 
     if not embed_model_instance:
         print("[LangGraph DEBUG] ERROR: Embedding model not loaded for RAG. RAG tool will not be created.") 
         return None
     _global_embedding_model = embed_model_instance 
+    return embed_model_instance
 
-    documents = []
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        with open(os.path.join(DATA_DIR, "policy.txt"), "w", encoding="utf-8") as f:
-            f.write("회사 정책: 점심 12-1시, 퇴근 6시, 야근 시 식대 제공.")
-        with open(os.path.join(DATA_DIR, "products.txt"), "w", encoding="utf-8") as f:
-            f.write("제품: 스마트폰, 태블릿. 스마트폰은 AI 기능 탑재.")
-        print(f"[LangGraph DEBUG] Created dummy {DATA_DIR} files.") 
-    
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(DATA_DIR, filename)
-            loader = TextLoader(file_path)
-            documents.extend(loader.load())
-    
-    if not documents:
-        print("[LangGraph DEBUG] No documents found in DATA_DIR for RAG. RAG tool will not be created.") 
-        return None
-    
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
+async def _load_embedding_model() -> Optional[Any]:
+    """임베딩 모델 인스턴스를 반환합니다. (공유 초기화)"""
+    if _global_embedding_model:
+        return _global_embedding_model
+    return await _shared_init("embeddings", _create_embedding_model)
 
-    if os.path.exists(CHROMA_DB_DIR) and len(os.listdir(CHROMA_DB_DIR)) > 0:
-        print(f"[LangGraph DEBUG] Loading ChromaDB from {CHROMA_DB_DIR}...") 
-        vectorstore = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=_global_embedding_model)
-    else:
-        print(f"[LangGraph DEBUG] Creating new ChromaDB at {CHROMA_DB_DIR} and embedding documents...") 
-        vectorstore = Chroma.from_documents(documents=splits, embedding=_global_embedding_model, persist_directory=CHROMA_DB_DIR)
-        vectorstore.persist() 
+# --- RAG 초기화 및 도구 생성 함수 ---
+def _build_rag_tool(embedding_model: Any, reopen: bool = False) -> Optional[BaseTool]:
+    """
+    ChromaDB를 열고 ./data의 변경분만 반영(ingest.py)한 뒤 검색 도구를 만듭니다.
+    변경된 파일이 없으면 파일 stat 확인만 하므로 재시작 비용이 거의 없습니다.
+    멀티 워커 서버에서는 파일 잠금(index_file_lock)으로 한 프로세스만 인덱스를 만들고, 나머지는 끝나기를 기다렸다가 엽니다.
+    reopen=True이면 ChromaDB의 프로세스 내 캐시를 비우고 다시 엽니다. (다른 프로세스가 인덱스를 바꾼 경우)
+    이벤트 루프를 막지 않도록 별도 스레드에서 실행됩니다.
+    """
+    global _global_vectorstore, _global_retriever, _global_index_state
+    with index_file_lock(CHROMA_DB_DIR):
+        if not os.path.exists(DATA_DIR):
+            os.makedirs(DATA_DIR)
+            with open(os.path.join(DATA_DIR, "policy.txt"), "w", encoding="utf-8") as f:
+                f.write("회사 정책: 점심 12-1시, 퇴근 6시, 야근 시 식대 제공.")
+            with open(os.path.join(DATA_DIR, "products.txt"), "w", encoding="utf-8") as f:
+                f.write("제품: 스마트폰, 태블릿. 스마트폰은 AI 기능 탑재.")
+            print(f"[LangGraph DEBUG] Created dummy {DATA_DIR} files.") 
+
+        print(f"[LangGraph DEBUG] {'Reopening' if reopen else 'Opening'} ChromaDB at {CHROMA_DB_DIR} and ingesting changes from {DATA_DIR}...") 
+        vectorstore = open_vectorstore(embedding_model, CHROMA_DB_DIR, reopen=reopen)
+        ingest(vectorstore, DATA_DIR, CHROMA_DB_DIR)
+        _global_index_state = get_index_state(CHROMA_DB_DIR)
+    _global_vectorstore = vectorstore
     
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3}) 
+    # 벡터 검색과 BM25 키워드 검색을 RRF로 합치고 재정렬하여, 정확한 용어(제품명, 정책 번호)가 담긴 청크를 찾습니다.
+    # 같은(정규화 후 동일한) 질문은 임베딩 요청과 검색을 건너뛰도록 캐시를 거쳐 검색합니다.
+    retriever = CachedRetriever(vectorstore, k=3, searcher=HybridSearcher(vectorstore, CHROMA_DB_DIR))
+    _global_retriever = retriever
 
-    rag_tool = LangChainTool(
+    def query_knowledge_base(query: str) -> List[Document]:
+        return retriever.invoke(query)
+
+    # StructuredTool: 함수 시그니처(query: str)로 인자 스키마를 만들어 도구 호출과 인자 검증에 사용합니다.
+    rag_tool = StructuredTool.from_function(
         name="query_knowledge_base",
         description="""
         회사 정책, 제품 정보 등 로컬 지식 기반에서 답변을 찾아야 할 때 사용합니다.
         주어진 질문에 대해 가장 관련성이 높은 문서를 검색합니다.
         """,
-        func=retriever.invoke, 
+        func=query_knowledge_base, 
     )
-    _global_rag_tool = rag_tool 
-    print("[LangGraph DEBUG] RAG components initialized and tool created.") 
     return rag_tool
 
-# --- 핵심 채팅 처리 함수 (LangGraph 기반 - '도구 사용' 수동 구현) ---
-async def process_chat_request(user_message: str, current_session_id: Optional[str] = None) -> Tuple[str, str]:
+async def _create_rag_tool() -> Optional[BaseTool]:
+    """임베딩 모델을 준비한 뒤 RAG 도구를 만들어 전역 변수에 저장합니다."""
+    global _global_rag_tool
+    embedding_model = await _load_embedding_model()
+    if not embedding_model:
+        return None
+    rag_tool = await asyncio.to_thread(_build_rag_tool, embedding_model)
+    if rag_tool:
+        _global_rag_tool = rag_tool 
+        print("[LangGraph DEBUG] RAG components initialized and tool created.") 
+    return rag_tool
+
+async def _initialize_rag_components() -> Optional[BaseTool]: 
     """
-    사용자로부터 받은 채팅 메시지를 처리하고, LLM을 통해 응답을 생성하여 반환합니다.
-    세션 ID를 기반으로 대화 기록을 관리하고 SQLite DB에 저장합니다.
-    LLM이 '도구'를 사용하도록 직접 프롬프트를 구성하고 응답을 파싱하여 도구를 호출합니다.
+    RAG에 필요한 구성 요소들을 초기화하고 검색 도구를 반환합니다.
+    워밍업 중이라면 진행 중인 초기화가 끝나기를 함께 기다립니다.
+    """
+    if _global_rag_tool: 
+        return _global_rag_tool
+    return await _shared_init("rag", _create_rag_tool)
+
+# --- 시작 시 워밍업 ---
+async def _preload_llm() -> Optional[bool]:
+    """
+    아주 짧은 생성(1토큰)을 요청하여 Ollama가 LLM을 메모리에 올려 두게 합니다. (keep_alive 동안 유지)
+    백엔드 풀의 모든 서버에 동시에 요청하며, 한 서버라도 성공하면 준비된 것으로 봅니다.
+    """
+    llm = await _load_llm_instance()
+    if not llm:
+        return None
+
+    async def preload(model: Any) -> None:
+        async with llm_scheduler.slot(PRIORITY_BACKGROUND):
+            await model.model_copy(update={"num_predict": 1}).ainvoke([HumanMessage(content="안녕")])
+
+    targets = [backend.llm for backend in ollama_pool.backends] if ollama_pool.manages(llm) else [llm]
+    results = await asyncio.gather(*(preload(model) for model in targets), return_exceptions=True)
+    for model, result in zip(targets, results):
+        if isinstance(result, Exception):
+            print(f"[LangGraph DEBUG] LLM preload failed on {getattr(model, 'base_url', model)}: {type(result).__name__} - {result}")
+    if all(isinstance(result, Exception) for result in results):
+        raise results[0]
+    return True
+
+async def _preload_embeddings() -> Optional[bool]:
+    """임베딩 요청을 한 번 보내 Ollama가 임베딩 모델을 메모리에 올려 두게 합니다."""
+    embedding_model = await _load_embedding_model()
+    if not embedding_model:
+        return None
+    await asyncio.to_thread(embedding_model.embed_query, "warm-up")
+    return True
+
+async def warm_up() -> None:
+    """
+    FastAPI lifespan에서 백그라운드로 실행되는 워밍업입니다.
+    LLM 클라이언트, LLM 모델 로드, 임베딩 모델 로드, RAG 검색기 생성을 동시에 진행합니다.
+    각 단계의 결과는 get_readiness()로 확인할 수 있습니다.
+    """
+    print("[LangGraph DEBUG] Warm-up started.")
+    started = time.perf_counter()
+    await asyncio.gather(
+        _shared_init("llm_preload", _preload_llm),
+        _shared_init("embeddings_preload", _preload_embeddings),
+        _initialize_rag_components(),
+        return_exceptions=True,
+    )
+    print(f"[LangGraph DEBUG] Warm-up finished in {time.perf_counter() - started:.1f}s: "
+          f"{ {name: info['status'] for name, info in _component_status.items()} }")
+
+def get_readiness() -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+    """(모든 컴포넌트 준비 완료 여부, 컴포넌트별 상태) 튜플을 반환합니다."""
+    components = {name: dict(info) for name, info in _component_status.items()}
+    return all(info["status"] == "ready" for info in components.values()), components
+
+def _sync_rag_index() -> None:
+    """
+    백그라운드 수집 한 번입니다. (스레드에서 실행)
+    다른 프로세스(다른 서버 워커, ingest.py 명령줄)가 인덱스를 바꿨다면 벡터 저장소와 검색 도구를 다시 만들고,
+    아니면 이 프로세스가 ./data 변경분을 반영합니다. 파일 잠금 안에서 확인하므로 여러 워커가 같은 변경을 두 번 임베딩하지 않습니다.
+    """
+    global _global_rag_tool, _global_index_state
+    with index_file_lock(CHROMA_DB_DIR):
+        if get_index_state(CHROMA_DB_DIR) != _global_index_state:
+            print("[LangGraph DEBUG] RAG index changed by another process. Reopening ChromaDB.")
+            _global_rag_tool = _build_rag_tool(_global_embedding_model, reopen=True)
+            return
+        ingest(_global_vectorstore, DATA_DIR, CHROMA_DB_DIR)
+        _global_index_state = get_index_state(CHROMA_DB_DIR)
+
+async def rag_ingest_loop() -> None:
+    """
+    ./data의 변경분(추가/수정/삭제된 파일)을 주기적으로 ChromaDB에 반영하는 백그라운드 작업입니다.
+    서버를 다시 시작하지 않아도 문서 변경이 검색 결과에 반영됩니다. (변경이 없으면 stat 확인만 합니다.)
+    """
+    await _initialize_rag_components()
+    while True:
+        await asyncio.sleep(RAG_INGEST_INTERVAL_SECONDS)
+        if _global_vectorstore is None:
+            # 시작 시 RAG 초기화에 실패했다면 다시 시도합니다.
+            await _initialize_rag_components()
+            continue
+        try:
+            await asyncio.to_thread(_sync_rag_index)
+        except Exception as e:
+            print(f"[LangGraph DEBUG] ERROR in background RAG ingestion: {type(e).__name__} - {e}")
+
+# --- 스트리밍 이벤트 콜백 타입 ---
+# (이벤트 이름, 이벤트 데이터)를 받아 처리하는 비동기 함수입니다.
+# None이면 이벤트를 내보내지 않는 일반(비스트리밍) 모드로 동작합니다.
+EventEmitter = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# 클라이언트 연결이 끊긴 뒤에도 진행 중인 턴 태스크가 가비지 컬렉션되지 않도록 참조를 보관합니다.
+_background_tasks: Set[asyncio.Task] = set()
+
+# --- 동시 요청 정리 (coalesce.py) ---
+# _session_locks: 같은 세션의 턴은 도착 순서대로 하나씩 처리합니다. (대화 기록 로드 -> 응답 -> 저장이 겹치지 않도록)
+_session_locks = SessionLocks()
+# _chat_flights / _stream_flights: 같은 세션에 같은 메시지가 처리 중일 때 들어온 중복 요청(더블 클릭 재전송 등)은
+#   LLM을 다시 호출하지 않고 진행 중인 턴의 결과(스트리밍은 이벤트)를 함께 받습니다.
+_chat_flights = SingleFlight()
+_stream_flights: Dict[Tuple[str, str], EventBroadcast] = {}
+
+async def _call_llm(llm: Any, messages: List[BaseMessage], emit: Optional[EventEmitter],
+                    priority: int = PRIORITY_INTERACTIVE, session_id: Optional[str] = None,
+                    tools: Optional[List[BaseTool]] = None, stage: str = "first") -> AIMessage:
+    """
+    LLM을 호출하여 응답 메시지(AIMessage)를 반환합니다. (tools가 주어지면 bind_tools로 받은 tool_calls 포함)
+    emit 콜백이 주어지면 ChatOllama.astream으로 토큰을 받는 즉시 'token' 이벤트로 내보내고,
+    없으면 기존처럼 llm.ainvoke로 한 번에 응답을 받습니다.
+    호출은 llm_scheduler의 자리를 얻은 뒤에 보내며, 대기열이 가득 차면 429/503 HTTPException이 발생합니다.
+    보낼 Ollama 서버는 ollama_pool이 고르고(세션 고정, 최소 부하), 서버 장애 시 다른 서버로 다시 보냅니다.
+    대기열 대기 시간('llm.queue_wait'), 호출 시간('llm.<stage>'), 토큰 수와 생성 속도를 metrics에 기록합니다.
+    """
+    emitted = False
+
+    async def invoke(model: Any) -> AIMessage:
+        nonlocal emitted
+        if tools is not None:
+            model = model.bind_tools(tools)
+        if emit is None:
+            return await model.ainvoke(messages)
+
+        aggregated = None
+        async for chunk in model.astream(messages):
+            # 청크를 더하면 텍스트와 도구 호출 조각(tool_call_chunks)이 하나의 메시지로 합쳐집니다.
+            aggregated = chunk if aggregated is None else aggregated + chunk
+            text = str(chunk.content)
+            if text:
+                emitted = True
+                await emit("token", {"text": text})
+        return aggregated if aggregated is not None else AIMessage(content="")
+
+    queued = time.perf_counter()
+    async with llm_scheduler.slot(priority):
+        record_stage("llm.queue_wait", time.perf_counter() - queued)
+        with span(f"llm.{stage}"):
+            # 토큰을 이미 내보낸 뒤에 실패하면 다른 서버의 응답이 이어 붙지 않도록 장애 조치를 하지 않습니다.
+            response = await ollama_pool.call(llm, session_id, invoke, can_retry=lambda: not emitted)
+    usage = record_llm_usage(stage, getattr(response, "response_metadata", None))
+    if usage:
+        print(f"[LangGraph DEBUG] {request_tag()}LLM {stage}: {usage['prompt_tokens']:.0f} prompt + "
+              f"{usage['completion_tokens']:.0f} completion tokens"
+              + (f", {usage['tokens_per_s']:.1f} tokens/s" if "tokens_per_s" in usage else ""))
+    return response
+
+async def _execute_tool_call(tools_by_name: Dict[str, BaseTool], call: ToolCallRequest, emit: Optional[EventEmitter],
+                             timeout_s: float) -> str:
+    """
+    도구 호출 하나를 검증하고 실행하여 결과 문자열을 반환합니다.
+    해석 실패, 없는 도구, 스키마에 맞지 않는 인자, 실행 중 예외는 모두 오류 메시지로 돌려주어
+    LLM이 다음 응답에서 바로잡을 수 있게 합니다. (턴 전체를 실패시키지 않음)
+    """
+    print(f"[LangGraph DEBUG] {request_tag()}LLM requested tool call: {call.name} with args: {call.args}") 
+    if emit:
+        # 지금까지 스트리밍된 토큰은 도구 호출 지시였음을 클라이언트에 알립니다.
+        await emit("tool_call", {"id": call.id, "name": call.name, "args": call.args})
+
+    tool = tools_by_name.get(call.name)
+    if call.error:
+        tool_output = f"오류: {call.error}"
+    elif tool is None:
+        tool_output = f"오류: '{call.name}' 도구를 찾을 수 없습니다. 사용 가능한 도구: {', '.join(tools_by_name)}"
+    else:
+        outcome = "ok"
+        try:
+            tool_args = validate_tool_args(tool, call.args)
+            with span(f"tool.{call.name}"):
+                tool_output = str(await asyncio.wait_for(asyncio.to_thread(tool.invoke, tool_args), timeout_s))
+            # 도구 결과는 그대로 프롬프트에 들어가므로, 어떤 도구든 결과 크기가 한도를 넘지 않게 합니다.
+            tool_output = truncate_tool_output(tool_output)
+            print(f"[LangGraph DEBUG] {request_tag()}Tool '{call.name}' executed. Output: {tool_output[:50]}...") 
+        except ToolArgumentError as e:
+            outcome = "invalid_args"
+            tool_output = f"오류: {e}"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            tool_output = f"오류: 도구 실행 시간이 {timeout_s:.0f}초를 넘어 중단되었습니다."
+        except Exception as e:
+            outcome = "error"
+            tool_output = f"도구 실행 중 오류 발생: {type(e).__name__} - {e}"
+        tool_calls_total.inc(tool=call.name, outcome=outcome)
+    if tool_output.startswith("오류") or tool_output.startswith("도구 실행 중 오류"):
+        print(f"[LangGraph DEBUG] {request_tag()}Tool call failed: {tool_output}") 
+
+    if emit:
+        await emit("tool_result", {"id": call.id, "name": call.name, "output": tool_output})
+    return tool_output
+
+async def _execute_tool_calls(tools_by_name: Dict[str, BaseTool], calls: List[ToolCallRequest], emit: Optional[EventEmitter],
+                              timeout_s: float) -> List[str]:
     """
-    # 1. DB 초기화 (SQLite)
-    init_db() 
+    한 단계에서 요청된 도구 호출들을 실행하고, 요청 순서대로 결과를 반환합니다.
+    서로 독립적인 호출(읽기 전용 도구)은 asyncio.gather로 동시에 실행하고,
+    작업 공간을 바꾸는 도구(MUTATING_TOOLS)는 앞뒤 호출과 겹치지 않게 요청된 순서대로 실행합니다.
+    """
+    outputs: List[str] = [""] * len(calls)
+    wave: List[int] = []
+
+    async def run_wave() -> None:
+        results = await asyncio.gather(*(_execute_tool_call(tools_by_name, calls[i], emit, timeout_s) for i in wave))
+        for i, result in zip(wave, results):
+            outputs[i] = result
+        wave.clear()
+
+    for index, call in enumerate(calls):
+        if call.name in MUTATING_TOOLS:
+            await run_wave()
+            wave.append(index)
+            await run_wave()
+        else:
+            wave.append(index)
+    await run_wave()
+    return outputs
+
+# --- 에이전트 루프 (LangGraph StateGraph) ---
+# 'agent'(LLM 호출) -> 'tools'(요청된 도구들을 동시에 실행) -> 'agent' ... 를 반복하다가
+# LLM이 도구를 더 요청하지 않으면 끝납니다. 단계 수나 시간 예산을 넘으면 'finalize'에서 도구 없이 최종 답변을 받습니다.
+# AGENT_MAX_STEPS (변수 - 사용자 정의): 도구 실행 단계의 최대 횟수입니다. (한 단계에서 여러 도구를 동시에 실행)
+AGENT_MAX_STEPS = 5
+# AGENT_MAX_TOOL_CALLS_PER_STEP (변수 - 사용자 정의): 한 단계에서 실행할 도구 호출의 최대 개수입니다.
+AGENT_MAX_TOOL_CALLS_PER_STEP = 8
+# AGENT_TIME_BUDGET_S (변수 - 사용자 정의): 한 턴의 에이전트 루프에 허용하는 시간(초)입니다.
+#   예산을 넘으면 새 도구 단계를 시작하지 않고 지금까지의 결과로 최종 답변을 받습니다.
+AGENT_TIME_BUDGET_S = 120.0
+# TOOL_TIMEOUT_S (변수 - 사용자 정의): 도구 호출 하나의 최대 실행 시간(초)입니다.
+TOOL_TIMEOUT_S = 30.0
+# BUDGET_EXHAUSTED_PROMPT (변수): 예산을 넘었을 때 최종 답변을 요청하는 문구입니다.
+BUDGET_EXHAUSTED_PROMPT = (
+    "도구 사용 한도(단계 수 또는 시간)에 도달했습니다. 더 이상 도구를 호출하지 말고, "
+    "지금까지의 도구 결과만으로 최종 답변을 하십시오."
+)
+
+class AgentState(TypedDict):
+    """에이전트 루프의 상태입니다."""
+    # prompt: 고정 시스템 메시지 + 대화 기록 + 새 사용자 메시지 (루프 동안 바뀌지 않아 KV 캐시가 재사용됨)
+    prompt: List[BaseMessage]
+    # transcript: 이번 턴에서 뒤에 이어 붙는 LLM 응답과 도구 결과 메시지들
+    transcript: Annotated[List[BaseMessage], operator.add]
+    use_native_tools: bool
+    pending_calls: List[ToolCallRequest]
+    step: int
+    deadline: float
+    final_text: str
+    # tools_used: 이번 턴에서 실행한 도구 이름들 (응답 캐시 저장 여부 판단에 사용)
+    tools_used: Annotated[List[str], operator.add]
+
+def _format_text_tool_outputs(calls: List[ToolCallRequest], outputs: List[str]) -> str:
+    """텍스트 방식 도구 호출의 결과를 다음 LLM 호출에 넣을 메시지로 만듭니다."""
+    if len(calls) == 1:
+        return f"Tool Output: {outputs[0]}"
+    lines = ["Tool Output:"]
+    for index, (call, output) in enumerate(zip(calls, outputs), start=1):
+        lines.append(f"[{index}] {call.name}: {output}")
+    return "\n".join(lines)
+
+async def _agent_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """LLM을 호출하고 응답에서 도구 호출들을 해석합니다. 도구 호출이 없으면 응답이 최종 답변입니다."""
+    runtime = config["configurable"]
+    llm, tools, emit = runtime["llm"], runtime["tools"], runtime["emit"]
+    use_native_tools = state["use_native_tools"]
+    prompt = state["prompt"]
+    update: Dict[str, Any] = {}
+    # 턴의 첫 호출은 사용자가 기다리는 호출이므로 도구 실행 뒤의 후속 호출보다 먼저 처리합니다.
+    priority = PRIORITY_INTERACTIVE if state["step"] == 0 else PRIORITY_FOLLOWUP
+    stage = "first" if state["step"] == 0 else "followup"
+    print(f"[LangGraph DEBUG] {request_tag()}Agent step {state['step']}: invoking LLM ({'native' if use_native_tools else 'text'} tool calling) "
+          f"with {len(prompt) + len(state['transcript'])} messages...") 
+    try:
+        response = await _call_llm(llm, prompt + state["transcript"], emit, priority, runtime["session_id"],
+                                   tools if use_native_tools else None, stage)
+    except Exception as e:
+        if not (use_native_tools and is_tools_unsupported_error(e)):
+            raise
+        # 모델 정보와 달리 서버가 도구 호출을 거절한 경우: 이후로는 텍스트 방식을 사용합니다.
+        print(f"[LangGraph DEBUG] {request_tag()}Model rejected native tool calling. Falling back to text tool calling.") 
+        mark_native_unsupported(llm)
+        use_native_tools = False
+        prompt = [SystemMessage(content=build_system_prompt(tools))] + prompt[1:]
+        update.update(use_native_tools=False, prompt=prompt)
+        response = await _call_llm(llm, prompt + state["transcript"], emit, priority, runtime["session_id"], stage=stage)
+
+    text = str(response.content)
+    print(f"[LangGraph DEBUG] {request_tag()}Raw LLM response: {text[:100]}...") 
+    calls = native_tool_calls(response) if use_native_tools else parse_text_tool_calls(text, tools)
+    update["transcript"] = [response if use_native_tools else AIMessage(content=text)]
+    update["pending_calls"] = calls
+    if not calls:
+        update["final_text"] = text
+    return update
+
+def _route_after_agent(state: AgentState) -> str:
+    """도구 호출이 없으면 종료, 예산이 남았으면 도구 실행, 예산을 넘었으면 최종 답변 요청으로 이동합니다."""
+    if not state["pending_calls"]:
+        return END
+    if state["step"] >= AGENT_MAX_STEPS or time.monotonic() >= state["deadline"]:
+        print(f"[LangGraph DEBUG] {request_tag()}Agent budget exhausted at step {state['step']}. Asking for a final answer.") 
+        return "finalize"
+    return "tools"
+
+async def _tools_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """요청된 도구 호출들을 실행하고 결과를 transcript에 추가합니다."""
+    runtime = config["configurable"]
+    calls = state["pending_calls"]
+    runnable = calls[:AGENT_MAX_TOOL_CALLS_PER_STEP]
+    timeout_s = max(1.0, min(TOOL_TIMEOUT_S, state["deadline"] - time.monotonic()))
+    outputs = await _execute_tool_calls(runtime["tools_by_name"], runnable, runtime["emit"], timeout_s)
+    outputs += ["오류: 한 단계에서 실행할 수 있는 도구 호출 수를 넘어 실행하지 않았습니다. 필요하면 다시 요청하십시오."] * (len(calls) - len(runnable))
+    if state["use_native_tools"]:
+        # 도구 호출 ID마다 ToolMessage로 결과를 돌려줍니다.
+        messages: List[BaseMessage] = [
+            ToolMessage(content=output, tool_call_id=call.id, name=call.name) for call, output in zip(calls, outputs)
+        ]
+    else:
+        messages = [HumanMessage(content=_format_text_tool_outputs(calls, outputs))]
+    return {"transcript": messages, "pending_calls": [], "step": state["step"] + 1,
+            "tools_used": [call.name for call in runnable]}
+
+async def _finalize_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """예산을 넘었을 때, 도구 없이 지금까지의 결과만으로 최종 답변을 받습니다."""
+    runtime = config["configurable"]
+    transcript = list(state["transcript"])
+    if state["use_native_tools"]:
+        # 실행하지 않은 도구 호출에도 응답 메시지를 채워 대화 형식을 맞춥니다.
+        transcript += [ToolMessage(content="실행하지 않음 (도구 사용 한도 도달)", tool_call_id=call.id, name=call.name)
+                       for call in state["pending_calls"]]
+    messages = state["prompt"] + transcript + [HumanMessage(content=BUDGET_EXHAUSTED_PROMPT)]
+    response = await _call_llm(runtime["llm"], messages, runtime["emit"], PRIORITY_FOLLOWUP, runtime["session_id"], stage="finalize")
+    return {"final_text": str(response.content), "pending_calls": []}
+
+def _build_agent_graph():
+    """에이전트 루프 StateGraph를 만들고 컴파일합니다. (모듈 로드 시 한 번)"""
+    graph = StateGraph(AgentState)
+    graph.add_node("agent", _agent_node)
+    graph.add_node("tools", _tools_node)
+    graph.add_node("finalize", _finalize_node)
+    graph.add_edge(START, "agent")
+    graph.add_conditional_edges("agent", _route_after_agent, ["tools", "finalize", END])
+    graph.add_edge("tools", "agent")
+    graph.add_edge("finalize", END)
+    return graph.compile()
+
+_agent_graph = _build_agent_graph()
+
+# --- 핵심 채팅 처리 함수 (LangGraph StateGraph 기반 에이전트 루프) ---
+async def _run_chat_turn(user_message: str, current_session_id: Optional[str], emit: Optional[EventEmitter]) -> Tuple[str, str]:
+    """
+    채팅 한 턴을 처리하는 공통 로직입니다. process_chat_request와 process_chat_request_stream이 함께 사용합니다.
+    같은 세션의 턴은 세션 잠금으로 하나씩 처리하므로, 뒤에 온 턴은 앞 턴의 응답까지 포함된 대화 기록을 봅니다.
+    다른 세션의 턴은 서로 기다리지 않습니다.
+    """
+    session_id = current_session_id if current_session_id else str(uuid.uuid4())
+    started = time.perf_counter()
+    if _session_locks.queued(session_id):
+        print(f"[LangGraph DEBUG] {request_tag()}Session '{session_id}' is busy; turn queued behind {_session_locks.queued(session_id)} turn(s).")
+    try:
+        async with _session_locks.hold(session_id):
+            record_stage("session_lock_wait", time.perf_counter() - started)
+            return await _process_turn(user_message, session_id, emit)
+    finally:
+        # 요청 하나의 단계별 소요 시간을 한 줄로 남깁니다. (어느 단계가 느렸는지 확인용)
+        print(f"[Trace] {request_tag()}session={session_id} total={(time.perf_counter() - started) * 1000:.0f}ms {format_trace()}")
+
+async def _process_turn(user_message: str, session_id: str, emit: Optional[EventEmitter]) -> Tuple[str, str]:
+    """
+    세션 잠금을 잡은 상태에서 채팅 한 턴을 처리합니다.
+    emit 콜백이 주어지면 토큰, 도구 호출, 저장 완료 등의 진행 상황을 이벤트로 내보냅니다.
+    대화 기록은 턴이 끝난 뒤 한 번만 저장합니다.
+    """
+    # 1. DB 초기화는 server.py의 lifespan에서 한 번만 수행합니다. (db.init_db)
 
     # 2. LLM 및 RAG/파일 시스템 도구 로드/초기화
-    llm = await _load_llm_instance() 
-    rag_tool = await _initialize_rag_components() 
+    with span("init"):
+        llm = await _load_llm_instance() 
+        rag_tool = await _initialize_rag_components() 
     
     # 사용 가능한 모든 도구를 리스트로 만듭니다. (RAG 도구 + 파일 시스템 도구)
     all_tools = []
@@ -157,129 +591,188 @@ async def process_chat_request(user_message: str, current_session_id: Optional[s
     all_tools.extend(file_tools) # agent.py에서 임포트한 파일 도구들 추가
 
     if not llm:
-        print("[LangGraph DEBUG] ERROR: LLM is None. Cannot process request.") 
+        print(f"[LangGraph DEBUG] {request_tag()}ERROR: LLM is None. Cannot process request.") 
         raise HTTPException(status_code=503, detail="오류: LLM 사용 불가 (초기화 실패).")
 
-    # 3. 세션 ID 결정 및 대화 기록 로드
-    session_id = current_session_id if current_session_id else str(uuid.uuid4())
-    chat_history: List[Dict] = load_chat_session(session_id) or [] 
+    # 3. 대화 기록 로드 (세션 ID는 _run_chat_turn에서 결정)
+    chat_history: List[Dict] = await load_chat_session_async(session_id) or [] 
+
+    if emit:
+        # 새 세션인 경우에도 클라이언트가 세션 ID를 바로 알 수 있도록 먼저 알려줍니다.
+        await emit("session", {"session_id": session_id})
 
     # 4. LLM에 전달할 대화 기록 형식 준비 (LangChain 메시지 형식)
+    # 전체 기록 대신 토큰 예산 안의 최근 대화만 원문으로 보내고, 오래된 대화는 캐시된 요약으로 대체합니다.
+    with span("history_window"):
+        history_window = await build_history_window(session_id, chat_history, llm)
     lc_chat_history: List[BaseMessage] = []
-    for msg in chat_history:
+    for msg in history_window.messages:
         if msg["sender"] == "user":
             lc_chat_history.append(HumanMessage(content=msg["text"]))
         else: 
             lc_chat_history.append(AIMessage(content=msg["text"]))
-    
-    # 현재 사용자 메시지를 LangChain 형식 기록에 추가
-    lc_chat_history.append(HumanMessage(content=user_message))
 
-    # 5. 현재 사용자 메시지를 DB 저장용 기록에 추가
-    chat_history.append({"sender": "user", "text": user_message, "timestamp": datetime.now().isoformat()})
+    # 5. 현재 사용자 메시지를 DB 저장용 메시지로 준비 (턴이 끝나면 AI 응답과 함께 추가 저장)
+    user_entry = {"sender": "user", "text": user_message, "timestamp": datetime.now().isoformat()}
 
-    print(f"[LangGraph DEBUG] Processing chat request for session_id: {session_id}, message: {user_message[:30]}...") 
+    print(f"[LangGraph DEBUG] {request_tag()}Processing chat request for session_id: {session_id}, message: {user_message[:30]}...") 
     
     final_response_text = "응답 생성 실패."
     
     try:
-        # --- LLM에게 도구 사용을 지시하는 프롬프트 구성 ---
-        # LLM에게 어떤 도구들이 있고 어떻게 사용하는지 설명합니다.
-        tools_description = "\n\n사용 가능한 도구:\n"
-        for tool in all_tools:
-            tools_description += f"- {tool.name}: {tool.description}\n"
-        tools_description += "\n\n"
-        tools_description += "응답은 다음 형식으로 주십시오:\n"
-        tools_description += "Call: tool_name(param1='value1', param2='value2')\n"
-        tools_description += "Thought: 도구 사용 후 다음 단계에 대한 생각\n"
-        tools_description += "Final Answer: 최종 답변 (도구를 사용하지 않을 경우 바로 이 형식으로 응답)\n"
-        tools_description += "최종 답변만 할 경우: 최종 답변 내용\n"
-        
-        # LLM에 전달할 최종 프롬프트 (메시지 기록 + 도구 설명 + 현재 질문)
-        # 현재 사용자 메시지를 포함하는 마지막 HumanMessage의 content를 업데이트하여 도구 설명을 포함시킵니다.
-        # 기존 메시지 리스트에 영향을 주지 않도록 새로운 메시지 객체를 만듭니다.
-        prompt_with_tools = list(lc_chat_history) # 리스트 복사
-        
-        # LLM이 도구 사용을 추론할 수 있도록 도구 설명을 프롬프트에 추가
-        # (마지막 사용자 메시지에 도구 설명을 추가)
-        prompt_with_tools[-1] = HumanMessage(content=user_message + tools_description)
-
-        print(f"[LangGraph DEBUG] Invoking LLM with tools description and {len(prompt_with_tools)} messages...") 
-        
-        # 6. LLM 호출 및 응답 파싱
-        # LLM에게 도구 설명을 포함한 프롬프트를 전달합니다.
-        raw_llm_response_obj = await llm.ainvoke(prompt_with_tools)
-        raw_llm_response_content = str(raw_llm_response_obj.content)
-        print(f"[LangGraph DEBUG] Raw LLM response: {raw_llm_response_content[:100]}...") 
-
-        # --- LLM 응답 파싱 및 도구 실행 ---
-        # LLM 응답에서 'Call:' 패턴을 찾아 도구 호출을 파싱합니다.
-        tool_call_match = re.search(r"Call:\s*(\w+)\((.*)\)", raw_llm_response_content, re.DOTALL)
-        
-        if tool_call_match:
-            tool_name = tool_call_match.group(1)
-            tool_args_str = tool_call_match.group(2)
-            
-            # 파싱된 인자 문자열을 파이썬 딕셔너리로 변환
+        # --- 도구 호출 방식 결정 ---
+        # 모델이 도구 호출(tools)을 지원하면 bind_tools로 JSON 스키마를 보내고 응답의 tool_calls를 사용합니다.
+        # 지원하지 않으면 시스템 프롬프트로 'Call: ...' 형식을 안내하고 ast 기반 파서로 해석합니다.
+        with span("prompt_build"):
+            use_native_tools = await supports_native_tools(llm)
+
+            # --- 프롬프트 구성 ---
+            # 고정 시스템 메시지를 맨 앞에 두고, 대화 기록은 원문 그대로, 새 메시지는 맨 끝에 둡니다.
+            # 새 메시지 직전까지의 프롬프트가 턴마다 동일하므로 Ollama가 이전 요청의 KV 캐시를 재사용할 수 있습니다.
+            # 에이전트 루프의 LLM 호출들도 이 프롬프트 뒤에 응답/도구 결과를 이어 붙이므로 앞부분 전체가 재사용됩니다.
+            prompt_with_tools = assemble_prompt(all_tools, history_window.summary, lc_chat_history, user_message, native_tools=use_native_tools)
+
+        # --- 응답 캐시 조회 (켜져 있고, 대화 기록이 없는 첫 질문일 때만) ---
+        cache_request: Optional[ResponseCacheRequest] = None
+        cached_response: Optional[str] = None
+        if response_cache.enabled and not history_window.messages and not history_window.summary:
             try:
-                # 안전한 eval 대신 json.loads와 같은 방식을 사용하기 위해 더미 JSON 형태로 변환
-                # (eval은 보안 위험이 있으므로 실제 프로덕션에서는 사용하지 않는 것이 좋습니다.)
-                # 여기서는 테스트를 위해 eval을 사용합니다.
-                tool_args = eval(f"dict({tool_args_str})") # "param='value'" -> {'param':'value'}
+                with span("response_cache"):
+                    cache_request = await asyncio.to_thread(
+                        response_cache.build_request, user_message, str(getattr(llm, "model", type(llm).__name__)),
+                        str(prompt_with_tools[0].content), _global_retriever,
+                    )
+                    cached_response = await response_cache.lookup(cache_request)
             except Exception as e:
-                print(f"[LangGraph DEBUG] ERROR parsing tool arguments: {e}. Raw args: {tool_args_str}") # DEBUG
-                tool_args = {} # 파싱 실패 시 빈 인자로 처리
-
-            print(f"[LangGraph DEBUG] LLM requested tool call: {tool_name} with args: {tool_args}") # DEBUG
-            
-            tool_output = "도구 실행 실패 또는 찾을 수 없음."
-            found_tool_func = None
-            for tool_item in all_tools:
-                if tool_item.name == tool_name:
-                    found_tool_func = tool_item.func
-                    break
-            
-            if found_tool_func:
-                try:
-                    # 도구 함수 호출
-                    tool_output = await asyncio.to_thread(found_tool_func, **tool_args)
-                    print(f"[LangGraph DEBUG] Tool '{tool_name}' executed. Output: {tool_output[:50]}...") # DEBUG
-                    
-                    # 도구 실행 결과를 다시 LLM에게 전달하여 최종 답변을 생성하도록 합니다.
-                    # 이 과정은 LangGraph의 일반적인 에이전트 루프에서 자동으로 처리되지만,
-                    # 여기서는 수동으로 한번 더 LLM을 호출합니다.
-                    lc_chat_history.append(AIMessage(content=raw_llm_response_content)) # LLM의 도구 호출 지시
-                    lc_chat_history.append(HumanMessage(content=f"Tool Output: {tool_output}")) # 도구 실행 결과
-                    
-                    print("[LangGraph DEBUG] Invoking LLM again with tool output...") # DEBUG
-                    final_response_obj = await llm.ainvoke(lc_chat_history)
-                    final_response_text = str(final_response_obj.content)
-
-                except Exception as tool_e:
-                    tool_output = f"도구 실행 중 오류 발생: {type(tool_e).__name__} - {tool_e}"
-                    print(f"[LangGraph DEBUG] Tool execution ERROR: {tool_output}") # DEBUG
-                    final_response_text = f"죄송합니다. 도구 실행 중 오류가 발생했습니다: {tool_output}"
-            else:
-                final_response_text = f"죄송합니다. 요청하신 도구 '{tool_name}'을(를) 찾을 수 없습니다."
-
+                # 캐시 문제로 턴이 실패하지 않도록, 캐시 없이 진행합니다.
+                print(f"[LangGraph DEBUG] {request_tag()}Response cache lookup failed: {type(e).__name__} - {e}")
+                cache_request = None
+
+        if cached_response is not None:
+            final_response_text = cached_response
+            if emit:
+                await emit("token", {"text": cached_response})
         else:
-            # LLM이 도구 호출 형식에 맞게 응답하지 않았다면, 일반적인 답변으로 간주합니다.
-            print("[LangGraph DEBUG] LLM did not request a tool. Responding directly.") # DEBUG
-            final_response_text = raw_llm_response_content # LLM의 원본 응답을 최종 답변으로 사용
+            # 6. 에이전트 루프 실행 (LLM 호출 -> 도구 동시 실행 -> LLM 호출 ... 단계/시간 예산 안에서 반복)
+            with span("agent_loop"):
+                final_state = await _agent_graph.ainvoke(
+                    {
+                        "prompt": prompt_with_tools,
+                        "transcript": [],
+                        "use_native_tools": use_native_tools,
+                        "pending_calls": [],
+                        "step": 0,
+                        "deadline": time.monotonic() + AGENT_TIME_BUDGET_S,
+                        "final_text": "",
+                        "tools_used": [],
+                    },
+                    config={
+                        "configurable": {
+                            "llm": llm,
+                            "tools": all_tools,
+                            "tools_by_name": {tool_item.name: tool_item for tool_item in all_tools},
+                            "emit": emit,
+                            "session_id": session_id,
+                        },
+                        # 노드 실행 횟수 상한: agent/tools가 AGENT_MAX_STEPS번 반복 + 마지막 agent + finalize
+                        "recursion_limit": 2 * AGENT_MAX_STEPS + 4,
+                    },
+                )
+            final_response_text = final_state["final_text"] or final_response_text
+            print(f"[LangGraph DEBUG] {request_tag()}Agent loop finished after {final_state['step']} tool step(s).") 
+            if cache_request is not None and final_state["final_text"]:
+                try:
+                    await response_cache.store(cache_request, final_response_text, final_state["tools_used"])
+                except Exception as e:
+                    print(f"[LangGraph DEBUG] {request_tag()}Response cache store failed: {type(e).__name__} - {e}")
 
-        print(f"[LangGraph DEBUG] Final processed response: {final_response_text[:50]}...") 
+        print(f"[LangGraph DEBUG] {request_tag()}Final processed response: {final_response_text[:50]}...") 
         
-        # 7. AI 응답을 DB 저장용 기록에 추가
-        chat_history.append({"sender": "ai", "text": final_response_text, "timestamp": datetime.now().isoformat()})
+        # 7. AI 응답을 DB 저장용 메시지로 준비
+        ai_entry = {"sender": "ai", "text": final_response_text, "timestamp": datetime.now().isoformat()}
         
-        # 8. 현재 세션의 대화 기록을 SQLite DB에 저장/업데이트
+        # 8. 이번 턴의 사용자 메시지와 AI 응답 두 행만 SQLite DB에 추가 저장
         session_title = user_message[:30] + "..." if len(user_message) > 30 else user_message
-        save_chat_session(session_id, session_title, chat_history)
-        print(f"[LangGraph DEBUG] Session '{session_id}' chat history saved.") 
+        await append_chat_messages_async(session_id, session_title, [user_entry, ai_entry])
+        print(f"[LangGraph DEBUG] {request_tag()}Session '{session_id}' chat history saved.") 
+        if emit:
+            await emit("saved", {"session_id": session_id, "response": final_response_text, "cached": cached_response is not None})
 
         return final_response_text, session_id 
 
+    except HTTPException:
+        # LLM 대기열 초과(429/503) 등은 상태 코드와 Retry-After를 그대로 전달합니다.
+        raise
     except Exception as e: 
-        print(f"[LangGraph DEBUG] ERROR during agent invocation or response processing: {type(e).__name__} - {e}") 
+        print(f"[LangGraph DEBUG] {request_tag()}ERROR during agent invocation or response processing: {type(e).__name__} - {e}") 
         import traceback; traceback.print_exc() 
         raise HTTPException(status_code=500, detail=f"LLM 처리 중 오류: {type(e).__name__}")
+
+async def process_chat_request(user_message: str, current_session_id: Optional[str] = None) -> Tuple[str, str]:
+    """
+    사용자로부터 받은 채팅 메시지를 처리하고, LLM을 통해 응답을 생성하여 반환합니다.
+    세션 ID를 기반으로 대화 기록을 관리하고 SQLite DB에 저장합니다.
+    LLM이 '도구'를 사용하도록 직접 프롬프트를 구성하고 응답을 파싱하여 도구를 호출합니다.
+    같은 세션에 같은 메시지가 처리 중이면 새 턴을 만들지 않고 그 결과를 함께 반환합니다.
+    (세션 ID가 없는 요청은 매번 새 세션이므로 병합하지 않습니다.)
+    """
+    if not current_session_id:
+        return await _run_chat_turn(user_message, None, None)
+    result, shared = await _chat_flights.do(
+        (current_session_id, user_message),
+        lambda: _run_chat_turn(user_message, current_session_id, None),
+    )
+    if shared:
+        print(f"[LangGraph DEBUG] {request_tag()}Duplicate request for session '{current_session_id}' coalesced with in-flight turn.")
+    return result
+
+async def process_chat_job(user_message: str, session_id: str, emit: Optional[EventEmitter] = None) -> Tuple[str, str]:
+    """
+    백그라운드 작업(jobs.py)의 채팅 턴을 처리합니다. 작업마다 한 번만 실행되어야 하므로 중복 요청 병합을 하지 않습니다.
+    작업을 만들 때 정한 session_id를 그대로 사용하며, emit으로 스트리밍과 같은 이벤트를 내보냅니다.
+    """
+    return await _run_chat_turn(user_message, session_id, emit)
+
+async def process_chat_request_stream(user_message: str, current_session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    process_chat_request의 스트리밍 버전입니다.
+    {"event": 이름, "data": dict} 형태의 이벤트를 발생 순서대로 내보냅니다.
+    이벤트 종류: session, token, tool_call, tool_result, saved, error
+    클라이언트 연결이 끊겨도 턴 처리는 끝까지 진행되어 대화 기록이 저장됩니다.
+    같은 세션에 같은 메시지가 처리 중이면 그 턴의 이벤트를 처음부터 함께 받습니다.
+    """
+    key = (current_session_id, user_message) if current_session_id else None
+    broadcast = _stream_flights.get(key) if key else None
+    if broadcast is not None:
+        print(f"[LangGraph DEBUG] {request_tag()}Duplicate stream request for session '{current_session_id}' coalesced with in-flight turn.")
+    else:
+        broadcast = EventBroadcast()
+
+        async def emit(event: str, data: Dict[str, Any]) -> None:
+            broadcast.publish({"event": event, "data": data})
+
+        async def run_turn() -> None:
+            try:
+                await _run_chat_turn(user_message, current_session_id, emit)
+            except HTTPException as e:
+                data = {"status_code": e.status_code, "detail": e.detail}
+                if e.headers and "Retry-After" in e.headers:
+                    data["retry_after"] = int(e.headers["Retry-After"])
+                broadcast.publish({"event": "error", "data": data})
+            except Exception as e:
+                print(f"[LangGraph DEBUG] {request_tag()}ERROR in streaming chat turn: {type(e).__name__} - {e}")
+                broadcast.publish({"event": "error", "data": {"status_code": 500, "detail": f"LLM 처리 중 오류: {type(e).__name__}"}})
+            finally:
+                broadcast.close()
+                if key and _stream_flights.get(key) is broadcast:
+                    del _stream_flights[key]
+
+        if key:
+            _stream_flights[key] = broadcast
+        # 스트림 소비 속도와 관계없이 턴이 끝까지 진행되도록 별도 태스크로 실행합니다.
+        turn_task = asyncio.create_task(run_turn())
+        _background_tasks.add(turn_task)
+        turn_task.add_done_callback(_background_tasks.discard)
+
+    async for item in broadcast.subscribe():
+        yield item
@@ -6,13 +6,25 @@
 import os
 # from (키워드): 특정 모듈(라이브러리) 안에서 특정 부분(클래스, 함수 등)만 선택적으로 가져올 때 사용합니다.
 # langchain_core.tools (모듈): LangChain 라이브러리에서 도구 관련 기능을 제공하는 모듈입니다.
-# Tool (클래스): LangChain 라이브러리에서 제공하는 '도구'를 정의하는 클래스입니다.
+# StructuredTool (클래스): LangChain 라이브러리에서 제공하는 '도구'를 정의하는 클래스입니다.
 #                저희가 만든 파이썬 함수를 LLM 에이전트가 사용할 수 있는 형태로 포장합니다.
-from langchain_core.tools import Tool as LangChainTool
+#                함수의 매개변수(이름, 타입, 기본값)로 인자 스키마(JSON 스키마)를 자동으로 만들어,
+#                LLM의 도구 호출(bind_tools)과 인자 검증에 사용됩니다.
+from langchain_core.tools import StructuredTool
+# re (모듈): 정규 표현식으로 파일 내용에서 검색어를 찾을 때 사용합니다. (search_workspace)
+import re
+# fnmatch (모듈): '*.py' 같은 glob 패턴으로 파일 이름을 걸러낼 때 사용합니다. (list_workspace)
+import fnmatch
+# time (모듈): 파일 수정 시각을 읽기 쉬운 형식으로 바꿀 때 사용합니다.
+import time
 # typing (모듈): 파이썬에서 변수나 함수의 입/출력 데이터 '타입'을 명시하는 기능을 제공하는 모듈입니다.
 # List (타입): '이 변수는 여러 항목을 담는 목록(리스트)이야'라고 알려줍니다.
 # Any (타입): '이 변수는 어떤 종류의 데이터든 될 수 있어'라고 알려줍니다.
-from typing import List, Any
+# Optional (타입): '이 변수는 지정된 타입이거나 None(값이 없음)일 수 있어'라고 알려줍니다.
+# Iterator (타입): 파일을 조각(chunk) 단위로 읽으며 한 줄씩 넘겨주는 제너레이터의 타입입니다.
+from typing import List, Any, Optional, Iterator, Tuple
+# WorkspaceIndex (클래스 - 사용자 정의): 작업 공간 파일 트리를 메모리에 캐시하는 인덱스입니다. (workspace_index.py)
+from workspace_index import WorkspaceIndex, WorkspaceEntry
 
 # --- 에이전트 작업 공간(Workspace) 설정 ---
 # AGENT_WORKSPACE_DIR (변수 - 사용자 정의):
@@ -23,6 +35,33 @@ from typing import List, Any
 # 이 디렉토리가 MCP 파일 시스템 서버가 관리하는 특정 경로와 연결될 수 있습니다.
 AGENT_WORKSPACE_DIR = "./agent_workspace"
 
+# --- 도구 출력/파일 크기 제한 설정값 정의 ---
+# 도구 결과는 그대로 LLM 프롬프트에 들어가므로, 파일이 아무리 커도 결과 크기가 일정한 한도를 넘지 않게 합니다.
+# TOOL_OUTPUT_MAX_BYTES (변수 - 사용자 정의): 도구 결과 하나의 최대 크기(UTF-8 바이트)입니다. 넘으면 잘라내고 표시를 붙입니다.
+TOOL_OUTPUT_MAX_BYTES = 16 * 1024
+# READ_FILE_DEFAULT_BYTES (변수 - 사용자 정의): read_file이 한 번에 읽는 기본 크기(바이트)입니다.
+READ_FILE_DEFAULT_BYTES = 8 * 1024
+# READ_FILE_DEFAULT_LINES (변수 - 사용자 정의): read_file에 시작 줄만 주었을 때 읽는 줄 수입니다.
+READ_FILE_DEFAULT_LINES = 200
+# WRITE_MAX_BYTES (변수 - 사용자 정의): create_file/append_file 한 번에 쓸 수 있는 최대 크기(바이트)입니다.
+#   더 긴 내용은 append_file을 여러 번 호출해 나누어 씁니다.
+WRITE_MAX_BYTES = 1024 * 1024
+# WORKSPACE_FILE_MAX_BYTES (변수 - 사용자 정의): append_file로 키울 수 있는 파일 하나의 최대 크기(바이트)입니다.
+WORKSPACE_FILE_MAX_BYTES = 100 * 1024 * 1024
+# SEARCH_MAX_MATCHES (변수 - 사용자 정의): search_workspace가 돌려주는 최대 일치 줄 수입니다.
+SEARCH_MAX_MATCHES = 50
+# SEARCH_MAX_LINE_CHARS (변수 - 사용자 정의): 검색 결과에 보여줄 한 줄의 최대 글자 수입니다.
+SEARCH_MAX_LINE_CHARS = 300
+# SEARCH_CHUNK_BYTES (변수 - 사용자 정의): 파일을 검색할 때 한 번에 읽는 조각 크기(바이트)입니다. (메모리 사용량의 상한)
+SEARCH_CHUNK_BYTES = 1024 * 1024
+# SEARCH_MAX_SCAN_BYTES (변수 - 사용자 정의): 검색 한 번에 읽을 최대 총 바이트 수입니다. 넘으면 검색을 멈추고 표시를 붙입니다.
+SEARCH_MAX_SCAN_BYTES = 256 * 1024 * 1024
+# LIST_WORKSPACE_DEFAULT_LIMIT / LIST_WORKSPACE_MAX_LIMIT (변수 - 사용자 정의): list_workspace 한 페이지의 기본/최대 항목 수입니다.
+LIST_WORKSPACE_DEFAULT_LIMIT = 100
+LIST_WORKSPACE_MAX_LIMIT = 500
+# _OUTPUT_MARGIN_BYTES (변수): 결과의 머리말/잘림 표시를 위해 본문 한도에서 남겨 두는 크기(바이트)입니다.
+_OUTPUT_MARGIN_BYTES = 512
+
 # if (조건문): 특정 '조건'이 참(True)일 때만 특정 코드 블록을 실행하도록 합니다.
 # not (키워드): '조건'의 결과를 반대로 만듭니다. (참이면 거짓으로, 거짓이면 참으로)
 # os.path.exists (함수 - 파이썬 내장/모듈 함수): 지정된 경로의 파일이나 폴더가 '존재하는지' 확인하여 참/거짓을 반환합니다.
@@ -32,6 +71,10 @@ if not os.path.exists(AGENT_WORKSPACE_DIR):
     # print (함수 - 파이썬 내장): 디버깅 메시지를 콘솔에 출력합니다.
     print(f"[AgentTools DEBUG] Created agent workspace directory: {AGENT_WORKSPACE_DIR}")
 
+# workspace_index (변수 - 사용자 정의): 작업 공간 트리 인덱스 (모듈 전역, 프로세스당 하나)
+# 파일을 만들거나 바꾸거나 지우는 도구는 성공한 뒤 workspace_index.invalidate()를 호출합니다.
+workspace_index = WorkspaceIndex(AGENT_WORKSPACE_DIR)
+
 # def (키워드): 새로운 '함수(Function)'를 정의할 때 사용하는 키워드입니다.
 # _get_safe_path (함수 - 사용자 정의): 함수 이름입니다. (관례적으로 '_'로 시작하는 함수는 내부용으로 사용됩니다.)
 # file_path (매개변수): 함수가 외부로부터 받는 입력 값입니다.
@@ -57,6 +100,44 @@ def _get_safe_path(file_path: str) -> str:
         raise ValueError(f"'{file_path}' is outside the allowed agent workspace.")
     return abs_path
 
+# truncate_tool_output (함수 - 사용자 정의): 도구 결과가 한도를 넘으면 잘라내고 잘림 표시를 붙입니다.
+def truncate_tool_output(text: str, max_bytes: int = TOOL_OUTPUT_MAX_BYTES, hint: str = "") -> str:
+    """
+    text의 UTF-8 크기가 max_bytes 이하이면 그대로, 넘으면 앞부분만 남기고 잘림 표시를 붙여 반환합니다.
+    hint를 주면 잘림 표시에 덧붙입니다. (예: 나머지를 읽는 방법)
+    """
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    # errors="ignore": 잘린 위치가 한 글자(여러 바이트)의 중간이면 그 글자를 버립니다.
+    kept = data[:max_bytes].decode("utf-8", errors="ignore")
+    return f"{kept}\n...[잘림: 전체 {len(data)}바이트 중 앞 {max_bytes}바이트만 표시했습니다.{' ' + hint if hint else ''}]"
+
+# _decode_utf8_range (함수 - 사용자 정의): 파일 중간에서 읽은 바이트를 글자 경계에 맞춰 문자열로 바꾸는 내부용 함수입니다.
+def _decode_utf8_range(data: bytes, at_start: bool, at_end: bool) -> Tuple[str, int, int]:
+    """
+    앞쪽의 이어지는 바이트(이전 글자의 나머지)와 뒤쪽의 완성되지 않은 글자를 잘라내고 디코딩합니다.
+    (문자열, 앞에서 버린 바이트 수, 뒤에서 버린 바이트 수)를 반환합니다.
+    """
+    head = 0
+    if not at_start:
+        # UTF-8에서 0b10xxxxxx 바이트는 글자의 첫 바이트가 아닙니다. (최대 3바이트)
+        while head < min(3, len(data)) and data[head] & 0xC0 == 0x80:
+            head += 1
+    tail = 0
+    if not at_end:
+        # 마지막 글자의 첫 바이트를 찾아, 그 글자를 완성할 바이트가 모자라면 잘라냅니다.
+        for back in range(1, min(4, len(data) - head) + 1):
+            byte = data[-back]
+            if byte & 0xC0 == 0x80:
+                continue
+            needed = 2 if byte & 0xE0 == 0xC0 else 3 if byte & 0xF0 == 0xE0 else 4 if byte & 0xF8 == 0xF0 else 1
+            if needed > back:
+                tail = back
+            break
+    text = data[head:len(data) - tail].decode("utf-8", errors="replace")
+    return text, head, tail
+
 def create_file(file_path: str, content: str = "") -> str: # create_file (함수 - 사용자 정의)
     """
     지정된 경로에 새로운 텍스트 파일을 생성하거나 기존 파일을 덮어씁니다.
@@ -65,37 +146,252 @@ def create_file(file_path: str, content: str = "") -> str: # create_file (함수
     # try (키워드): 특정 코드 블록을 실행해보고, 오류(예외)가 발생하면 except 블록으로 넘어갑니다.
     try:
         safe_path = _get_safe_path(file_path) # _get_safe_path (함수) 호출: 안전한 경로를 확인합니다.
+        # 한 번에 쓸 수 있는 크기를 넘으면 쓰지 않습니다. (큰 내용은 append_file로 나누어 씁니다.)
+        size = len(content.encode("utf-8"))
+        if size > WRITE_MAX_BYTES:
+            return (f"오류: 내용이 {size}바이트로 한 번에 쓸 수 있는 크기({WRITE_MAX_BYTES}바이트)를 넘습니다. "
+                    f"앞부분을 create_file로 쓰고 나머지는 append_file로 나누어 추가하십시오.")
         # os.makedirs (함수 - 파이썬 내장/모듈 함수): 파일이 저장될 상위 디렉토리가 없으면 자동으로 생성합니다.
         # exist_ok=True (매개변수): 폴더가 이미 존재해도 오류를 발생시키지 않습니다.
         os.makedirs(os.path.dirname(safe_path), exist_ok=True) 
         # open (함수 - 파이썬 내장): 파일을 쓰기 모드('w')로 열고 내용을 작성합니다. (UTF-8 인코딩 사용)
         with open(safe_path, "w", encoding="utf-8") as f:
             f.write(content)
+        workspace_index.invalidate()
         return f"파일 '{file_path}'이(가) 성공적으로 생성/수정되었습니다."
     except ValueError as e: # ValueError (예외 - 파이썬 내장): _get_safe_path에서 발생한 오류를 잡습니다.
         return f"오류: {e}"
     except Exception as e: # Exception (예외 - 파이썬 내장): 그 외 발생할 수 있는 모든 오류를 잡습니다.
         return f"파일 생성/수정 중 오류 발생: {type(e).__name__} - {e}"
 
-def read_file(file_path: str) -> str: # read_file (함수 - 사용자 정의)
+# offset / length (매개변수): 읽기 시작할 바이트 위치와 읽을 바이트 수.
+# start_line / end_line (매개변수): 읽을 줄 범위(1부터 시작, end_line 포함). start_line을 주면 바이트 범위 대신 사용합니다.
+def read_file(file_path: str, offset: int = 0, length: int = READ_FILE_DEFAULT_BYTES,
+              start_line: Optional[int] = None, end_line: Optional[int] = None) -> str: # read_file (함수 - 사용자 정의)
     """
-    지정된 경로의 텍스트 파일 내용을 읽어 반환합니다.
+    지정된 경로의 텍스트 파일 일부를 읽어 반환합니다. 파일 전체를 메모리에 올리지 않습니다.
+    - 바이트 범위: offset 위치부터 length바이트(최대 TOOL_OUTPUT_MAX_BYTES)를 읽습니다.
+    - 줄 범위: start_line부터 end_line까지(기본 READ_FILE_DEFAULT_LINES줄) 줄 번호를 붙여 읽습니다.
+    뒤에 더 읽을 내용이 있으면 다음 부분을 읽는 방법을 결과 끝에 표시합니다.
     파일은 AGENT_WORKSPACE_DIR 내부에 있어야 합니다.
     """
     try:
         safe_path = _get_safe_path(file_path) # _get_safe_path (함수) 호출
-        # os.path.exists (함수 - 파이썬 내장/모듈 함수): 파일이 존재하는지 확인합니다.
-        if not os.path.exists(safe_path):
+        # os.path.isfile (함수 - 파이썬 내장/모듈 함수): 파일이 존재하는지 확인합니다.
+        if not os.path.isfile(safe_path):
             return f"오류: 파일 '{file_path}'이(가) 존재하지 않습니다."
-        # open (함수 - 파이썬 내장): 파일을 읽기 모드('r')로 열고 내용을 읽어옵니다.
-        with open(safe_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return f"파일 '{file_path}' 내용:\n{content}"
+        file_size = os.path.getsize(safe_path)
+        if start_line is not None:
+            return _read_lines(file_path, safe_path, file_size, start_line, end_line)
+
+        if offset < 0 or offset > file_size:
+            return f"오류: offset({offset})이 파일 크기({file_size}바이트) 범위를 벗어났습니다."
+        length = max(1, min(length, TOOL_OUTPUT_MAX_BYTES - _OUTPUT_MARGIN_BYTES))
+        # open (함수 - 파이썬 내장): 바이너리 모드('rb')로 열고, 필요한 위치로 이동(seek)해서 필요한 만큼만 읽습니다.
+        with open(safe_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        end = offset + len(data)
+        content, head, tail = _decode_utf8_range(data, at_start=offset == 0, at_end=end >= file_size)
+        start, end = offset + head, end - tail
+        header = f"파일 '{file_path}' 내용 (바이트 {start}-{end} / 전체 {file_size}바이트):"
+        if end < file_size:
+            footer = (f"\n...[잘림: {file_size - end}바이트가 더 있습니다. "
+                      f"read_file(file_path='{file_path}', offset={end})로 이어서 읽으십시오.]")
+        else:
+            footer = ""
+        return f"{header}\n{content}{footer}"
     except ValueError as e: # ValueError (예외 - 파이썬 내장)
         return f"오류: {e}"
     except Exception as e: # Exception (예외 - 파이썬 내장)
         return f"파일 읽기 중 오류 발생: {type(e).__name__} - {e}"
 
+# _read_lines (함수 - 사용자 정의): read_file의 줄 범위 읽기를 처리하는 내부용 함수입니다.
+def _read_lines(file_path: str, safe_path: str, file_size: int, start_line: int, end_line: Optional[int]) -> str:
+    """start_line~end_line 줄을 앞에서부터 한 줄씩 읽어 줄 번호와 함께 반환합니다. (결과 크기는 TOOL_OUTPUT_MAX_BYTES 이하)"""
+    if start_line < 1 or (end_line is not None and end_line < start_line):
+        return "오류: start_line은 1 이상이고 end_line은 start_line 이상이어야 합니다."
+    if end_line is None:
+        end_line = start_line + READ_FILE_DEFAULT_LINES - 1
+    lines: List[str] = []
+    used = 0
+    last_line = start_line - 1
+    more = False
+    # errors="replace": 잘못된 바이트가 있어도 읽기를 멈추지 않습니다. 파일 객체의 줄 단위 반복은 버퍼로 조금씩 읽습니다.
+    with open(safe_path, "r", encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(_iter_lines(f), start=1):
+            if number < start_line:
+                continue
+            if number > end_line:
+                more = True
+                break
+            entry = f"{number}| {line}"
+            size = len(entry.encode("utf-8")) + 1
+            if used + size > TOOL_OUTPUT_MAX_BYTES - _OUTPUT_MARGIN_BYTES:
+                if not lines:
+                    # 한 줄이 한도보다 길면 그 줄의 앞부분만 보여줍니다.
+                    lines.append(truncate_tool_output(entry, TOOL_OUTPUT_MAX_BYTES - 2 * _OUTPUT_MARGIN_BYTES))
+                    last_line = number
+                more = True
+                break
+            lines.append(entry)
+            used += size
+            last_line = number
+    if not lines:
+        return f"오류: 파일 '{file_path}'에 {start_line}번째 줄이 없습니다."
+    header = f"파일 '{file_path}' 내용 ({start_line}-{last_line}행, 전체 {file_size}바이트):"
+    footer = ""
+    if more:
+        footer = (f"\n...[잘림: 뒤에 내용이 더 있습니다. "
+                  f"read_file(file_path='{file_path}', start_line={last_line + 1})로 이어서 읽으십시오.]")
+    return header + "\n" + "\n".join(lines) + footer
+
+# _iter_lines (함수 - 사용자 정의): 텍스트 파일을 한 줄씩 돌려주는 내부용 제너레이터입니다.
+def _iter_lines(f: Any) -> Iterator[str]:
+    """
+    줄바꿈 없이 아주 긴 줄이 있어도 메모리를 많이 쓰지 않도록, 한 줄을 최대 TOOL_OUTPUT_MAX_BYTES글자까지만 읽고
+    나머지는 건너뜁니다. (줄바꿈 문자는 제거하고 돌려줍니다.)
+    """
+    while True:
+        line = f.readline(TOOL_OUTPUT_MAX_BYTES)
+        if not line:
+            return
+        if not line.endswith("\n"):
+            # 한도까지 읽었는데 줄이 끝나지 않았다면 줄의 나머지를 조각 단위로 버립니다.
+            while True:
+                rest = f.readline(SEARCH_CHUNK_BYTES)
+                if not rest or rest.endswith("\n"):
+                    break
+        yield line.rstrip("\r\n")
+
+def append_file(file_path: str, content: str) -> str: # append_file (함수 - 사용자 정의)
+    """
+    지정된 파일 끝에 내용을 덧붙입니다. 파일이 없으면 새로 만듭니다.
+    큰 내용을 여러 번에 나누어 쓸 때 사용합니다. (한 번에 WRITE_MAX_BYTES 이하, 파일은 WORKSPACE_FILE_MAX_BYTES 이하)
+    파일은 AGENT_WORKSPACE_DIR 내부에만 생성/수정될 수 있습니다.
+    """
+    try:
+        safe_path = _get_safe_path(file_path)
+        data = content.encode("utf-8")
+        if len(data) > WRITE_MAX_BYTES:
+            return (f"오류: 내용이 {len(data)}바이트로 한 번에 쓸 수 있는 크기({WRITE_MAX_BYTES}바이트)를 넘습니다. "
+                    f"더 작게 나누어 여러 번 호출하십시오.")
+        current_size = os.path.getsize(safe_path) if os.path.isfile(safe_path) else 0
+        if current_size + len(data) > WORKSPACE_FILE_MAX_BYTES:
+            return (f"오류: 추가하면 파일 크기가 {current_size + len(data)}바이트로 "
+                    f"최대 크기({WORKSPACE_FILE_MAX_BYTES}바이트)를 넘습니다.")
+        os.makedirs(os.path.dirname(safe_path), exist_ok=True)
+        # open (함수 - 파이썬 내장): 추가 모드('ab')로 열어 기존 내용을 읽지 않고 끝에 씁니다.
+        with open(safe_path, "ab") as f:
+            f.write(data)
+        workspace_index.invalidate()
+        return f"파일 '{file_path}'에 {len(data)}바이트를 추가했습니다. (현재 {current_size + len(data)}바이트)"
+    except ValueError as e:
+        return f"오류: {e}"
+    except Exception as e:
+        return f"파일 추가 중 오류 발생: {type(e).__name__} - {e}"
+
+# _iter_file_lines (함수 - 사용자 정의): 바이너리 파일을 조각 단위로 읽어 (줄 번호, 줄 바이트)를 돌려주는 내부용 제너레이터입니다.
+def _iter_file_lines(f: Any, budget: List[int]) -> Iterator[Tuple[int, bytes]]:
+    """
+    SEARCH_CHUNK_BYTES씩 읽으므로 파일 크기와 관계없이 메모리 사용량이 일정합니다.
+    줄바꿈 없이 조각보다 긴 줄은 조각 크기로 나누어 같은 줄 번호로 돌려줍니다.
+    budget[0]은 남은 읽기 허용량(바이트)이며, 다 쓰면 읽기를 멈춥니다.
+    """
+    number = 1
+    pending = b""
+    while budget[0] > 0:
+        chunk = f.read(min(SEARCH_CHUNK_BYTES, budget[0]))
+        if not chunk:
+            break
+        budget[0] -= len(chunk)
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield number, line
+            number += 1
+        while len(pending) > SEARCH_CHUNK_BYTES:
+            # 같은 줄 번호로 조각 단위로 나누어 검사합니다. (조각 경계에 걸친 일치는 놓칠 수 있음)
+            yield number, pending[:SEARCH_CHUNK_BYTES]
+            pending = pending[SEARCH_CHUNK_BYTES:]
+    if pending:
+        yield number, pending
+
+# search_workspace (함수 - 사용자 정의): 작업 공간의 파일들에서 검색어가 들어간 줄을 찾습니다.
+# pattern (매개변수): 찾을 문자열. regex=True이면 정규 표현식으로 해석합니다.
+# path (매개변수): 검색할 파일 또는 폴더. 폴더이면 하위 폴더의 모든 파일을 검색합니다.
+def search_workspace(pattern: str, path: str = ".", regex: bool = False, ignore_case: bool = False,
+                     max_matches: int = SEARCH_MAX_MATCHES) -> str:
+    """
+    파일을 조각 단위로 읽으며 검색하므로 큰 파일도 메모리에 한 번에 올리지 않습니다.
+    일치한 줄을 '파일경로:줄번호: 내용' 형식으로 최대 max_matches개(최대 SEARCH_MAX_MATCHES개) 반환합니다.
+    바이너리 파일(NUL 바이트 포함)은 건너뜁니다. 검색 범위는 AGENT_WORKSPACE_DIR 내부로 제한됩니다.
+    """
+    try:
+        if not pattern:
+            return "오류: 검색어(pattern)가 비어 있습니다."
+        safe_path = _get_safe_path(path)
+        if not os.path.exists(safe_path):
+            return f"오류: '{path}'이(가) 존재하지 않습니다."
+        max_matches = max(1, min(max_matches, SEARCH_MAX_MATCHES))
+        source = pattern.encode("utf-8") if regex else re.escape(pattern.encode("utf-8"))
+        try:
+            compiled = re.compile(source, re.IGNORECASE if ignore_case else 0)
+        except re.error as e:
+            return f"오류: 잘못된 정규 표현식입니다: {e}"
+
+        base_path = os.path.abspath(AGENT_WORKSPACE_DIR)
+        if os.path.isfile(safe_path):
+            targets = [safe_path]
+        else:
+            # 폴더는 디렉토리를 다시 훑지 않고 작업 공간 인덱스의 파일 목록을 사용합니다.
+            targets = [os.path.join(base_path, entry.path) for entry in workspace_index.files(_workspace_relative(safe_path))]
+        matches: List[str] = []
+        used = 0
+        budget = [SEARCH_MAX_SCAN_BYTES]
+        files_scanned = 0
+        stopped = ""
+        for target in targets:
+            if stopped or budget[0] <= 0:
+                break
+            relative = os.path.relpath(target, base_path)
+            with open(target, "rb") as f:
+                # 앞부분에 NUL 바이트가 있으면 바이너리 파일로 보고 건너뜁니다.
+                if b"\0" in f.read(8192):
+                    continue
+                f.seek(0)
+                files_scanned += 1
+                for number, line in _iter_file_lines(f, budget):
+                    found = compiled.search(line)
+                    if not found:
+                        continue
+                    if len(line) > SEARCH_MAX_LINE_CHARS:
+                        # 긴 줄은 일치한 위치 주변만 보여줍니다.
+                        start = max(0, found.start() - SEARCH_MAX_LINE_CHARS // 2)
+                        text, _, _ = _decode_utf8_range(line[start:start + SEARCH_MAX_LINE_CHARS * 2], start == 0, False)
+                        text = ("…" if start else "") + text[:SEARCH_MAX_LINE_CHARS] + "…"
+                    else:
+                        text = line.decode("utf-8", errors="replace").rstrip("\r")
+                    entry = f"{relative}:{number}: {text}"
+                    size = len(entry.encode("utf-8")) + 1
+                    if len(matches) >= max_matches or used + size > TOOL_OUTPUT_MAX_BYTES - _OUTPUT_MARGIN_BYTES:
+                        stopped = (f"\n...[잘림: 일치 결과가 더 있을 수 있습니다. 처음 {len(matches)}개만 표시했습니다. "
+                                   f"검색어나 path를 좁혀 다시 검색하십시오.]")
+                        break
+                    matches.append(entry)
+                    used += size
+        if budget[0] <= 0 and not stopped:
+            stopped = f"\n...[잘림: 검색 한도({SEARCH_MAX_SCAN_BYTES}바이트)까지만 읽었습니다. path를 좁혀 다시 검색하십시오.]"
+        if not matches:
+            return f"'{pattern}'과(와) 일치하는 줄이 없습니다. (파일 {files_scanned}개 검색){stopped}"
+        header = f"'{pattern}' 검색 결과 {len(matches)}건 (파일 {files_scanned}개 검색):"
+        return header + "\n" + "\n".join(matches) + stopped
+    except ValueError as e:
+        return f"오류: {e}"
+    except Exception as e:
+        return f"검색 중 오류 발생: {type(e).__name__} - {e}"
+
 def delete_file(file_path: str) -> str: # delete_file (함수 - 사용자 정의)
     """
     지정된 경로의 파일을 삭제합니다.
@@ -108,36 +404,98 @@ def delete_file(file_path: str) -> str: # delete_file (함수 - 사용자 정의
             return f"오류: 파일 '{file_path}'이(가) 존재하지 않습니다."
         # os.remove (함수 - 파이썬 내장/모듈 함수): 파일을 삭제합니다.
         os.remove(safe_path)
+        workspace_index.invalidate()
         return f"파일 '{file_path}'이(가) 성공적으로 삭제되었습니다."
     except ValueError as e: # ValueError (예외 - 파이썬 내장)
         return f"오류: {e}"
     except Exception as e: # Exception (예외 - 파이썬 내장)
         return f"파일 삭제 중 오류 발생: {type(e).__name__} - {e}"
 
-def list_directory(directory_path: str = ".") -> str: # list_directory (함수 - 사용자 정의)
+# _workspace_relative (함수 - 사용자 정의): 안전한 절대 경로를 작업 공간 기준 상대 경로('/' 구분, 루트는 '')로 바꿉니다.
+def _workspace_relative(safe_path: str) -> str:
+    relative = os.path.relpath(safe_path, os.path.abspath(AGENT_WORKSPACE_DIR))
+    return "" if relative == "." else relative.replace(os.sep, "/")
+
+# _format_size (함수 - 사용자 정의): 파일 크기를 짧게 표시합니다. (예: 512, 1.2K, 3.4M)
+def _format_size(size: float) -> str:
+    if size < 1024:
+        return str(int(size))
+    for unit in ("K", "M", "G"):
+        size /= 1024
+        if size < 1024 or unit == "G":
+            return f"{size:.1f}{unit}"
+
+# list_workspace (함수 - 사용자 정의): 작업 공간의 파일/폴더 목록을 크기, 수정 시각과 함께 페이지 단위로 반환합니다.
+# path (매개변수): 목록을 볼 폴더. pattern (매개변수): 이름을 거를 glob 패턴 (예: '*.py', 'src/*.txt').
+# recursive (매개변수): True이면 하위 폴더까지 모두 보여줍니다. offset / limit (매개변수): 페이지 시작 위치와 항목 수.
+def list_workspace(path: str = ".", pattern: Optional[str] = None, recursive: bool = True,
+                   offset: int = 0, limit: int = LIST_WORKSPACE_DEFAULT_LIMIT) -> str:
     """
-    지정된 디렉토리의 파일 및 하위 디렉토리 목록을 반환합니다.
-    디렉토리는 AGENT_WORKSPACE_DIR 내부에 있어야 하며, _get_safe_path 함수에 의해 검증됩니다.
-    기본값은 현재 에이전트 작업 디렉토리(AGENT_WORKSPACE_DIR)의 루트입니다.
+    작업 공간 인덱스(workspace_index)에서 목록을 만들므로 디렉토리를 매번 다시 훑지 않습니다.
+    토큰을 아끼기 위해 한 줄에 '경로 크기 수정시각'만 씁니다. 폴더는 '경로/'로 표시하고 크기를 생략합니다.
+    경로는 path 기준 상대 경로입니다. 항목이 더 있으면 다음 페이지를 읽는 방법을 끝에 표시합니다.
+    pattern에 '/'가 없으면 이름에, 있으면 path 기준 상대 경로에 맞춰 봅니다.
     """
     try:
-        safe_path = _get_safe_path(directory_path) # _get_safe_path (함수) 호출
-        # os.path.isdir (함수 - 파이썬 내장/모듈 함수): 지정된 경로가 디렉토리인지 확인합니다.
+        safe_path = _get_safe_path(path)
         if not os.path.isdir(safe_path):
-            return f"오류: '{directory_path}'은(는) 디렉토리가 아닙니다."
-        
-        # os.listdir (함수 - 파이썬 내장/모듈 함수): 디렉토리 내의 모든 항목(파일 및 폴더) 이름을 가져옵니다.
-        items = os.listdir(safe_path)
-        # if (조건문): items (변수) 리스트가 비어있는지 확인합니다.
-        if not items:
-            return f"디렉토리 '{directory_path}'이(가) 비어 있습니다."
-        
-        # 목록을 문자열로 결합하여 반환합니다.
-        return f"디렉토리 '{directory_path}' 내용:\n" + "\n".join(items)
-    except ValueError as e: # ValueError (예외 - 파이썬 내장)
+            return f"오류: '{path}'은(는) 디렉토리가 아닙니다."
+        if offset < 0:
+            return "오류: offset은 0 이상이어야 합니다."
+        limit = max(1, min(limit, LIST_WORKSPACE_MAX_LIMIT))
+        directory = _workspace_relative(safe_path)
+        entries, truncated = workspace_index.list(directory, recursive)
+        prefix_length = len(directory) + 1 if directory else 0
+
+        def relative(entry: WorkspaceEntry) -> str:
+            return entry.path[prefix_length:]
+
+        if pattern:
+            # fnmatch의 '*'는 '/'까지 맞추므로 '**/'는 '*/'와 같게 보고, 맨 앞의 '**/'는 '최상위 포함'으로 보아 떼어냅니다.
+            glob = pattern[3:] if pattern.startswith("**/") else pattern
+            glob = glob.replace("**/", "*/")
+            if "/" in glob:
+                entries = [entry for entry in entries if fnmatch.fnmatchcase(relative(entry), glob)]
+            else:
+                entries = [entry for entry in entries if fnmatch.fnmatchcase(entry.path.rsplit("/", 1)[-1], glob)]
+
+        total = len(entries)
+        label = f"'{path}'" + (f" (glob '{pattern}')" if pattern else "")
+        if total == 0:
+            return f"{label}에 해당하는 항목이 없습니다."
+        if offset >= total:
+            return f"오류: offset({offset})이 전체 항목 수({total})보다 큽니다."
+        page = entries[offset:offset + limit]
+        files = sum(1 for entry in entries if not entry.is_dir)
+        lines = [f"{label} 항목 {total}개(파일 {files}, 폴더 {total - files}) 중 {offset + 1}-{offset + len(page)} [경로 크기 수정시각]:"]
+        used = len(lines[0].encode("utf-8"))
+        for entry in page:
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.mtime))
+            line = f"{relative(entry)}/ {modified}" if entry.is_dir else f"{relative(entry)} {_format_size(entry.size)} {modified}"
+            used += len(line.encode("utf-8")) + 1
+            if used > TOOL_OUTPUT_MAX_BYTES - _OUTPUT_MARGIN_BYTES:
+                break
+            lines.append(line)
+        next_offset = offset + len(lines) - 1
+        if next_offset < total:
+            lines[0] = lines[0].replace(f"-{offset + len(page)} ", f"-{next_offset} ")
+            args = [f"path='{path}'"] + ([f"pattern='{pattern}'"] if pattern else []) + ([] if recursive else ["recursive=False"])
+            lines.append(f"...[다음 페이지: list_workspace({', '.join(args)}, offset={next_offset})]")
+        if truncated:
+            lines.append(f"...[작업 공간 항목이 너무 많아 인덱스에 처음 {workspace_index.max_entries}개만 들어 있습니다.]")
+        return "\n".join(lines)
+    except ValueError as e:
         return f"오류: {e}"
-    except Exception as e: # Exception (예외 - 파이썬 내장)
-        return f"디렉토리 목록 조회 중 오류 발생: {type(e).__name__} - {e}"
+    except Exception as e:
+        return f"작업 공간 목록 조회 중 오류 발생: {type(e).__name__} - {e}"
+
+def list_directory(directory_path: str = ".") -> str: # list_directory (함수 - 사용자 정의)
+    """
+    지정된 디렉토리 바로 아래의 파일 및 하위 디렉토리 목록을 반환합니다. (list_workspace의 recursive=False와 같음)
+    디렉토리는 AGENT_WORKSPACE_DIR 내부에 있어야 하며, _get_safe_path 함수에 의해 검증됩니다.
+    기본값은 현재 에이전트 작업 디렉토리(AGENT_WORKSPACE_DIR)의 루트입니다.
+    """
+    return list_workspace(directory_path, recursive=False)
 
 # --- LangChain Tool 정의 ---
 # 위에서 정의한 파이썬 함수들을 LLM 에이전트가 사용할 수 있는 '도구(Tool)'로 만듭니다.
@@ -147,27 +505,49 @@ def list_directory(directory_path: str = ".") -> str: # list_directory (함수 -
 # 이러한 도구들이 MCP 서버의 특정 기능(예: filesystem 서버의 'createFile' 액션)과
 # 연결되도록 추상화 계층을 추가할 수 있습니다.
 file_tools = [ # file_tools (변수 - 사용자 정의): 파일 시스템 도구들의 리스트입니다.
-    LangChainTool( # LangChainTool (클래스)
+    StructuredTool.from_function( # StructuredTool.from_function (메서드): 함수 시그니처로 인자 스키마를 만듭니다.
         name="create_file", # name (속성): 도구의 이름 (LLM이 호출할 이름)
-        description=""" # description (속성): 도구의 기능 설명 (LLM이 도구 사용 여부를 판단할 때 참고)
+        # description (속성): 도구의 기능 설명 (LLM이 도구 사용 여부를 판단할 때 참고)
+        description="""
         새로운 텍스트 파일을 생성하거나 기존 파일을 덮어씁니다.
         파일은 에이전트의 작업 공간(agent_workspace 폴더) 내부에만 생성/수정될 수 있습니다.
-        이 도구를 사용하여 코드를 파일에 저장할 수 있습니다.
+        이 도구를 사용하여 코드를 파일에 저장할 수 있습니다. 아주 긴 내용은 나누어 append_file로 이어 쓰십시오.
         사용 예시: create_file(file_path='my_folder/my_file.txt', content='Hello, world!')
         """,
         func=create_file, # func (속성): 도구가 실행될 때 실제로 호출될 파이썬 함수 (우리가 위에서 정의한 함수)
     ),
-    LangChainTool(
+    StructuredTool.from_function(
         name="read_file",
         description="""
-        지정된 텍스트 파일의 내용을 읽어옵니다.
+        지정된 텍스트 파일의 내용을 읽어옵니다. 큰 파일은 한 번에 일부만 읽습니다.
+        offset/length로 바이트 범위를, start_line/end_line(1부터 시작)으로 줄 범위를 지정할 수 있습니다.
+        결과 끝에 잘림 표시가 있으면 안내된 인자로 다시 호출하여 이어서 읽으십시오.
         파일은 에이전트의 작업 공간(agent_workspace 폴더) 내부에 있어야 합니다.
-        이 도구를 사용하여 생성된 코드나 다른 파일의 내용을 확인할 수 있습니다.
-        사용 예시: read_file(file_path='my_folder/my_file.txt')
+        사용 예시: read_file(file_path='my_folder/my_file.txt') 또는 read_file(file_path='app.log', start_line=100, end_line=150)
         """,
         func=read_file,
     ),
-    LangChainTool(
+    StructuredTool.from_function(
+        name="append_file",
+        description="""
+        지정된 텍스트 파일 끝에 내용을 덧붙입니다. 파일이 없으면 새로 만듭니다.
+        긴 내용을 여러 번에 나누어 쓸 때 사용합니다.
+        파일은 에이전트의 작업 공간(agent_workspace 폴더) 내부에만 생성/수정될 수 있습니다.
+        사용 예시: append_file(file_path='notes.txt', content='추가할 내용\n')
+        """,
+        func=append_file,
+    ),
+    StructuredTool.from_function(
+        name="search_workspace",
+        description="""
+        작업 공간의 파일에서 검색어가 들어간 줄을 찾아 '파일경로:줄번호: 내용' 형식으로 보여줍니다. (grep과 비슷)
+        path로 검색할 파일이나 폴더를 지정하고, regex=True이면 정규 표현식으로 검색합니다.
+        큰 파일에서 필요한 부분을 찾은 뒤 read_file의 start_line으로 그 주변을 읽을 때 사용합니다.
+        사용 예시: search_workspace(pattern='ERROR', path='logs/app.log') 또는 search_workspace(pattern='def \\w+', regex=True)
+        """,
+        func=search_workspace,
+    ),
+    StructuredTool.from_function(
         name="delete_file",
         description="""
         지정된 텍스트 파일을 삭제합니다.
@@ -176,7 +556,7 @@ file_tools = [ # file_tools (변수 - 사용자 정의): 파일 시스템 도구
         """,
         func=delete_file,
     ),
-    LangChainTool(
+    StructuredTool.from_function(
         name="list_directory",
         description="""
         지정된 디렉토리의 파일 및 하위 디렉토리 목록을 조회합니다.
@@ -187,4 +567,15 @@ file_tools = [ # file_tools (변수 - 사용자 정의): 파일 시스템 도구
         """,
         func=list_directory,
     ),
+    StructuredTool.from_function(
+        name="list_workspace",
+        description="""
+        작업 공간의 파일과 폴더를 하위 폴더까지 한 번에 보여줍니다. 각 줄은 '경로 크기 수정시각'이고 폴더는 '경로/'입니다.
+        pattern으로 glob 패턴(예: '*.py', 'logs/*.log')에 맞는 항목만 볼 수 있습니다.
+        항목이 많으면 한 페이지(limit개)씩 보여주며, 끝에 안내된 offset으로 다음 페이지를 볼 수 있습니다.
+        파일을 찾을 때 list_directory를 여러 번 호출하는 대신 이 도구를 사용하십시오.
+        사용 예시: list_workspace() 또는 list_workspace(path='src', pattern='*.py')
+        """,
+        func=list_workspace,
+    ),
 ]
@@ -0,0 +1,150 @@
+# benchmarks/bench_db.py
+#
+# db.py 함수별 마이크로 벤치마크입니다. 임시 DB에 세션과 메시지를 미리 채운 뒤, 각 함수를 반복 호출하여
+# 호출당 지연 시간(p50/p95/p99, 마이크로초)과 초당 호출 수를 측정합니다.
+#   - sync  : 함수를 직접 호출 (DB 자체의 비용)
+#   - async : *_async 함수를 --concurrency개 코루틴에서 동시에 호출 (스레드 풀 왕복과 읽기 연결 풀 경합 포함)
+# 마지막에 DB 파일 크기(chat_history.db + WAL)도 출력합니다.
+#
+# 실행 예시 (backend 폴더에서):
+#   python benchmarks/bench_db.py
+#   python benchmarks/bench_db.py --sessions 2000 --messages 100 --iterations 2000 --concurrency 32
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+def _percentile(samples, pct):
+    """정렬된 표본에서 pct(0~100) 백분위 값을 반환합니다."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _report(name, latencies_us, elapsed):
+    print(f"{name:<34} | {len(latencies_us) / elapsed:>9.0f} | {statistics.median(latencies_us):>8.1f} | "
+          f"{_percentile(latencies_us, 95):>8.1f} | {_percentile(latencies_us, 99):>8.1f}")
+
+
+def _messages(turn, size):
+    return [
+        {"sender": "user", "text": f"질문 {turn} " + "가" * size},
+        {"sender": "ai", "text": f"답변 {turn} " + "나" * size},
+    ]
+
+
+def populate(args, rng):
+    """세션 args.sessions개에 메시지 args.messages개씩과 요약, 응답 캐시 항목을 채웁니다."""
+    session_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    for session_id in session_ids:
+        for turn in range(args.messages // 2):
+            db.append_chat_messages(session_id, f"세션 {session_id[:8]}", _messages(turn, rng.randint(50, args.message_size)))
+        db.save_session_summary(session_id, "요약 " * 50, args.messages // 2)
+    now = time.time()
+    cache_keys = [uuid.uuid4().hex for _ in range(args.cache_entries)]
+    embedding = [rng.random() for _ in range(args.embedding_size)]
+    for index, key in enumerate(cache_keys):
+        db.save_cached_response(key, "bench-model", f"ctx{index % 10}", f"질문 {index}", embedding,
+                                "답변 " * 40, now, 24 * 3600, args.cache_entries * 2)
+    return session_ids, cache_keys
+
+
+def bench_sync(name, func, iterations):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - call_started) * 1e6)
+    _report(name, latencies, time.perf_counter() - started)
+
+
+async def bench_async(name, func, iterations, concurrency):
+    latencies = []
+    counter = iter(range(iterations))
+
+    async def worker():
+        for i in counter:
+            call_started = time.perf_counter()
+            await func(i)
+            latencies.append((time.perf_counter() - call_started) * 1e6)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    _report(name, latencies, time.perf_counter() - started)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    # 측정용 임시 DB를 사용하여 실제 chat_history.db를 건드리지 않습니다.
+    db_dir = tempfile.mkdtemp(prefix="bench_db_")
+    db.DB_FILE = os.path.join(db_dir, "chat_history.db")
+    db.init_db()
+
+    started = time.perf_counter()
+    session_ids, cache_keys = populate(args, rng)
+    print(f"populated {args.sessions} sessions x {args.messages} messages, {args.cache_entries} cache entries "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    n = args.iterations
+    now = time.time()
+    pick = lambda i: session_ids[(i * 7919) % len(session_ids)]
+    # 새 세션에 쓰는 함수는 실행마다 다른 ID를 사용합니다.
+    new_ids = [str(uuid.uuid4()) for _ in range(n)]
+    cursor = db.get_session_titles_page(db.SESSION_PAGE_DEFAULT_LIMIT)[1]
+
+    print("function                           |   calls/s |  p50 us  |  p95 us  |  p99 us")
+    bench_sync("append_chat_messages (existing)", lambda i: db.append_chat_messages(pick(i), "t", _messages(i, args.message_size)), n)
+    bench_sync("append_chat_messages (new)", lambda i: db.append_chat_messages(new_ids[i], "t", _messages(i, args.message_size)), n)
+    bench_sync("load_chat_session", lambda i: db.load_chat_session(pick(i)), n)
+    bench_sync("get_session_titles_page (first)", lambda i: db.get_session_titles_page(db.SESSION_PAGE_DEFAULT_LIMIT), n)
+    bench_sync("get_session_titles_page (cursor)", lambda i: db.get_session_titles_page(db.SESSION_PAGE_DEFAULT_LIMIT, cursor), n)
+    bench_sync("get_sessions_version", lambda i: db.get_sessions_version(), n)
+    bench_sync("load_session_summary", lambda i: db.load_session_summary(pick(i)), n)
+    bench_sync("save_session_summary", lambda i: db.save_session_summary(pick(i), "요약 " * 50, i), n)
+    bench_sync("load_cached_response (hit)", lambda i: db.load_cached_response(cache_keys[i % len(cache_keys)], now), n)
+    bench_sync("load_cached_response (miss)", lambda i: db.load_cached_response(new_ids[i], now), n)
+    bench_sync("find_cached_response_candidates", lambda i: db.find_cached_response_candidates("bench-model", f"ctx{i % 10}", now), n)
+    bench_sync("search_chat_messages (rank)", lambda i: db.search_chat_messages(f"질문 {i % 20}"), n)
+    bench_sync("search_chat_messages (recent)", lambda i: db.search_chat_messages(f"답변 {i % 20}", order="recent"), n)
+    if args.full_list:
+        bench_sync("get_all_session_titles", lambda i: db.get_all_session_titles(), max(1, n // 10))
+    bench_sync("delete_chat_session", lambda i: db.delete_chat_session(new_ids[i]), n)
+
+    async def run_async():
+        c = args.concurrency
+        await bench_async(f"append_chat_messages_async x{c}", lambda i: db.append_chat_messages_async(pick(i), "t", _messages(i, args.message_size)), n, c)
+        await bench_async(f"load_chat_session_async x{c}", lambda i: db.load_chat_session_async(pick(i)), n, c)
+        await bench_async(f"get_session_titles_page_async x{c}", lambda i: db.get_session_titles_page_async(db.SESSION_PAGE_DEFAULT_LIMIT), n, c)
+        await bench_async(f"load_session_summary_async x{c}", lambda i: db.load_session_summary_async(pick(i)), n, c)
+
+    asyncio.run(run_async())
+
+    size = sum(os.path.getsize(db.DB_FILE + suffix) for suffix in ("", "-wal") if os.path.exists(db.DB_FILE + suffix))
+    print(f"db size: {size / 1024 / 1024:.1f} MiB ({db.DB_FILE})")
+    db.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500, help="미리 채울 세션 수")
+    parser.add_argument("--messages", type=int, default=40, help="세션당 메시지 수")
+    parser.add_argument("--message-size", type=int, default=500, help="메시지당 최대 글자 수")
+    parser.add_argument("--cache-entries", type=int, default=500, help="미리 채울 응답 캐시 항목 수")
+    parser.add_argument("--embedding-size", type=int, default=1024, help="응답 캐시 질문 임베딩 차원")
+    parser.add_argument("--iterations", type=int, default=1000, help="함수당 호출 횟수")
+    parser.add_argument("--concurrency", type=int, default=16, help="async 측정의 동시 코루틴 수")
+    parser.add_argument("--full-list", action="store_true", help="get_all_session_titles(전체 목록)도 측정")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,70 @@
+# benchmarks/bench_prefill.py
+#
+# 한 세션의 1번째 턴과 N번째(기본 20번째) 턴에서 Ollama의 프롬프트 처리(prefill) 시간을 측정합니다.
+# Ollama 응답 메타데이터의 prompt_eval_count(실제로 새로 계산한 프롬프트 토큰 수)와
+# prompt_eval_duration을 기록하므로, KV 캐시가 재사용되면 두 값이 크게 줄어든 것을 확인할 수 있습니다.
+#
+# --layout stable : prompt.assemble_prompt (고정 시스템 메시지 + 원문 기록 + 새 메시지)
+# --layout legacy : 예전 방식 (도구 설명을 마지막 사용자 메시지 뒤에 붙임)
+#
+# 실행 예시 (backend 폴더에서, Ollama 서버 실행 중):
+#   python benchmarks/bench_prefill.py --layout stable
+#   python benchmarks/bench_prefill.py --layout legacy
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import file_tools
+from model import create_chat_llm
+from prompt import assemble_prompt, build_system_prompt
+
+
+def _legacy_prompt(tools, history, user_message):
+    """예전 LangGraph.py 방식: 도구 설명을 마지막 사용자 메시지에 덧붙입니다."""
+    return history + [HumanMessage(content=user_message + "\n\n" + build_system_prompt(tools))]
+
+
+async def main(args):
+    llm = create_chat_llm().model_copy(update={"num_predict": args.num_predict})
+    tools = list(file_tools)
+    history = []
+    results = []
+    for turn in range(1, args.turns + 1):
+        user_message = f"{turn}번째 질문입니다. 작업 공간에 대해 한 문장으로 설명해 주세요."
+        if args.layout == "stable":
+            prompt = assemble_prompt(tools, "", history, user_message)
+        else:
+            prompt = _legacy_prompt(tools, history, user_message)
+        started = time.perf_counter()
+        response = await llm.ainvoke(prompt)
+        wall_ms = (time.perf_counter() - started) * 1000
+        meta = response.response_metadata or {}
+        results.append({
+            "turn": turn,
+            "prompt_eval_count": meta.get("prompt_eval_count"),
+            "prompt_eval_ms": (meta.get("prompt_eval_duration") or 0) / 1e6,
+            "wall_ms": wall_ms,
+        })
+        history = history + [HumanMessage(content=user_message), AIMessage(content=str(response.content))]
+
+    print(f"layout: {args.layout}, model: {llm.model}, keep_alive: {llm.keep_alive}, num_ctx: {llm.num_ctx}")
+    print("turn | prompt_eval_count | prompt_eval_ms | wall_ms")
+    for row in results:
+        if args.verbose or row["turn"] in (1, args.turns):
+            print(f"{row['turn']:>4} | {row['prompt_eval_count']!s:>17} | {row['prompt_eval_ms']:>14.1f} | {row['wall_ms']:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layout", choices=["stable", "legacy"], default="stable")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--num-predict", type=int, default=48, help="턴마다 생성할 최대 토큰 수")
+    parser.add_argument("--verbose", action="store_true", help="모든 턴의 결과를 출력")
+    asyncio.run(main(parser.parse_args()))
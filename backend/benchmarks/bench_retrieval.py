@@ -0,0 +1,151 @@
+# benchmarks/bench_retrieval.py
+#
+# RAG 검색 방식별 재현율(recall@k), MRR, 프롬프트에 들어가는 문맥 크기, 검색 지연 시간을 오프라인으로 비교합니다.
+#   vector        : 기존 방식 (Chroma 벡터 검색 k개)
+#   bm25          : BM25 키워드 검색만
+#   hybrid        : 벡터 + BM25, RRF 결합
+#   hybrid+rerank : hybrid + coverage 재정렬 (LangGraph.py RAG 도구의 기본값)
+#   cached cold/warm : LangGraph.py RAG 도구와 같은 CachedRetriever(hybrid+rerank)의 첫 호출 / 반복 호출
+#                      (다른 방식과 달리 질문 임베딩 시간이 포함되며, warm은 캐시 적중)
+#
+# 기본값은 정책 번호/제품명이 들어간 합성 문서와 질문을 만들어 사용하고, 임베딩은 Ollama 없이 동작하는
+# 해싱 임베딩(글자 3-gram)을 사용합니다. 실제 임베딩 모델로 측정하려면 --embeddings ollama를 주십시오.
+# 직접 만든 평가 세트를 쓰려면 --data-dir과 --queries(JSONL: {"query": ..., "source": 정답 파일 이름})를 주십시오.
+#
+# 실행 예시 (backend 폴더에서):
+#   python benchmarks/bench_retrieval.py
+#   python benchmarks/bench_retrieval.py --embeddings ollama --k 3
+#   python benchmarks/bench_retrieval.py --data-dir ./data --queries eval.jsonl
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+from fake_ollama import hashing_embedding
+from hybrid_retriever import HybridSearcher
+from ingest import ingest, open_vectorstore
+from retrieval_cache import CachedRetriever, normalize_query
+
+
+class HashingEmbeddings(Embeddings):
+    """Ollama 없이 쓰는 결정적 임베딩: 글자 3-gram을 해싱해 고정 차원 벡터로 만듭니다. (벤치마크 전용)"""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+
+    def _embed(self, text):
+        # 부하 테스트의 가짜 Ollama 서버(fake_ollama.py)와 같은 임베딩입니다.
+        return hashing_embedding(text, self.size)
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+TOPICS = ["연차 휴가", "출장비 정산", "재택 근무", "보안 교육", "장비 반납", "야근 식대", "경조사 지원", "교육비 지원"]
+PRODUCTS = ["스마트폰", "태블릿", "스마트워치", "노트북", "무선 이어폰"]
+FILLER = (
+    "본 문서는 사내 규정의 일부이며 모든 임직원에게 적용됩니다. 세부 절차는 담당 부서의 안내를 따르고, "
+    "예외 사항은 팀장 승인 후 인사팀에 신청합니다. 변경 사항은 사내 게시판에 공지됩니다. "
+)
+
+
+def build_synthetic_corpus(data_dir, n_docs, seed):
+    """정책 번호와 제품 모델명이 하나씩 들어간 합성 문서와, 그 번호/모델명으로 묻는 질문을 만듭니다."""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    queries = []
+    for i in range(n_docs):
+        topic = rng.choice(TOPICS)
+        product = rng.choice(PRODUCTS)
+        policy_no = f"HR-{1000 + i}"
+        model_no = f"{product} X{200 + i}"
+        text = (
+            f"{topic} 규정 ({policy_no})\n{FILLER * 2}\n"
+            f"{policy_no} 규정에 따라 {topic} 신청 시 {rng.randint(1, 30)}일 이내에 처리합니다. "
+            f"지급 장비: {model_no}. {FILLER}"
+        )
+        name = f"policy_{i:04d}.txt"
+        with open(os.path.join(data_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        queries.append({"query": f"{policy_no} 규정은 며칠 이내에 처리하나요?", "source": name})
+        queries.append({"query": f"{model_no} 지급 기준 알려줘", "source": name})
+    return queries
+
+
+def evaluate(name, search, queries, k):
+    hits, reciprocal_ranks, latencies, context_chars = 0, [], [], []
+    for item in queries:
+        started = time.perf_counter()
+        documents = search(item["query"], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        sources = [os.path.basename(document.metadata.get("source", "")) for document in documents]
+        context_chars.append(sum(len(document.page_content) for document in documents))
+        if item["source"] in sources:
+            hits += 1
+            reciprocal_ranks.append(1.0 / (sources.index(item["source"]) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<14} | {hits / len(queries):>8.3f} | {statistics.mean(reciprocal_ranks):>5.3f} | "
+          f"{statistics.mean(context_chars):>11.0f} | {statistics.median(latencies):>7.2f} | {p95:>7.2f}")
+
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    if args.data_dir:
+        data_dir = args.data_dir
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        data_dir = os.path.join(workdir, "data")
+        queries = build_synthetic_corpus(data_dir, args.docs, args.seed)
+
+    if args.embeddings == "ollama":
+        from model import create_embedding_model
+        embedding_model = create_embedding_model()
+    else:
+        embedding_model = HashingEmbeddings()
+    chroma_dir = os.path.join(workdir, "chroma_db")
+    vectorstore = open_vectorstore(embedding_model, chroma_dir)
+    report = ingest(vectorstore, data_dir, chroma_dir)
+    print(f"indexed {report.chunks_added} chunks from {report.files_added} files, {len(queries)} queries, k={args.k}")
+
+    plain = HybridSearcher(vectorstore, chroma_dir, reranker=None)
+    reranked = HybridSearcher(vectorstore, chroma_dir, reranker="coverage")
+    bm25_index = plain._get_index()
+    # 질문 임베딩은 미리 계산해 두어, 모든 방식이 검색 자체의 지연 시간만 비교되도록 합니다.
+    embeddings = {item["query"]: embedding_model.embed_query(normalize_query(item["query"])) for item in queries}
+
+    print("mode           | recall@k |   MRR | ctx chars/q | p50 ms  | p95 ms")
+    evaluate("vector", lambda q, k: vectorstore.similarity_search_by_vector(embeddings[q], k=k), queries, args.k)
+    evaluate(f"vector k={args.k * 2}", lambda q, k: vectorstore.similarity_search_by_vector(embeddings[q], k=k * 2), queries, args.k)
+    evaluate("bm25", lambda q, k: [d for d, _ in bm25_index.search(normalize_query(q), k)], queries, args.k)
+    evaluate("hybrid", lambda q, k: plain.search(normalize_query(q), embeddings[q], k), queries, args.k)
+    evaluate("hybrid+rerank", lambda q, k: reranked.search(normalize_query(q), embeddings[q], k), queries, args.k)
+    cached = CachedRetriever(vectorstore, k=args.k, chroma_dir=chroma_dir, searcher=reranked)
+    evaluate("cached cold", lambda q, k: cached.invoke(q, k), queries, args.k)
+    evaluate("cached warm", lambda q, k: cached.invoke(q, k), queries, args.k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embeddings", choices=["hashing", "ollama"], default="hashing")
+    parser.add_argument("--docs", type=int, default=200, help="합성 문서 수 (--data-dir를 주지 않을 때)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--data-dir", help="평가할 문서 폴더 (주면 --queries도 필요)")
+    parser.add_argument("--queries", help="평가 질문 JSONL 파일: {\"query\": ..., \"source\": 정답 파일 이름}")
+    main(parser.parse_args())
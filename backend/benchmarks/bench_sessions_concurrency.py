@@ -0,0 +1,95 @@
+# benchmarks/bench_sessions_concurrency.py
+#
+# 50개의 채팅이 동시에 대화 기록을 저장하는 동안 GET /api/chat/sessions의 지연 시간(p50/p95/p99)을 측정합니다.
+# --blocking-saves 옵션을 주면 예전 방식처럼 동기 DB 함수를 이벤트 루프에서 직접 호출하여 비교할 수 있습니다.
+#
+# 실행 예시 (backend 폴더에서):
+#   python benchmarks/bench_sessions_concurrency.py
+#   python benchmarks/bench_sessions_concurrency.py --blocking-saves
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# backend 폴더의 모듈(db, server)을 임포트할 수 있도록 경로를 추가합니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import db
+
+
+def _percentile(samples, pct):
+    """정렬된 표본에서 pct(0~100) 백분위 값을 반환합니다."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def _chat_saver(session_id, turns, message_size, blocking):
+    """한 채팅 세션이 turns번의 턴을 저장하는 과정을 흉내 냅니다."""
+    for turn in range(turns):
+        messages = [
+            {"sender": "user", "text": f"질문 {turn} " + "가" * message_size},
+            {"sender": "ai", "text": f"답변 {turn} " + "나" * message_size},
+        ]
+        if blocking:
+            db.append_chat_messages(session_id, f"세션 {session_id[:8]}", messages)
+        else:
+            await db.append_chat_messages_async(session_id, f"세션 {session_id[:8]}", messages)
+        # 다른 코루틴에게 실행 기회를 줍니다.
+        await asyncio.sleep(0)
+
+
+async def _poll_sessions(client, stop_event, latencies):
+    """저장이 끝날 때까지 /api/chat/sessions를 계속 호출하며 지연 시간을 기록합니다."""
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/chat/sessions")
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+
+
+async def main(args):
+    # 측정용 임시 DB를 사용하여 실제 chat_history.db를 건드리지 않습니다.
+    db.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "chat_history.db")
+    import server  # DB_FILE 설정 후 임포트합니다.
+
+    await db.init_db_async()
+    latencies = []
+    stop_event = asyncio.Event()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pollers = [asyncio.create_task(_poll_sessions(client, stop_event, latencies)) for _ in range(args.readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _chat_saver(str(uuid.uuid4()), args.turns, args.message_size, args.blocking_saves)
+            for _ in range(args.chats)
+        ])
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        await asyncio.gather(*pollers)
+    db.close_db()
+
+    mode = "blocking (sync DB on event loop)" if args.blocking_saves else "async (DB thread pool)"
+    print(f"mode: {mode}")
+    print(f"saves: {args.chats} chats x {args.turns} turns in {elapsed:.2f}s")
+    print(f"/api/chat/sessions requests: {len(latencies)}")
+    if latencies:
+        print(f"  p50 {statistics.median(latencies):.1f} ms | p95 {_percentile(latencies, 95):.1f} ms | "
+              f"p99 {_percentile(latencies, 99):.1f} ms | max {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50, help="동시에 저장하는 채팅 수")
+    parser.add_argument("--turns", type=int, default=20, help="채팅당 저장할 턴 수")
+    parser.add_argument("--message-size", type=int, default=2000, help="메시지당 글자 수")
+    parser.add_argument("--readers", type=int, default=4, help="동시에 세션 목록을 요청하는 클라이언트 수")
+    parser.add_argument("--blocking-saves", action="store_true", help="동기 DB 함수를 이벤트 루프에서 직접 호출")
+    asyncio.run(main(parser.parse_args()))
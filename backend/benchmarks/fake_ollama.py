@@ -0,0 +1,246 @@
+# benchmarks/fake_ollama.py
+#
+# GPU 없이 부하 테스트를 하기 위한 가짜 Ollama HTTP 서버입니다. (표준 라이브러리만 사용)
+# 서버가 실제로 호출하는 API만 흉내 냅니다.
+#   GET  /api/tags        : LLM/임베딩 모델 목록 (ollama_pool.py 상태 확인)
+#   POST /api/show        : 모델 정보와 capabilities (tool_calling.py의 도구 호출 지원 확인)
+#   POST /api/chat        : 채팅 응답. stream=true면 토큰을 NDJSON으로 한 줄씩 보냅니다.
+#   POST /api/embed       : 임베딩 (글자 3-gram 해싱, 결정적)
+#   POST /api/embeddings  : 예전 임베딩 API
+#
+# 응답 시간은 설정값으로 정합니다.
+#   첫 토큰까지 latency_s(프롬프트 처리 시간 흉내) + 토큰마다 1 / tokens_per_s
+# 응답 메타데이터(eval_count, eval_duration, prompt_eval_count, prompt_eval_duration)도 채우므로
+# /metrics의 토큰 지표와 tokens/s 로그가 실제 Ollama와 같은 방식으로 기록됩니다.
+# tools가 포함된 요청의 첫 호출은 tool_call_rate 비율만큼 query_knowledge_base 도구 호출로 응답합니다.
+# (질문 내용의 해시로 정하므로 같은 질문은 항상 같은 방식으로 응답합니다.)
+#
+# 단독 실행 예시 (backend 폴더에서):
+#   python benchmarks/fake_ollama.py --port 11434 --latency 0.3 --tokens-per-s 40
+# 이후 서버(uvicorn server:app)를 평소처럼 실행하면 이 가짜 서버를 사용합니다.
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 실제 서버와 같은 모델 이름을 알려 주어야 ollama_pool.py의 상태 확인을 통과합니다.
+LLM_MODEL_NAME = "aroxima/eeve-korean_instruct-10.8b-expo:latest"
+EMBEDDING_MODEL_NAME = "daynice/kure-v1:latest"
+RAG_TOOL_NAME = "query_knowledge_base"
+
+ANSWER_WORDS = ["문의하신", "내용은", "사내", "규정에", "따라", "처리됩니다.", "자세한", "사항은", "담당", "부서에", "확인하십시오."]
+
+
+def hashing_embedding(text: str, size: int = 256) -> List[float]:
+    """글자 3-gram을 해싱해 고정 차원의 정규화된 벡터로 만듭니다. (같은 글은 항상 같은 벡터)"""
+    vector = [0.0] * size
+    text = " ".join(text.lower().split())
+    for i in range(max(1, len(text) - 2)):
+        bucket = int(hashlib.md5(text[i:i + 3].encode("utf-8")).hexdigest()[:8], 16) % size
+        vector[bucket] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _fraction(text: str) -> float:
+    """문자열마다 정해진 0~1 사이의 값입니다. (도구 호출 여부를 재현 가능하게 정할 때 사용)"""
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+class FakeOllama:
+    """
+    별도 스레드에서 실행되는 가짜 Ollama 서버입니다.
+    사용 예:
+        fake = FakeOllama(latency_s=0.2, tokens_per_s=50).start()
+        ... fake.url로 요청 ...
+        fake.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.2, tokens_per_s: float = 50.0,
+                 response_tokens: int = 40, tool_call_rate: float = 0.0, native_tools: bool = True,
+                 embedding_size: int = 256, embedding_latency_s: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.response_tokens = response_tokens
+        self.tool_call_rate = tool_call_rate
+        self.native_tools = native_tools
+        self.embedding_size = embedding_size
+        self.embedding_latency_s = embedding_latency_s
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+        # 통계
+        self.requests: Dict[str, int] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_port if self._server else self.port}"
+
+    def start(self) -> "FakeOllama":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, "GET", None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                fake._handle(self, "POST", body)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"fake-ollama-{self._server.server_port}", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"url": self.url, "requests": dict(self.requests), "peak_in_flight": self.peak_in_flight}
+
+    # --- 요청 처리 ---
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str, body: Optional[Dict[str, Any]]) -> None:
+        path = handler.path.split("?")[0]
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if method == "GET" and path == "/api/tags":
+                self._send_json(handler, {"models": [{"name": LLM_MODEL_NAME, "model": LLM_MODEL_NAME},
+                                                     {"name": EMBEDDING_MODEL_NAME, "model": EMBEDDING_MODEL_NAME}]})
+            elif method == "GET" and path in ("/", "/api/version"):
+                self._send_json(handler, {"version": "0.0.0-fake"})
+            elif method == "POST" and path == "/api/show":
+                capabilities = ["completion", "tools"] if self.native_tools else ["completion"]
+                self._send_json(handler, {"modelfile": "", "parameters": "", "template": "", "details": {},
+                                          "model_info": {}, "capabilities": capabilities})
+            elif method == "POST" and path == "/api/chat":
+                self._chat(handler, body or {})
+            elif method == "POST" and path == "/api/embed":
+                inputs = (body or {}).get("input", "")
+                inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+                time.sleep(self.embedding_latency_s)
+                self._send_json(handler, {"model": (body or {}).get("model", EMBEDDING_MODEL_NAME),
+                                          "embeddings": [hashing_embedding(text, self.embedding_size) for text in inputs]})
+            elif method == "POST" and path == "/api/embeddings":
+                time.sleep(self.embedding_latency_s)
+                self._send_json(handler, {"embedding": hashing_embedding((body or {}).get("prompt", ""), self.embedding_size)})
+            else:
+                self._send_json(handler, {"error": f"unknown endpoint {method} {path}"}, status=404)
+        except (BrokenPipeError, ConnectionResetError):
+            # 클라이언트가 먼저 연결을 끊은 경우 (요청 취소 등)
+            pass
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, payload: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _tool_call(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """도구 호출로 응답할 요청이면 도구 호출 내용을 반환합니다. (사용자 메시지 바로 다음의 첫 호출만)"""
+        messages = body.get("messages") or []
+        tool_names = {(tool.get("function") or {}).get("name") for tool in body.get("tools") or []}
+        if not self.tool_call_rate or RAG_TOOL_NAME not in tool_names or not messages or messages[-1].get("role") != "user":
+            return None
+        question = str(messages[-1].get("content", ""))
+        if _fraction(question) >= self.tool_call_rate:
+            return None
+        return {"function": {"name": RAG_TOOL_NAME, "arguments": {"query": question}}}
+
+    def _chat(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]) -> None:
+        model = body.get("model", LLM_MODEL_NAME)
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in body.get("messages") or [])
+        prompt_tokens = max(1, prompt_chars // 2)
+        num_predict = (body.get("options") or {}).get("num_predict")
+        tool_call = self._tool_call(body)
+        if tool_call is not None:
+            words: List[str] = []
+        else:
+            count = self.response_tokens if not num_predict or num_predict < 0 else min(self.response_tokens, num_predict)
+            words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(count)]
+        per_token_s = 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        started = time.perf_counter()
+        time.sleep(self.latency_s)
+        prompt_eval_ns = int(self.latency_s * 1e9) or 1
+
+        def final_chunk(content: str) -> Dict[str, Any]:
+            message: Dict[str, Any] = {"role": "assistant", "content": content}
+            if tool_call is not None:
+                message["tool_calls"] = [tool_call]
+            eval_count = max(1, len(words))
+            return {
+                "model": model, "created_at": created_at, "message": message, "done": True, "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9), "load_duration": 0,
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": prompt_eval_ns,
+                "eval_count": eval_count, "eval_duration": int(eval_count * per_token_s * 1e9) or 1,
+            }
+
+        if not body.get("stream", True):
+            time.sleep(per_token_s * len(words))
+            self._send_json(handler, final_chunk(" ".join(words)))
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write_chunk(payload: Dict[str, Any]) -> None:
+            data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+            handler.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            handler.wfile.flush()
+
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(per_token_s)
+            write_chunk({"model": model, "created_at": created_at, "done": False,
+                         "message": {"role": "assistant", "content": word if index == 0 else " " + word}})
+        write_chunk(final_chunk(""))
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.2, help="첫 토큰까지의 시간(초, 프롬프트 처리 흉내)")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0, help="생성 속도(토큰/초)")
+    parser.add_argument("--response-tokens", type=int, default=40, help="응답 토큰 수")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0, help="도구 호출로 응답할 질문의 비율(0~1)")
+    parser.add_argument("--text-tools", action="store_true", help="도구 호출 미지원 모델처럼 응답 (텍스트 도구 호출 방식 사용)")
+    args = parser.parse_args()
+    fake = FakeOllama(args.host, args.port, args.latency, args.tokens_per_s, args.response_tokens,
+                      args.tool_call_rate, native_tools=not args.text_tools).start()
+    print(f"fake Ollama listening on {fake.url} (latency {args.latency}s, {args.tokens_per_s} tokens/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,363 @@
+# benchmarks/load_test.py
+#
+# 가짜 Ollama 서버(fake_ollama.py)를 상대로 FastAPI 서버(server.app) 전체를 띄우고, 가상 사용자 N명이 동시에
+# 채팅(/api/chat 또는 /api/chat/stream)과 세션 API(/api/chat/sessions, /api/chat/session/{id})를 호출하는 부하 테스트입니다.
+# GPU 없이 같은 조건을 재현할 수 있으므로, 성능 관련 변경 전후를 같은 명령으로 비교할 수 있습니다.
+#
+# 측정 항목:
+#   - 작업별 처리량(req/s), 지연 시간 p50/p95/p99/max, 실패(HTTP 오류) 및 과부하 거절(429/503) 수
+#   - 스트리밍 모드의 첫 토큰까지 시간(TTFT)
+#   - DB 증가량 (chat_history.db + WAL 파일 크기, 세션/메시지 행 수)
+#   - 종료 시점의 LLM 스케줄러/응답 캐시 통계와 가짜 Ollama 서버별 요청 수/최대 동시 요청 수
+#
+# 서버는 임시 작업 폴더(chat_history.db, chroma_db, data, agent_workspace)에서 uvicorn으로 실행하며,
+# 서버 로그는 작업 폴더의 server.log에 저장합니다. 같은 --seed면 같은 질문 순서를 사용합니다.
+#
+# 실행 예시 (backend 폴더에서):
+#   python benchmarks/load_test.py --users 20 --turns 5
+#   python benchmarks/load_test.py --users 50 --stream --latency 0.5 --tokens-per-s 30 --backends 2
+#   python benchmarks/load_test.py --users 20 --response-cache --repeat-ratio 0.5 --output after.json
+#   python benchmarks/load_test.py --target http://localhost:8000 --users 5   (이미 실행 중인 서버 측정)
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from fake_ollama import FakeOllama
+
+# 여러 사용자가 같은 질문을 하는 경우(FAQ)를 흉내 내는 질문 목록입니다. (--repeat-ratio 비율로 사용)
+COMMON_QUESTIONS = [
+    "연차 휴가는 며칠인가요?",
+    "출장비 정산은 어떻게 하나요?",
+    "재택 근무 신청 방법을 알려 주세요.",
+    "스마트폰 X200 지급 기준이 궁금합니다.",
+    "보안 교육은 언제까지 이수해야 하나요?",
+]
+
+_DB_FILES = ("chat_history.db", "chat_history.db-wal")
+
+
+def _percentile(samples, pct):
+    """정렬된 표본에서 pct(0~100) 백분위 값을 반환합니다."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def db_snapshot(db_dir: Optional[str]) -> Optional[Dict[str, int]]:
+    """DB 파일 크기(바이트)와 세션/메시지 행 수입니다. 읽기 전용으로 열어서 서버의 쓰기를 방해하지 않습니다."""
+    if not db_dir or not os.path.exists(os.path.join(db_dir, "chat_history.db")):
+        return None
+    snapshot = {"bytes": sum(os.path.getsize(os.path.join(db_dir, name)) for name in _DB_FILES
+                             if os.path.exists(os.path.join(db_dir, name)))}
+    conn = sqlite3.connect(f"file:{os.path.join(db_dir, 'chat_history.db')}?mode=ro", uri=True)
+    try:
+        for table in ("chat_sessions", "chat_messages"):
+            snapshot[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+    return snapshot
+
+
+class LocalServer:
+    """가짜 Ollama 서버들과, 그 서버들을 사용하는 uvicorn(server.app)을 임시 작업 폴더에서 실행합니다."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="load_test_")
+        self.fakes: List[FakeOllama] = []
+        self.url = ""
+        self._uvicorn = None
+        self._thread: Optional[threading.Thread] = None
+        self._log = None
+
+    def start(self) -> None:
+        import uvicorn
+
+        args = self.args
+        self.fakes = [
+            FakeOllama(latency_s=args.latency, tokens_per_s=args.tokens_per_s, response_tokens=args.response_tokens,
+                       tool_call_rate=args.tool_call_rate, native_tools=not args.text_tools).start()
+            for _ in range(args.backends)
+        ]
+        # 서버 모듈은 설정을 임포트 시점에 읽으므로, 작업 폴더와 환경 변수를 먼저 정한 뒤 임포트합니다.
+        os.chdir(self.workdir)
+        os.environ["OLLAMA_BACKENDS"] = ",".join(fake.url for fake in self.fakes)
+        os.environ["RESPONSE_CACHE_ENABLED"] = "1" if args.response_cache else "0"
+        import model
+        model.OLLAMA_BASE_URL = self.fakes[0].url  # 임베딩 모델은 백엔드 풀이 아닌 OLLAMA_BASE_URL을 사용합니다.
+
+        # 서버의 DEBUG 출력은 server.log로 보내고, 진행 상황과 결과는 원래 표준 출력에 씁니다.
+        self._log = open(os.path.join(self.workdir, "server.log"), "w", encoding="utf-8")
+        sys.stdout = self._log
+        import server
+
+        port = _free_port()
+        config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        self._uvicorn = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._uvicorn.run, name="uvicorn", daemon=True)
+        self._thread.start()
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stop(self) -> None:
+        if self._uvicorn is not None:
+            self._uvicorn.should_exit = True
+            self._thread.join(timeout=10)
+        for fake in self.fakes:
+            fake.stop()
+        sys.stdout = sys.__stdout__
+        if self._log is not None:
+            self._log.close()
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout_s: float) -> Dict[str, Any]:
+    """/health/ready가 200을 반환할 때까지 기다립니다. (모델 워밍업과 RAG 인덱스 생성 완료)"""
+    deadline = time.monotonic() + timeout_s
+    last: Dict[str, Any] = {}
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/health/ready")
+            last = response.json()
+            if response.status_code == 200:
+                return last
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout_s}s: {last}")
+
+
+class Recorder:
+    """작업별 지연 시간(ms)과 상태 코드를 모읍니다."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.ttft: List[float] = []
+
+    def add(self, op: str, started: float, status: Any) -> None:
+        self.latencies.setdefault(op, []).append((time.perf_counter() - started) * 1000)
+        counts = self.statuses.setdefault(op, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+
+
+async def _chat(client, recorder, args, message, session_id):
+    """채팅 한 턴을 보내고 응답의 session_id를 반환합니다. 실패하면 기존 session_id를 그대로 반환합니다."""
+    payload = {"message": message, "session_id": session_id}
+    started = time.perf_counter()
+    try:
+        if not args.stream:
+            response = await client.post("/api/chat", json=payload)
+            recorder.add("chat", started, response.status_code)
+            return response.json().get("session_id", session_id) if response.status_code == 200 else session_id
+        event, first_token = None, True
+        async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+            # 스트리밍 응답은 항상 200으로 시작하므로, 처리 중 오류는 'error' 이벤트의 status_code로 기록합니다.
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: ") and event is not None:
+                    data = json.loads(line[len("data: "):])
+                    if event == "token" and first_token:
+                        recorder.ttft.append((time.perf_counter() - started) * 1000)
+                        first_token = False
+                    elif event in ("session", "saved"):
+                        session_id = data.get("session_id", session_id)
+                    elif event == "error":
+                        status = data.get("status_code", "error")
+        recorder.add("chat_stream", started, status)
+        return session_id
+    except httpx.HTTPError as e:
+        recorder.add("chat_stream" if args.stream else "chat", started, type(e).__name__)
+        return session_id
+
+
+async def _read_sessions(client, recorder, session_id):
+    started = time.perf_counter()
+    try:
+        response = await client.get("/api/chat/sessions", params={"limit": 20})
+        recorder.add("list_sessions", started, response.status_code)
+    except httpx.HTTPError as e:
+        recorder.add("list_sessions", started, type(e).__name__)
+    if session_id:
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"/api/chat/session/{session_id}")
+            recorder.add("load_session", started, response.status_code)
+        except httpx.HTTPError as e:
+            recorder.add("load_session", started, type(e).__name__)
+
+
+async def virtual_user(index, client, recorder, args, deadline):
+    """세션을 새로 시작해 --turns번 대화하고, --read-every 턴마다 세션 목록/기록을 읽는 사용자를 흉내 냅니다."""
+    rng = random.Random(args.seed * 100003 + index)
+    for session_no in range(args.sessions):
+        session_id = None
+        for turn in range(args.turns):
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            if rng.random() < args.repeat_ratio:
+                message = rng.choice(COMMON_QUESTIONS)
+            else:
+                message = f"사용자 {index}의 {session_no}-{turn}번째 질문: {rng.choice(COMMON_QUESTIONS)} 추가로 {rng.randint(1, 10**6)}번 건도 알려 주세요."
+            session_id = await _chat(client, recorder, args, message, session_id)
+            if args.read_every and (turn + 1) % args.read_every == 0:
+                await _read_sessions(client, recorder, session_id)
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+
+
+def _summarize(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    summary = {}
+    for op, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses.get(op, {})
+        ok = statuses.get("200", 0)
+        summary[op] = {
+            "count": len(latencies),
+            "ok": ok,
+            "rejected": statuses.get("429", 0) + statuses.get("503", 0),
+            "errors": len(latencies) - ok - statuses.get("429", 0) - statuses.get("503", 0),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(statistics.median(latencies), 1),
+            "p95_ms": round(_percentile(latencies, 95), 1),
+            "p99_ms": round(_percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+            "statuses": statuses,
+        }
+    if recorder.ttft:
+        summary["ttft"] = {
+            "count": len(recorder.ttft),
+            "p50_ms": round(statistics.median(recorder.ttft), 1),
+            "p95_ms": round(_percentile(recorder.ttft, 95), 1),
+            "p99_ms": round(_percentile(recorder.ttft, 99), 1),
+        }
+    return summary
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    config = result["config"]
+    print(f"users: {config['users']} x {config['sessions']} session(s) x {config['turns']} turn(s), "
+          f"{'stream' if config['stream'] else 'non-stream'}, elapsed {result['elapsed_s']:.2f}s")
+    print("op             |  count |  ok | rejected | errors |   req/s |  p50 ms |  p95 ms |  p99 ms |  max ms")
+    for op, row in result["summary"].items():
+        if op == "ttft":
+            continue
+        print(f"{op:<14} | {row['count']:>6} | {row['ok']:>3} | {row['rejected']:>8} | {row['errors']:>6} | "
+              f"{row['throughput_rps']:>7.2f} | {row['p50_ms']:>7.1f} | {row['p95_ms']:>7.1f} | {row['p99_ms']:>7.1f} | {row['max_ms']:>7.1f}")
+    if "ttft" in result["summary"]:
+        ttft = result["summary"]["ttft"]
+        print(f"time to first token: p50 {ttft['p50_ms']:.1f} ms | p95 {ttft['p95_ms']:.1f} ms | p99 {ttft['p99_ms']:.1f} ms")
+    before, after = result.get("db_before"), result.get("db_after")
+    if before and after:
+        print(f"db growth: {(after['bytes'] - before['bytes']) / 1024:.1f} KiB "
+              f"({before['bytes'] / 1024:.1f} -> {after['bytes'] / 1024:.1f} KiB), "
+              f"+{after['chat_sessions'] - before['chat_sessions']} sessions, "
+              f"+{after['chat_messages'] - before['chat_messages']} messages")
+    for name in ("scheduler", "response_cache"):
+        if result.get(name):
+            print(f"{name}: {json.dumps(result[name], ensure_ascii=False)}")
+    for fake in result.get("fake_ollama", []):
+        print(f"fake ollama {fake['url']}: {fake['requests']} (peak in flight {fake['peak_in_flight']})")
+
+
+async def run(args, base_url: str, db_dir: Optional[str], local: Optional[LocalServer]) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.users * 2 + 10, max_keepalive_connections=args.users * 2 + 10)
+    timeout = httpx.Timeout(args.request_timeout)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        print(f"waiting for {base_url}/health/ready ...", file=sys.__stdout__, flush=True)
+        await wait_until_ready(client, args.ready_timeout)
+        db_before = db_snapshot(db_dir)
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration if args.duration else None
+        print(f"running {args.users} virtual users ...", file=sys.__stdout__, flush=True)
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(index, client, recorder, args, deadline) for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+        extra = {}
+        for name, path in (("scheduler", "/api/llm/scheduler/stats"), ("response_cache", "/api/chat/cache/stats")):
+            try:
+                response = await client.get(path)
+                extra[name] = response.json() if response.status_code == 200 else None
+            except httpx.HTTPError:
+                extra[name] = None
+    return {
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "summary": _summarize(recorder, elapsed),
+        "db_before": db_before,
+        "db_after": db_snapshot(db_dir),
+        **extra,
+        "fake_ollama": [fake.stats() for fake in local.fakes] if local else [],
+    }
+
+
+def main(args):
+    local = None
+    if args.target:
+        base_url, db_dir = args.target.rstrip("/"), args.db_dir
+    else:
+        local = LocalServer(args)
+    try:
+        if local is not None:
+            local.start()
+            base_url, db_dir = local.url, local.workdir
+        result = asyncio.run(run(args, base_url, db_dir, local))
+    finally:
+        if local is not None:
+            local.stop()
+            print(f"server log: {os.path.join(local.workdir, 'server.log')}")
+    _print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # 부하 설정
+    parser.add_argument("--users", type=int, default=10, help="동시 가상 사용자 수")
+    parser.add_argument("--sessions", type=int, default=1, help="사용자당 대화 세션 수")
+    parser.add_argument("--turns", type=int, default=5, help="세션당 채팅 턴 수")
+    parser.add_argument("--duration", type=float, default=0, help="최대 실행 시간(초). 0이면 모든 턴을 마칠 때까지")
+    parser.add_argument("--stream", action="store_true", help="/api/chat 대신 /api/chat/stream 사용 (TTFT 측정)")
+    parser.add_argument("--read-every", type=int, default=2, help="이 턴 수마다 세션 목록과 세션 기록을 읽음 (0이면 읽지 않음)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="공통 질문(FAQ)을 보낼 비율(0~1)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="턴 사이 최대 대기 시간(초, 0~값 사이 무작위)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    # 가짜 Ollama 설정 (--target을 주지 않을 때)
+    parser.add_argument("--backends", type=int, default=1, help="가짜 Ollama 서버 수 (OLLAMA_BACKENDS)")
+    parser.add_argument("--latency", type=float, default=0.2, help="첫 토큰까지의 시간(초)")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0, help="생성 속도(토큰/초)")
+    parser.add_argument("--response-tokens", type=int, default=40, help="응답 토큰 수")
+    parser.add_argument("--tool-call-rate", type=float, default=0.3, help="지식 기반 검색 도구를 호출할 질문의 비율(0~1)")
+    parser.add_argument("--text-tools", action="store_true", help="도구 호출 미지원 모델처럼 동작 (텍스트 도구 호출 방식)")
+    parser.add_argument("--response-cache", action="store_true", help="응답 캐시 사용 (RESPONSE_CACHE_ENABLED=1)")
+    # 기존 서버 측정
+    parser.add_argument("--target", help="이미 실행 중인 서버 주소 (주면 가짜 Ollama와 서버를 띄우지 않음)")
+    parser.add_argument("--db-dir", help="--target 서버의 chat_history.db가 있는 폴더 (DB 증가량 측정용)")
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일 (변경 전후 비교용)")
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+# coalesce.py
+
+# 동시에 들어온 채팅 요청을 정리하는 비동기 도구 모음입니다.
+# - SessionLocks: 같은 세션의 턴은 도착한 순서대로 하나씩 처리하고(대화 기록 로드 -> 응답 -> 저장),
+#   다른 세션의 턴은 서로 기다리지 않고 병렬로 처리합니다.
+# - SingleFlight: 같은 키(세션 ID + 메시지)의 요청이 처리 중일 때 들어온 중복 요청(더블 클릭 재전송 등)은
+#   새로 처리하지 않고 진행 중인 처리의 결과를 함께 받습니다.
+# - EventBroadcast: 스트리밍 요청의 이벤트를 여러 구독자에게 전달합니다. (중복 스트리밍 요청의 단일 처리용)
+# 모두 이벤트 루프 하나(프로세스 하나) 안에서만 동작합니다.
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+class SessionLocks:
+    """
+    세션 ID별 asyncio.Lock 모음입니다.
+    asyncio.Lock은 기다리는 순서(FIFO)대로 깨우므로 같은 세션의 턴은 도착 순서대로 처리됩니다.
+    잠금을 쓰는 요청이 하나도 없으면 항목을 지워서 세션 수만큼 잠금이 쌓이지 않게 합니다.
+    """
+
+    def __init__(self):
+        # session_id -> (잠금, 이 잠금을 기다리거나 보유 중인 요청 수)
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(session_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[session_id]
+            if users <= 1:
+                del self._locks[session_id]
+            else:
+                self._locks[session_id] = (lock, users - 1)
+
+    def queued(self, session_id: str) -> int:
+        """해당 세션의 잠금을 보유 중이거나 기다리는 요청 수입니다."""
+        return self._locks.get(session_id, (None, 0))[1]
+
+class SingleFlight:
+    """
+    같은 키의 작업이 진행 중이면 새로 시작하지 않고 진행 중인 작업의 결과를 함께 받습니다.
+    결과(또는 예외)는 작업이 끝나면 버리므로, 끝난 뒤에 들어온 같은 키의 요청은 새로 처리됩니다.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(결과, 다른 요청의 결과를 공유했는지 여부)를 반환합니다."""
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = asyncio.ensure_future(factory())
+        self._calls[key] = future
+        future.add_done_callback(lambda _done: self._forget(key, future))
+        # shield: 먼저 온 요청이 취소되어도(클라이언트 연결 종료 등) 함께 기다리는 요청을 위해 작업은 계속됩니다.
+        return await asyncio.shield(future), False
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+class EventBroadcast:
+    """
+    한 생산자가 보내는 이벤트를 여러 구독자에게 전달합니다.
+    늦게 구독한 구독자도 처음 이벤트부터 모두 받으므로, 중복 스트리밍 요청도 같은 응답 전체를 받습니다.
+    """
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        # 기다리던 구독자를 깨우고, 다음 대기를 위해 새 Event로 교체합니다.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, event: Any) -> None:
+        self.events.append(event)
+        self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.closed:
+                return
+            await self._changed.wait()
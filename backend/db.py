@@ -5,11 +5,23 @@
 #                 별도의 서버 없이 파일 형태로 데이터베이스를 관리할 수 있게 해줍니다.
 import sqlite3
 # json (모듈): JSON(JavaScript Object Notation) 데이터를 파이썬 객체로, 파이썬 객체를 JSON 문자열로 변환하는 기능을 제공합니다.
-#             채팅 메시지 목록(리스트)을 SQLite DB의 TEXT 컬럼에 저장하고 불러올 때 사용됩니다.
+#             예전 버전에서 chat_sessions.messages 컬럼에 저장한 JSON 덩어리를 마이그레이션할 때 사용됩니다.
 import json
 # uuid (모듈): 고유한 식별자(Universally Unique Identifier)를 생성하기 위해 사용됩니다.
 #             채팅 세션의 고유 ID를 만들 때 사용됩니다.
 import uuid
+# threading (모듈): 여러 스레드가 동시에 같은 연결을 쓰지 않도록 잠금(Lock)을 제공합니다.
+import threading
+# queue (모듈): 읽기 전용 연결들을 담아두는 스레드 안전한 풀(Pool)로 사용됩니다.
+import queue
+# asyncio (모듈): 비동기 엔드포인트에서 DB 작업을 스레드 풀로 넘겨 이벤트 루프가 멈추지 않게 합니다.
+import asyncio
+# functools (모듈): 함수와 인자를 묶어(partial) 스레드 풀에 전달할 때 사용합니다.
+import functools
+# contextlib (모듈): with 문에서 쓸 수 있는 컨텍스트 매니저를 간단히 만들 수 있게 해줍니다.
+from contextlib import contextmanager
+# ThreadPoolExecutor (클래스): DB 작업 전용 스레드 풀입니다.
+from concurrent.futures import ThreadPoolExecutor
 # datetime (모듈): 날짜와 시간을 다루기 위해 사용됩니다.
 #                 채팅 메시지의 타임스탬프나 세션의 마지막 업데이트 시간을 저장할 때 사용됩니다.
 from datetime import datetime
@@ -18,72 +30,418 @@ from datetime import datetime
 # Dict (타입): '이 변수는 키(key)와 값(value)으로 이루어진 사전(딕셔너리)이야'라고 알려줍니다.
 # Optional (타입): '이 변수는 지정된 타입이거나 None(값이 없음)일 수 있어'라고 알려줍니다.
 # Tuple (타입): '이 변수는 여러 항목을 순서대로 담는 튜플이야'라고 알려줍니다.
-from typing import List, Dict, Optional, Tuple
+# Iterator (타입): with 문에서 연결을 하나씩 넘겨주는 제너레이터의 타입입니다.
+# Callable, Any, TypeVar (타입): 비동기 래퍼가 감싸는 함수와 반환값의 타입을 표현합니다.
+from typing import List, Dict, Optional, Tuple, Iterator, Callable, Any, TypeVar
+
+# span (함수): 비동기 DB 작업의 소요 시간(스레드 풀 대기 포함)을 'db.함수이름' 단계로 기록합니다. (metrics.py)
+from metrics import span
 
 # --- SQLite DB 파일 경로 정의 ---
 # DB_FILE (변수 - 사용자 정의): SQLite 데이터베이스 파일의 경로와 이름을 정의하는 변수입니다.
 #                            이 파일은 백엔드 프로젝트 루트(예: project05\backend) 아래에 생성됩니다.
 DB_FILE = "./chat_history.db"
 
+# --- 연결 풀 설정값 정의 ---
+# DB_READER_POOL_SIZE (변수 - 사용자 정의): 동시에 읽기 작업을 처리할 읽기 전용 연결의 수입니다.
+DB_READER_POOL_SIZE = 4
+# DB_BUSY_TIMEOUT_MS (변수 - 사용자 정의): 다른 프로세스가 쓰기 잠금을 잡고 있을 때 기다리는 최대 시간(밀리초)입니다.
+DB_BUSY_TIMEOUT_MS = 5000
+# DB_CACHE_SIZE_KB (변수 - 사용자 정의): 연결마다 사용할 페이지 캐시 크기(KB)입니다. (PRAGMA cache_size에 음수로 전달)
+DB_CACHE_SIZE_KB = 20000
+
+# --- 세션 목록 페이지 설정값 정의 ---
+# SESSION_PAGE_DEFAULT_LIMIT (변수 - 사용자 정의): 한 번에 돌려줄 세션 수의 기본값입니다.
+SESSION_PAGE_DEFAULT_LIMIT = 50
+# SESSION_PAGE_MAX_LIMIT (변수 - 사용자 정의): 한 번에 돌려줄 수 있는 세션 수의 최댓값입니다.
+SESSION_PAGE_MAX_LIMIT = 200
+
+# --- 대화 기록 검색 설정값 정의 ---
+# SEARCH_PAGE_DEFAULT_LIMIT / SEARCH_PAGE_MAX_LIMIT (변수 - 사용자 정의): 검색 결과 한 페이지의 기본/최대 개수입니다.
+SEARCH_PAGE_DEFAULT_LIMIT = 20
+SEARCH_PAGE_MAX_LIMIT = 100
+# SEARCH_MAX_TERMS (변수 - 사용자 정의): 검색어에서 사용할 최대 단어 수입니다. (너무 긴 검색어로 인한 느린 조회 방지)
+SEARCH_MAX_TERMS = 8
+# SEARCH_RANK_WINDOW (변수 - 사용자 정의): 관련도순 정렬에서 점수를 계산할 최근 일치 메시지 수입니다.
+#   흔한 단어는 수십만 개의 메시지와 일치하여 모두 점수를 매기면 느려지므로, 가장 최근에 일치한 이 개수의 메시지 안에서만
+#   관련도순으로 정렬합니다. (일치한 메시지가 이보다 적으면 전체를 정렬합니다.)
+SEARCH_RANK_WINDOW = 2000
+# SEARCH_SNIPPET_TOKENS (변수 - 사용자 정의): 검색 결과 발췌문(snippet)에 담을 최대 토큰(단어) 수입니다.
+SEARCH_SNIPPET_TOKENS = 16
+# SEARCH_HIGHLIGHT_START / SEARCH_HIGHLIGHT_END (변수 - 사용자 정의): 발췌문에서 일치한 단어를 감싸는 표시입니다.
+#   HTML 태그가 아니므로 프론트엔드에서 그대로 텍스트로 표시하거나 원하는 방식으로 바꿔 강조할 수 있습니다.
+SEARCH_HIGHLIGHT_START = "["
+SEARCH_HIGHLIGHT_END = "]"
+
+# --- 백그라운드 작업(chat_jobs) 설정값 정의 ---
+# JOB_FINISHED_STATUSES (변수 - 사용자 정의): 더 이상 바뀌지 않는 작업 상태입니다.
+JOB_FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+# class (키워드): 새로운 '클래스(Class)'를 정의할 때 사용하는 키워드입니다.
+# ConnectionManager (클래스 - 사용자 정의): 오래 유지되는 SQLite 연결들을 관리합니다.
+class ConnectionManager:
+    """
+    애플리케이션 수명 동안 유지되는 SQLite 연결 관리자입니다.
+    - WAL 저널 모드와 synchronous/cache 관련 PRAGMA를 설정합니다.
+    - 읽기 작업은 읽기 전용 연결 풀(reader pool)에서 연결을 빌려 처리합니다.
+    - 모든 쓰기 작업은 하나의 전용 쓰기 연결(writer)을 잠금으로 순서대로 사용합니다.
+    - 멀티 워커 서버에서는 프로세스마다 관리자가 따로 있습니다. 프로세스 간 쓰기는 BEGIN IMMEDIATE가 SQLite 쓰기 잠금을
+      기다리며(busy_timeout) 순서대로 처리되고, 읽기는 WAL 덕분에 다른 프로세스의 쓰기를 기다리지 않습니다.
+    """
+
+    def __init__(self, db_file: str, reader_pool_size: int = DB_READER_POOL_SIZE):
+        self.db_file = db_file
+        # 쓰기 연결은 하나만 만들고, threading.Lock으로 한 번에 한 스레드만 사용하게 합니다.
+        self._writer = self._connect()
+        self._writer_lock = threading.Lock()
+        # queue.Queue (클래스): 읽기 연결을 빌리고 돌려주는 스레드 안전한 풀입니다.
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(reader_pool_size):
+            reader = self._connect()
+            # PRAGMA query_only (SQL 구문): 읽기 연결에서 실수로 쓰기가 일어나지 않도록 막습니다.
+            reader.execute("PRAGMA query_only = ON")
+            self._readers.put(reader)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        PRAGMA가 적용된 새 연결을 만듭니다.
+        isolation_level=None (자동 커밋 모드)으로 열고, 트랜잭션은 writer()에서 직접 시작/종료합니다.
+        """
+        # check_same_thread=False (매개변수): 스레드 풀에서 연결을 공유할 수 있게 합니다. (동시 사용은 풀/잠금으로 막습니다.)
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None,
+                               timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        # journal_mode=WAL: 읽기와 쓰기가 서로를 막지 않아 "database is locked" 대기가 줄어듭니다.
+        conn.execute("PRAGMA journal_mode = WAL")
+        # synchronous=NORMAL: WAL 모드에서는 안전하면서도 커밋마다 fsync하지 않아 쓰기가 빨라집니다.
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """읽기 연결을 풀에서 빌려주고, with 블록이 끝나면 돌려받습니다."""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        전용 쓰기 연결로 트랜잭션을 실행합니다.
+        with 블록이 정상 종료되면 COMMIT, 예외가 발생하면 ROLLBACK합니다.
+        """
+        with self._writer_lock:
+            # BEGIN IMMEDIATE (SQL 구문): 트랜잭션 시작과 동시에 쓰기 잠금을 잡습니다.
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            else:
+                self._writer.execute("COMMIT")
+
+    def close(self) -> None:
+        """모든 연결을 닫습니다. 애플리케이션 종료 시 호출됩니다."""
+        with self._writer_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+# --- 전역 연결 관리자 (싱글톤) ---
+# _db_manager (변수): init_db()가 만든 ConnectionManager 인스턴스입니다. 아직 만들지 않았다면 None입니다.
+_db_manager: Optional[ConnectionManager] = None
+_db_manager_lock = threading.Lock()
+
 # def (키워드): 새로운 '함수(Function)'를 정의할 때 사용하는 키워드입니다.
 # init_db (함수 - 사용자 정의): 데이터베이스를 초기화하고 테이블을 생성하는 함수입니다.
-def init_db():
-    """
-    SQLite 데이터베이스를 초기화하고, 필요한 테이블을 생성합니다.
-    이 함수는 애플리케이션 시작 시 (또는 첫 DB 작업 시) 한 번만 호출되어야 합니다.
-    """
-    # sqlite3.connect (함수 - sqlite3 모듈): 지정된 DB_FILE (변수)에 연결합니다.
-    #                                    파일이 없으면 자동으로 새 파일을 생성합니다.
-    conn = sqlite3.connect(DB_FILE)
-    # .cursor (메서드): 데이터베이스 명령(SQL 쿼리)을 실행하는 데 사용되는 커서 객체를 생성합니다.
-    cursor = conn.cursor()
-    # .execute (메서드): SQL 쿼리 문자열을 실행합니다.
-    # CREATE TABLE IF NOT EXISTS (SQL 구문): 'chat_sessions' 테이블이 없으면 생성합니다.
-    # PRIMARY KEY (SQL 구문): 'session_id'를 테이블의 기본 키로 설정합니다. (각 행을 고유하게 식별)
-    # TEXT (SQL 데이터 타입): 문자열 데이터를 저장하는 컬럼 타입입니다.
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chat_sessions (
-            session_id TEXT PRIMARY KEY,
-            title TEXT,
-            messages TEXT,
-            timestamp TEXT
-        )
-    """)
-    # .commit (메서드): 현재까지의 모든 변경 사항(예: 테이블 생성)을 데이터베이스에 영구적으로 저장합니다.
-    conn.commit()
-    # .close (메서드): 데이터베이스 연결을 닫습니다.
-    conn.close()
+def init_db() -> ConnectionManager:
+    """
+    SQLite 데이터베이스를 초기화하고, 필요한 테이블을 생성한 뒤 연결 관리자를 반환합니다.
+    FastAPI lifespan에서 애플리케이션 시작 시 한 번 호출됩니다. 이미 초기화되었다면 아무 작업도 하지 않습니다.
+    예전 방식(chat_sessions.messages JSON 덩어리)으로 저장된 세션이 있으면 chat_messages 행으로 옮깁니다.
+    """
+    global _db_manager
+    with _db_manager_lock:
+        if _db_manager is not None:
+            return _db_manager
+        # ConnectionManager (클래스): 지정된 DB_FILE (변수)에 대한 연결들을 만듭니다.
+        #                             파일이 없으면 자동으로 새 파일을 생성합니다.
+        manager = ConnectionManager(DB_FILE)
+        with manager.writer() as conn:
+            # .execute (메서드): SQL 쿼리 문자열을 실행합니다.
+            # CREATE TABLE IF NOT EXISTS (SQL 구문): 'chat_sessions' 테이블이 없으면 생성합니다.
+            # PRIMARY KEY (SQL 구문): 'session_id'를 테이블의 기본 키로 설정합니다. (각 행을 고유하게 식별)
+            # TEXT (SQL 데이터 타입): 문자열 데이터를 저장하는 컬럼 타입입니다.
+            # messages (컬럼): 예전 버전의 JSON 덩어리 저장용 컬럼입니다. 마이그레이션 후에는 NULL로 비워 둡니다.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    messages TEXT,
+                    timestamp TEXT
+                )
+            """)
+            # 'chat_messages' 테이블: 메시지 한 개가 한 행입니다.
+            # seq (컬럼): 세션 안에서 메시지의 순서(0부터 시작)입니다. 턴마다 새 행만 추가(append)합니다.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    sender TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    timestamp TEXT
+                )
+            """)
+            # CREATE UNIQUE INDEX (SQL 구문): (session_id, seq) 인덱스로 세션별 조회/정렬과 다음 seq 계산을 빠르게 합니다.
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_session_seq
+                ON chat_messages (session_id, seq)
+            """)
+            # 'chat_messages_fts' 가상 테이블: 대화 기록 전문 검색(FTS5) 인덱스입니다.
+            # content='chat_messages' (외부 콘텐츠): 메시지 본문은 chat_messages에만 저장하고, 인덱스는 rowid로 연결합니다.
+            # tokenize='unicode61': 공백/문장 부호로 단어를 나눕니다. 검색어는 접두어 검색("휴가"* -> 휴가는, 휴가를)으로
+            #                       바꾸므로 조사가 붙은 한국어 단어도 찾습니다. prefix='2 3'은 짧은 접두어 검색용 인덱스입니다.
+            fts_created = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+            ).fetchone() is None
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(
+                    text, content='chat_messages', content_rowid='rowid', tokenize='unicode61', prefix='2 3'
+                )
+            """)
+            # CREATE TRIGGER (SQL 구문): 메시지 행이 추가/삭제/수정될 때 같은 트랜잭션 안에서 검색 인덱스도 함께 바꿉니다.
+            # 외부 콘텐츠 테이블은 삭제할 때 예전 본문을 'delete' 명령으로 넘겨야 인덱스에서 지워집니다.
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+                    INSERT INTO chat_messages_fts (rowid, text) VALUES (new.rowid, new.text);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+                    INSERT INTO chat_messages_fts (chat_messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF text ON chat_messages BEGIN
+                    INSERT INTO chat_messages_fts (chat_messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                    INSERT INTO chat_messages_fts (rowid, text) VALUES (new.rowid, new.text);
+                END
+            """)
+            if fts_created:
+                # 검색 인덱스를 처음 만들었다면 이미 저장된 메시지들을 한 번에 색인합니다.
+                conn.execute("INSERT INTO chat_messages_fts (chat_messages_fts) VALUES ('rebuild')")
+            # 세션 목록 페이지 조회(ORDER BY timestamp DESC)와 커서 비교를 인덱스만으로 처리합니다.
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chat_sessions_timestamp
+                ON chat_sessions (timestamp DESC, session_id DESC)
+            """)
+            # 'db_meta' 테이블: 세션 목록 버전(sessions_version)처럼 작은 상태 값을 저장합니다.
+            # sessions_version은 세션 목록이 바뀔 때마다 1씩 증가하며, ETag 계산에 사용됩니다.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS db_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('sessions_version', 0)")
+            # 'session_summaries' 테이블: 오래된 대화를 요약한 롤링 요약문을 세션별로 캐시합니다.
+            # covered_count (컬럼): 요약에 포함된 앞쪽 메시지 수입니다. (seq가 covered_count 미만인 메시지들)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    covered_count INTEGER NOT NULL,
+                    updated_at TEXT
+                )
+            """)
+            # 'response_cache' 테이블: 반복 질문에 대한 LLM 최종 응답 캐시입니다. (response_cache.py)
+            # cache_key (컬럼): 정규화된 질문 + 모델 이름 + 검색 문맥 해시 + 프롬프트 해시로 만든 키입니다.
+            # embedding (컬럼): 의미 유사도 비교용 질문 임베딩(JSON 배열)입니다. 의미 캐시를 쓰지 않으면 NULL입니다.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    context_hash TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    embedding TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_hit_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # 의미 캐시 후보(같은 모델, 같은 검색 문맥)를 찾는 조회와 LRU 제거 순서를 인덱스로 처리합니다.
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_context
+                ON response_cache (model, context_hash)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_last_hit
+                ON response_cache (last_hit_at)
+            """)
+            # 'chat_jobs' 테이블: POST /api/jobs로 들어온 채팅 턴의 영구 작업 대기열입니다. (jobs.py)
+            # status (컬럼): queued(대기) -> running(실행 중) -> succeeded / failed / cancelled
+            # worker_id / lease_expires_at (컬럼): 작업을 맡은 워커와 임대 만료 시각입니다. 워커는 실행 중 임대를 주기적으로
+            #   연장하며, 서버가 재시작되거나 죽어 임대가 만료된 작업은 다른 워커가 다시 가져가 처음부터 실행합니다.
+            # run_after (컬럼): 이 시각 이후에 실행합니다. (LLM 대기열이 가득 차 다시 대기열에 넣은 작업의 재시도 시각)
+            # cancel_requested (컬럼): 실행 중인 작업에 취소가 요청되면 1이 되고, 작업을 맡은 워커가 임대 연장 때 확인합니다.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    response TEXT,
+                    error TEXT,
+                    error_status INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    run_after REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # 상태별로 오래된 작업부터 가져오는 조회(대기열 순서, 대기 순번, 만료 작업 정리)를 인덱스로 처리합니다.
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chat_jobs_status_created
+                ON chat_jobs (status, created_at)
+            """)
+            # 예전 JSON 덩어리를 행 단위로 옮기는 마이그레이션을 실행합니다.
+            migrated = _migrate_session_blobs(conn)
+        _db_manager = manager
     # print (함수 - 파이썬 내장): 디버깅 메시지를 콘솔에 출력합니다.
-    print(f"[DB DEBUG] SQLite DB initialized and table created at {DB_FILE}")
+    print(f"[DB DEBUG] SQLite DB initialized (WAL, {DB_READER_POOL_SIZE} readers + 1 writer) at {DB_FILE}")
+    if migrated:
+        print(f"[DB DEBUG] Migrated {migrated} legacy session blob(s) into chat_messages.")
+    return manager
+
+# close_db (함수 - 사용자 정의): 애플리케이션 종료 시 연결 관리자의 모든 연결을 닫습니다.
+def close_db() -> None:
+    """
+    init_db()로 만든 연결 관리자를 닫습니다. FastAPI lifespan 종료 시 호출됩니다.
+    """
+    global _db_manager
+    with _db_manager_lock:
+        if _db_manager is not None:
+            _db_manager.close()
+            _db_manager = None
+
+# _get_manager (함수 - 사용자 정의): 내부용 함수로, 초기화된 연결 관리자를 반환합니다.
+def _get_manager() -> ConnectionManager:
+    """
+    연결 관리자를 반환합니다. lifespan 밖(스크립트 등)에서 호출되어 아직 초기화 전이라면 init_db()를 한 번 실행합니다.
+    """
+    manager = _db_manager
+    if manager is None:
+        manager = init_db()
+    return manager
+
+# _migrate_session_blobs (함수 - 사용자 정의): 내부용 마이그레이션 함수입니다.
+def _migrate_session_blobs(conn: sqlite3.Connection) -> int:
+    """
+    chat_sessions.messages 컬럼에 JSON 문자열로 남아 있는 예전 대화 기록을 chat_messages 행으로 분리합니다.
+    옮긴 세션의 messages 컬럼은 NULL로 비워서 다시 마이그레이션되지 않도록 합니다.
+    옮긴 세션 수를 반환합니다. (트랜잭션은 호출한 쪽에서 관리합니다.)
+    """
+    rows = conn.execute(
+        "SELECT session_id, messages FROM chat_sessions WHERE messages IS NOT NULL AND messages != ''"
+    ).fetchall()
+    for session_id, messages_json in rows:
+        try:
+            messages = json.loads(messages_json)
+        except (TypeError, ValueError):
+            print(f"[DB DEBUG] Skipping unreadable legacy messages for session '{session_id}'.")
+            continue
+        # 이미 일부 행이 있는 세션(중단된 마이그레이션 등)은 기존 행을 지우고 다시 씁니다.
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, seq, sender, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, seq, msg.get("sender"), msg.get("text", ""), msg.get("timestamp"))
+             for seq, msg in enumerate(messages)]
+        )
+        conn.execute("UPDATE chat_sessions SET messages = NULL WHERE session_id = ?", (session_id,))
+    return len(rows)
+
+# _bump_sessions_version (함수 - 사용자 정의): 세션 목록이 바뀌었음을 기록하는 내부용 함수입니다.
+def _bump_sessions_version(conn: sqlite3.Connection) -> None:
+    """
+    db_meta의 sessions_version을 1 증가시킵니다. 세션을 추가/수정/삭제하는 쓰기 트랜잭션 안에서 호출합니다.
+    버전이 DB에 저장되므로 여러 프로세스가 같은 DB를 쓰더라도 ETag가 일관되게 바뀝니다.
+    """
+    conn.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'sessions_version'")
+
+# def (키워드): 새로운 함수를 정의합니다.
+# append_chat_messages (함수 - 사용자 정의): 이번 턴에 새로 생긴 메시지만 세션 끝에 추가하는 함수입니다.
+# session_id (매개변수): 메시지를 추가할 세션의 고유 ID (문자열).
+# title (매개변수): 세션의 제목 (문자열).
+# new_messages (매개변수): 새로 추가할 메시지 목록 (딕셔너리 리스트, 보통 사용자 메시지와 AI 응답 2개).
+def append_chat_messages(session_id: str, title: str, new_messages: List[Dict]) -> None:
+    """
+    새 메시지들만 chat_messages 테이블에 행으로 추가하고, 세션의 제목과 마지막 업데이트 시간을 갱신합니다.
+    기존 메시지는 다시 쓰지 않으므로 턴당 비용이 대화 길이와 무관합니다.
+    """
+    current_time = datetime.now().isoformat()
+    # writer (메서드): 전용 쓰기 연결로 트랜잭션을 엽니다. (BEGIN IMMEDIATE로 같은 seq를 동시에 계산하는 일을 막습니다.)
+    with _get_manager().writer() as conn:
+        # ON CONFLICT ... DO UPDATE (SQL 구문): 세션이 있으면 제목/시간만 갱신하고, 없으면 새로 만듭니다.
+        conn.execute("""
+            INSERT INTO chat_sessions (session_id, title, timestamp)
+            VALUES (?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET title = excluded.title, timestamp = excluded.timestamp
+        """, (session_id, title, current_time))
+        # MAX(seq) (SQL 함수): (session_id, seq) 인덱스 덕분에 세션 길이와 관계없이 바로 찾습니다.
+        next_seq = conn.execute(
+            "SELECT COALESCE(MAX(seq), -1) + 1 FROM chat_messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        # .executemany (메서드): 같은 SQL을 여러 값 묶음으로 반복 실행합니다.
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, seq, sender, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, next_seq + offset, msg["sender"], msg["text"], msg.get("timestamp", current_time))
+             for offset, msg in enumerate(new_messages)]
+        )
+        _bump_sessions_version(conn)
 
 # def (키워드): 새로운 함수를 정의합니다.
-# save_chat_session (함수 - 사용자 정의): 채팅 세션 데이터를 저장하거나 업데이트하는 함수입니다.
+# save_chat_session (함수 - 사용자 정의): 채팅 세션 데이터를 통째로 저장하거나 교체하는 함수입니다.
 # session_id (매개변수): 저장할 세션의 고유 ID (문자열).
 # title (매개변수): 세션의 제목 (문자열).
 # messages (매개변수): 세션의 모든 채팅 메시지 목록 (딕셔너리 리스트).
 def save_chat_session(session_id: str, title: str, messages: List[Dict]) -> None:
     """
-    특정 채팅 세션의 메시지 목록을 SQLite DB에 저장하거나 업데이트합니다.
-    messages는 Dict 리스트여야 하며, JSON 문자열로 변환하여 저장합니다.
+    특정 채팅 세션의 메시지 목록 전체를 SQLite DB에 저장하거나 교체합니다.
+    messages는 Dict 리스트여야 합니다. 기존 메시지 행을 모두 지우고 다시 쓰므로,
+    턴마다 새 메시지를 저장할 때는 append_chat_messages를 사용하십시오.
     """
-    conn = sqlite3.connect(DB_FILE) # sqlite3.connect (함수)
-    cursor = conn.cursor() # .cursor (메서드)
-    # json.dumps (함수 - json 모듈): 파이썬 리스트(messages)를 JSON 형식의 문자열로 변환합니다.
-    #                               DB의 TEXT 컬럼에 저장하기 위함입니다.
-    messages_json = json.dumps(messages)
     # datetime.now() (함수 - datetime 모듈): 현재 날짜와 시간을 가져옵니다.
     # .isoformat() (메서드): 날짜와 시간을 ISO 8601 형식의 문자열로 변환합니다.
-    current_time = datetime.now().isoformat() 
-
-    # .execute (메서드): SQL 쿼리를 실행합니다.
-    # INSERT OR REPLACE INTO (SQL 구문): 'session_id'가 이미 존재하면 해당 행을 업데이트하고, 없으면 새로 삽입합니다.
-    # VALUES (?, ?, ?, ?) (SQL 구문): 물음표(?)는 나중에 실제 값이 들어갈 '플레이스홀더'입니다.
-    cursor.execute("""
-        INSERT OR REPLACE INTO chat_sessions (session_id, title, messages, timestamp)
-        VALUES (?, ?, ?, ?)
-    """, (session_id, title, messages_json, current_time)) # 플레이스홀더에 실제 값들을 튜플로 전달합니다.
-    conn.commit() # .commit (메서드): 변경 사항을 DB에 저장합니다.
-    conn.close() # .close (메서드)
+    current_time = datetime.now().isoformat()
+
+    with _get_manager().writer() as conn:
+        # .execute (메서드): SQL 쿼리를 실행합니다.
+        # INSERT OR REPLACE INTO (SQL 구문): 'session_id'가 이미 존재하면 해당 행을 업데이트하고, 없으면 새로 삽입합니다.
+        # VALUES (?, ?, ?) (SQL 구문): 물음표(?)는 나중에 실제 값이 들어갈 '플레이스홀더'입니다.
+        conn.execute("""
+            INSERT OR REPLACE INTO chat_sessions (session_id, title, messages, timestamp)
+            VALUES (?, ?, NULL, ?)
+        """, (session_id, title, current_time)) # 플레이스홀더에 실제 값들을 튜플로 전달합니다.
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, seq, sender, text, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, seq, msg["sender"], msg["text"], msg.get("timestamp", current_time))
+             for seq, msg in enumerate(messages)]
+        )
+        # 메시지를 통째로 바꿨으므로 예전 요약은 더 이상 맞지 않습니다.
+        conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+        _bump_sessions_version(conn)
     # print (함수 - 파이썬 내장)
     # print(f"[DB DEBUG] Chat session '{session_id}' saved/updated.") # DEBUG 제거
 
@@ -91,36 +449,32 @@ def load_chat_session(session_id: str) -> Optional[List[Dict]]: # load_chat_sess
     """
     특정 채팅 세션 ID에 해당하는 메시지 목록을 SQLite DB에서 불러옵니다.
     """
-    conn = sqlite3.connect(DB_FILE) # sqlite3.connect (함수)
-    cursor = conn.cursor() # .cursor (메서드)
-    # .execute (메서드): SELECT (SQL 구문) 쿼리를 실행하여 'messages' 컬럼의 값을 가져옵니다.
-    # WHERE (SQL 구문): 특정 조건(session_id가 일치하는)에 해당하는 행만 선택합니다.
-    cursor.execute("SELECT messages FROM chat_sessions WHERE session_id = ?", (session_id,))
-    # .fetchone (메서드): 쿼리 결과 중 첫 번째 행을 튜플 형태로 가져옵니다. 결과가 없으면 None을 반환합니다.
-    row = cursor.fetchone()
-    conn.close() # .close (메서드)
-    # if (조건문): row (변수)에 값이 있다면 (세션을 찾았다면)
-    if row:
-        # json.loads (함수 - json 모듈): DB에서 읽어온 JSON 문자열(row[0])을 파이썬 리스트로 다시 변환합니다.
-        return json.loads(row[0]) 
-    # print (함수 - 파이썬 내장)
-    # print(f"[DB DEBUG] Chat session '{session_id}' not found.") # DEBUG 제거
-    # None (값): 세션을 찾지 못하면 None을 반환합니다.
-    return None
+    # reader (메서드): 읽기 연결 풀에서 연결을 하나 빌려옵니다.
+    with _get_manager().reader() as conn:
+        # .execute (메서드): 세션이 존재하는지 먼저 확인합니다.
+        # WHERE (SQL 구문): 특정 조건(session_id가 일치하는)에 해당하는 행만 선택합니다.
+        # .fetchone (메서드): 쿼리 결과 중 첫 번째 행을 튜플 형태로 가져옵니다. 결과가 없으면 None을 반환합니다.
+        if conn.execute("SELECT 1 FROM chat_sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+            # print(f"[DB DEBUG] Chat session '{session_id}' not found.") # DEBUG 제거
+            # None (값): 세션을 찾지 못하면 None을 반환합니다.
+            return None
+        # ORDER BY seq (SQL 구문): (session_id, seq) 인덱스를 따라 메시지를 순서대로 읽습니다.
+        rows = conn.execute(
+            "SELECT sender, text, timestamp FROM chat_messages WHERE session_id = ? ORDER BY seq",
+            (session_id,)
+        ).fetchall()
+    return [{"sender": row[0], "text": row[1], "timestamp": row[2]} for row in rows]
 
 def get_all_session_titles() -> List[Dict[str, str]]: # get_all_session_titles (함수 - 사용자 정의)
     """
     저장된 모든 채팅 세션의 ID와 제목, 마지막 업데이트 시간 목록을 반환합니다.
     """
-    conn = sqlite3.connect(DB_FILE) # sqlite3.connect (함수)
-    cursor = conn.cursor() # .cursor (메서드)
-    # .execute (메서드): 모든 세션의 ID, 제목, 타임스탬프를 가져옵니다.
-    # ORDER BY (SQL 구문): 'timestamp' 컬럼을 기준으로 내림차순(DESC) 정렬하여 최신 세션이 먼저 오도록 합니다.
-    cursor.execute("SELECT session_id, title, timestamp FROM chat_sessions ORDER BY timestamp DESC")
-    # .fetchall (메서드): 쿼리 결과의 모든 행을 튜플들의 리스트 형태로 가져옵니다.
-    rows = cursor.fetchall()
-    conn.close() # .close (메서드)
-    
+    with _get_manager().reader() as conn:
+        # .execute (메서드): 모든 세션의 ID, 제목, 타임스탬프를 가져옵니다.
+        # ORDER BY (SQL 구문): 'timestamp' 컬럼을 기준으로 내림차순(DESC) 정렬하여 최신 세션이 먼저 오도록 합니다.
+        # .fetchall (메서드): 쿼리 결과의 모든 행을 튜플들의 리스트 형태로 가져옵니다.
+        rows = conn.execute("SELECT session_id, title, timestamp FROM chat_sessions ORDER BY timestamp DESC").fetchall()
+
     # sessions (변수 - 사용자 정의): 결과를 딕셔너리 리스트 형태로 변환하여 저장할 리스트입니다.
     sessions = []
     # for (키워드): rows (변수)의 각 행을 반복합니다.
@@ -135,19 +489,390 @@ def get_all_session_titles() -> List[Dict[str, str]]: # get_all_session_titles (
     # print(f"[DB DEBUG] Retrieved {len(sessions)} session titles.") # DEBUG 제거
     return sessions # 변환된 세션 목록 리스트 반환
 
+# get_session_titles_page (함수 - 사용자 정의): 세션 목록을 최신순으로 한 페이지씩 반환합니다.
+# limit (매개변수): 한 페이지에 담을 세션 수.
+# before (매개변수): 이전 페이지의 next_before 커서. 이 커서보다 오래된 세션만 반환합니다. (None이면 첫 페이지)
+def get_session_titles_page(limit: int = SESSION_PAGE_DEFAULT_LIMIT, before: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    키셋(keyset) 페이지네이션으로 세션 목록을 최신순으로 반환합니다.
+    (세션 목록, 다음 페이지 커서) 튜플을 반환하며, 마지막 페이지이면 커서는 None입니다.
+    커서는 "timestamp|session_id" 형식이며, (timestamp, session_id) 인덱스를 따라 바로 이어서 읽으므로
+    세션이 아무리 많아도 페이지당 비용이 일정합니다.
+    """
+    limit = max(1, min(limit, SESSION_PAGE_MAX_LIMIT))
+    with _get_manager().reader() as conn:
+        if before:
+            # .partition (메서드): 커서를 timestamp와 session_id로 나눕니다. session_id가 없으면 timestamp만 비교합니다.
+            before_timestamp, _, before_session_id = before.partition("|")
+            if before_session_id:
+                # (a, b) < (?, ?) (SQL 구문): 행 값 비교로 (timestamp, session_id) 순서상 커서 다음 행부터 읽습니다.
+                rows = conn.execute("""
+                    SELECT session_id, title, timestamp FROM chat_sessions
+                    WHERE (timestamp, session_id) < (?, ?)
+                    ORDER BY timestamp DESC, session_id DESC LIMIT ?
+                """, (before_timestamp, before_session_id, limit + 1)).fetchall()
+            else:
+                rows = conn.execute("""
+                    SELECT session_id, title, timestamp FROM chat_sessions
+                    WHERE timestamp < ?
+                    ORDER BY timestamp DESC, session_id DESC LIMIT ?
+                """, (before_timestamp, limit + 1)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT session_id, title, timestamp FROM chat_sessions
+                ORDER BY timestamp DESC, session_id DESC LIMIT ?
+            """, (limit + 1,)).fetchall()
+
+    # limit + 1개를 읽어서, 하나가 더 있으면 다음 페이지가 있다는 뜻입니다.
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    sessions = [{"session_id": row[0], "title": row[1], "timestamp": row[2]} for row in rows]
+    next_before = f"{rows[-1][2]}|{rows[-1][0]}" if has_more else None
+    return sessions, next_before
+
+# get_sessions_version (함수 - 사용자 정의): 세션 목록 버전 번호를 반환합니다.
+def get_sessions_version() -> int:
+    """
+    세션 목록이 바뀔 때마다 증가하는 버전 번호를 반환합니다.
+    기본 키 조회 한 번이면 되므로, 목록이 바뀌지 않았는지(ETag) 확인하는 데 사용합니다.
+    """
+    with _get_manager().reader() as conn:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'sessions_version'").fetchone()
+    return row[0] if row else 0
+
+# _build_search_query (함수 - 사용자 정의): 사용자가 입력한 검색어를 FTS5 MATCH 구문으로 바꾸는 내부용 함수입니다.
+def _build_search_query(query: str) -> Optional[str]:
+    """
+    공백으로 나눈 각 단어를 큰따옴표로 감싼 접두어 검색어("단어"*)로 바꾸고 모두 포함(AND)하도록 이어 붙입니다.
+    따옴표로 감싸므로 사용자가 입력한 AND/OR/NEAR, 괄호, * 같은 FTS5 문법 문자는 일반 글자로 취급됩니다.
+    검색할 단어가 없으면 None을 반환합니다.
+    """
+    terms = []
+    for term in query.split()[:SEARCH_MAX_TERMS]:
+        # 단어에 글자나 숫자가 하나도 없으면(문장 부호만 있으면) 토크나이저가 버리므로 건너뜁니다.
+        if not any(ch.isalnum() for ch in term):
+            continue
+        terms.append('"' + term.replace('"', '""') + '"*')
+    return " ".join(terms) if terms else None
+
+# search_chat_messages (함수 - 사용자 정의): 모든 대화 기록에서 검색어가 들어간 메시지를 찾습니다.
+# query (매개변수): 사용자가 입력한 검색어. 모든 단어가 들어간 메시지만 찾습니다.
+# limit / offset (매개변수): 페이지 크기와 건너뛸 결과 수. (다음 페이지는 응답의 next_offset을 사용)
+# order (매개변수): "rank"(관련도순, BM25) 또는 "recent"(최근 메시지순).
+def search_chat_messages(query: str, limit: int = SEARCH_PAGE_DEFAULT_LIMIT, offset: int = 0,
+                         order: str = "rank") -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    FTS5 인덱스로 메시지를 검색하여 (결과 목록, 다음 페이지 offset) 튜플을 반환합니다. 마지막 페이지이면 offset은 None입니다.
+    결과마다 세션 ID/제목, 메시지 순서(seq), 보낸 쪽, 시간, 일치한 단어를 표시한 발췌문과 점수를 담습니다.
+    검색할 단어가 없으면 ValueError를 발생시킵니다.
+    인덱스 안에서 정렬과 LIMIT을 먼저 처리한 뒤 해당 페이지의 행만 메시지/세션 테이블과 연결합니다.
+    관련도순은 최근 SEARCH_RANK_WINDOW개의 일치 메시지 안에서만 점수를 계산하므로, 흔한 단어를 검색해도 비용이 일정합니다.
+    """
+    match = _build_search_query(query)
+    if match is None:
+        raise ValueError("검색할 단어가 없습니다.")
+    limit = max(1, min(limit, SEARCH_PAGE_MAX_LIMIT))
+    offset = max(0, offset)
+    # rank (FTS5 숨은 컬럼): 기본값은 bm25() 점수이며 값이 작을수록 관련도가 높습니다.
+    order_by = "rank" if order == "rank" else "rowid DESC"
+    with _get_manager().reader() as conn:
+        min_rowid = 0
+        if order == "rank":
+            # 최근 순서(rowid 내림차순)로 SEARCH_RANK_WINDOW번째 일치 메시지의 rowid를 찾습니다. (점수 계산 없이 인덱스만 읽음)
+            # FTS5는 rowid 범위 조건을 인덱스에서 바로 처리하므로, 아래 조회는 이 범위의 메시지만 점수를 매깁니다.
+            row = conn.execute("""
+                SELECT rowid FROM chat_messages_fts WHERE chat_messages_fts MATCH ?
+                ORDER BY rowid DESC LIMIT 1 OFFSET ?
+            """, (match, SEARCH_RANK_WINDOW - 1)).fetchone()
+            min_rowid = row[0] if row else 0
+        rows = conn.execute(f"""
+            WITH hits AS (
+                SELECT rowid, rank,
+                       snippet(chat_messages_fts, 0, ?, ?, '…', ?) AS snippet
+                FROM chat_messages_fts
+                WHERE chat_messages_fts MATCH ? AND rowid >= ?
+                ORDER BY {order_by} LIMIT ? OFFSET ?
+            )
+            SELECT m.session_id, s.title, m.seq, m.sender, m.timestamp, hits.snippet, hits.rank
+            FROM hits
+            JOIN chat_messages m ON m.rowid = hits.rowid
+            LEFT JOIN chat_sessions s ON s.session_id = m.session_id
+            ORDER BY hits.{order_by}
+        """, (SEARCH_HIGHLIGHT_START, SEARCH_HIGHLIGHT_END, SEARCH_SNIPPET_TOKENS, match, min_rowid, limit + 1, offset)).fetchall()
+
+    # limit + 1개를 읽어서, 하나가 더 있으면 다음 페이지가 있다는 뜻입니다.
+    has_more = len(rows) > limit
+    results = [
+        {"session_id": row[0], "title": row[1], "seq": row[2], "sender": row[3], "timestamp": row[4],
+         "snippet": row[5], "score": round(-row[6], 4)}
+        for row in rows[:limit]
+    ]
+    return results, offset + limit if has_more else None
+
+# rebuild_chat_search_index (함수 - 사용자 정의): 검색 인덱스를 chat_messages 전체로부터 다시 만듭니다.
+def rebuild_chat_search_index() -> None:
+    """
+    검색 인덱스를 처음부터 다시 만듭니다. 인덱스는 chat_messages의 rowid로 메시지와 연결되므로,
+    DB 파일에 VACUUM을 실행해(rowid가 바뀔 수 있음) 검색 결과가 어긋나면 이 함수를 한 번 실행하십시오.
+    """
+    with _get_manager().writer() as conn:
+        conn.execute("INSERT INTO chat_messages_fts (chat_messages_fts) VALUES ('rebuild')")
+
+# load_session_summary (함수 - 사용자 정의): 세션의 롤링 요약을 불러옵니다.
+def load_session_summary(session_id: str) -> Optional[Tuple[str, int]]:
+    """
+    세션에 캐시된 롤링 요약을 (요약문, 요약에 포함된 메시지 수) 튜플로 반환합니다. 없으면 None을 반환합니다.
+    """
+    with _get_manager().reader() as conn:
+        row = conn.execute(
+            "SELECT summary, covered_count FROM session_summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+    return (row[0], row[1]) if row else None
+
+# save_session_summary (함수 - 사용자 정의): 세션의 롤링 요약을 저장하거나 갱신합니다.
+# covered_count (매개변수): 요약이 다루는 앞쪽 메시지 수.
+def save_session_summary(session_id: str, summary: str, covered_count: int) -> None:
+    """
+    세션의 롤링 요약을 저장합니다. 대화 창(window)이 밀려날 때만 호출됩니다.
+    """
+    with _get_manager().writer() as conn:
+        conn.execute("""
+            INSERT INTO session_summaries (session_id, summary, covered_count, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                summary = excluded.summary, covered_count = excluded.covered_count, updated_at = excluded.updated_at
+        """, (session_id, summary, covered_count, datetime.now().isoformat()))
+
+# load_cached_response (함수 - 사용자 정의): 응답 캐시에서 키가 정확히 같은 응답을 찾습니다.
+def load_cached_response(cache_key: str, now: float) -> Optional[str]:
+    """
+    만료되지 않은 캐시 응답을 반환하고 적중 횟수와 마지막 사용 시각(LRU 순서)을 갱신합니다. 없으면 None을 반환합니다.
+    """
+    with _get_manager().reader() as conn:
+        row = conn.execute(
+            "SELECT response FROM response_cache WHERE cache_key = ? AND expires_at > ?", (cache_key, now)
+        ).fetchone()
+    if row is None:
+        return None
+    touch_cached_response(cache_key, now)
+    return row[0]
+
+# find_cached_response_candidates (함수 - 사용자 정의): 의미 캐시 비교 대상(같은 모델, 같은 검색 문맥)을 가져옵니다.
+def find_cached_response_candidates(model: str, context_hash: str, now: float) -> List[Tuple[str, List[float], str]]:
+    """
+    같은 모델과 같은 검색 문맥으로 만든 만료되지 않은 응답들의 (키, 질문 임베딩, 응답) 목록을 반환합니다.
+    """
+    with _get_manager().reader() as conn:
+        rows = conn.execute("""
+            SELECT cache_key, embedding, response FROM response_cache
+            WHERE model = ? AND context_hash = ? AND expires_at > ? AND embedding IS NOT NULL
+        """, (model, context_hash, now)).fetchall()
+    return [(row[0], json.loads(row[1]), row[2]) for row in rows]
+
+# touch_cached_response (함수 - 사용자 정의): 캐시 응답의 적중 횟수와 마지막 사용 시각을 갱신합니다.
+def touch_cached_response(cache_key: str, now: float) -> None:
+    with _get_manager().writer() as conn:
+        conn.execute(
+            "UPDATE response_cache SET hits = hits + 1, last_hit_at = ? WHERE cache_key = ?", (now, cache_key)
+        )
+
+# save_cached_response (함수 - 사용자 정의): 응답을 캐시에 저장하고 만료/초과 항목을 정리합니다.
+# max_entries (매개변수): 캐시에 남길 최대 항목 수. 넘으면 가장 오래 사용하지 않은 항목부터 지웁니다.
+def save_cached_response(cache_key: str, model: str, context_hash: str, query: str, embedding: Optional[List[float]],
+                         response: str, now: float, ttl_s: float, max_entries: int) -> int:
+    """
+    응답을 저장하고, 만료된 항목과 최대 항목 수를 넘는 LRU 항목을 지웁니다. 지운 항목 수를 반환합니다.
+    """
+    with _get_manager().writer() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO response_cache
+                (cache_key, model, context_hash, query, embedding, response, created_at, expires_at, last_hit_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+        """, (cache_key, model, context_hash, query, json.dumps(embedding) if embedding is not None else None,
+              response, now, now + ttl_s, now))
+        evicted = conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,)).rowcount
+        evicted += conn.execute("""
+            DELETE FROM response_cache WHERE cache_key IN (
+                SELECT cache_key FROM response_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,)).rowcount
+    return evicted
+
+# get_response_cache_size (함수 - 사용자 정의): 응답 캐시에 저장된 항목 수를 반환합니다.
+def get_response_cache_size() -> int:
+    with _get_manager().reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+# clear_response_cache (함수 - 사용자 정의): 응답 캐시를 모두 지웁니다.
+def clear_response_cache() -> int:
+    with _get_manager().writer() as conn:
+        return conn.execute("DELETE FROM response_cache").rowcount
+
+# --- 백그라운드 작업 대기열 (chat_jobs) ---
+# 모든 상태 변경은 쓰기 트랜잭션(BEGIN IMMEDIATE) 안에서 조회와 변경을 함께 하므로,
+# 여러 워커(여러 프로세스 포함)가 같은 작업을 동시에 가져가지 않습니다.
+
+_JOB_COLUMNS = ("job_id, session_id, message, status, response, error, error_status, attempts, cancel_requested, "
+                "created_at, started_at, finished_at")
+
+def _job_row_to_dict(row: Tuple) -> Dict[str, Any]:
+    job = dict(zip([name.strip() for name in _JOB_COLUMNS.split(",")], row))
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+# enqueue_chat_job (함수 - 사용자 정의): 채팅 턴 작업을 대기열에 넣습니다.
+# max_queued (매개변수): 대기 중인 작업의 최대 수. 이미 이만큼 쌓여 있으면 넣지 않습니다.
+def enqueue_chat_job(job_id: str, session_id: str, message: str, now: float, max_queued: int) -> Optional[Dict[str, Any]]:
+    """작업을 queued 상태로 저장하고 작업 정보를 반환합니다. 대기열이 가득 찼으면 None을 반환합니다."""
+    with _get_manager().writer() as conn:
+        queued = conn.execute("SELECT COUNT(*) FROM chat_jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= max_queued:
+            return None
+        conn.execute(
+            "INSERT INTO chat_jobs (job_id, session_id, message, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, session_id, message, now),
+        )
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM chat_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _job_row_to_dict(row)
+
+# claim_chat_job (함수 - 사용자 정의): 실행할 작업 하나를 골라 worker_id의 작업으로 표시합니다.
+# lease_s (매개변수): 임대 시간(초). 이 시간 안에 heartbeat_chat_job으로 연장하지 않으면 다른 워커가 가져갈 수 있습니다.
+# max_attempts (매개변수): 한 작업의 최대 실행 시도 횟수. 임대가 만료된 작업이 이 횟수를 다 썼으면 실패로 끝냅니다.
+def claim_chat_job(worker_id: str, now: float, lease_s: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+    """
+    임대가 만료된 실행 중 작업(서버 재시작/장애로 중단된 작업)을 먼저, 없으면 가장 오래 기다린 대기 작업을 가져옵니다.
+    가져갈 작업이 없으면 None을 반환합니다.
+    """
+    with _get_manager().writer() as conn:
+        # 중단된 작업 중 취소가 요청되었거나 시도 횟수를 다 쓴 작업은 다시 실행하지 않고 끝냅니다.
+        conn.execute("""
+            UPDATE chat_jobs SET status = 'cancelled', finished_at = ?, worker_id = NULL
+            WHERE status = 'running' AND lease_expires_at < ? AND cancel_requested = 1
+        """, (now, now))
+        conn.execute("""
+            UPDATE chat_jobs SET status = 'failed', error = ?, error_status = 500, finished_at = ?, worker_id = NULL
+            WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?
+        """, ("작업 실행이 중단되었고 재시도 횟수를 모두 사용했습니다.", now, now, max_attempts))
+        row = conn.execute("""
+            SELECT job_id FROM chat_jobs WHERE status = 'running' AND lease_expires_at < ?
+            ORDER BY created_at LIMIT 1
+        """, (now,)).fetchone()
+        if row is None:
+            row = conn.execute("""
+                SELECT job_id FROM chat_jobs WHERE status = 'queued' AND run_after <= ?
+                ORDER BY created_at LIMIT 1
+            """, (now,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("""
+            UPDATE chat_jobs SET status = 'running', worker_id = ?, lease_expires_at = ?, attempts = attempts + 1,
+                started_at = ?, run_after = 0
+            WHERE job_id = ?
+        """, (worker_id, now + lease_s, now, row[0]))
+        claimed = conn.execute(f"SELECT {_JOB_COLUMNS} FROM chat_jobs WHERE job_id = ?", (row[0],)).fetchone()
+    return _job_row_to_dict(claimed)
+
+# heartbeat_chat_job (함수 - 사용자 정의): 실행 중인 작업의 임대를 연장하고 취소 요청 여부를 반환합니다.
+def heartbeat_chat_job(job_id: str, worker_id: str, now: float, lease_s: float) -> Optional[bool]:
+    """
+    취소가 요청되었으면 True, 아니면 False를 반환합니다.
+    작업이 더 이상 이 워커의 실행 중 작업이 아니면(임대 만료 후 다른 워커가 가져감 등) None을 반환합니다.
+    """
+    with _get_manager().writer() as conn:
+        updated = conn.execute(
+            "UPDATE chat_jobs SET lease_expires_at = ? WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+            (now + lease_s, job_id, worker_id),
+        ).rowcount
+        if not updated:
+            return None
+        return bool(conn.execute("SELECT cancel_requested FROM chat_jobs WHERE job_id = ?", (job_id,)).fetchone()[0])
+
+# finish_chat_job (함수 - 사용자 정의): worker_id가 실행 중인 작업을 끝난 상태(succeeded/failed/cancelled)로 바꿉니다.
+def finish_chat_job(job_id: str, worker_id: str, status: str, now: float, response: Optional[str] = None,
+                    error: Optional[str] = None, error_status: Optional[int] = None) -> bool:
+    """작업이 아직 이 워커의 실행 중 작업이면 결과를 저장하고 True를 반환합니다."""
+    if status not in JOB_FINISHED_STATUSES:
+        raise ValueError(f"Unknown finished job status: {status}")
+    with _get_manager().writer() as conn:
+        return conn.execute("""
+            UPDATE chat_jobs SET status = ?, response = ?, error = ?, error_status = ?, finished_at = ?,
+                worker_id = NULL, lease_expires_at = NULL
+            WHERE job_id = ? AND worker_id = ? AND status = 'running'
+        """, (status, response, error, error_status, now, job_id, worker_id)).rowcount > 0
+
+# requeue_chat_job (함수 - 사용자 정의): worker_id가 실행 중인 작업을 run_after 이후에 다시 실행하도록 대기열에 돌려놓습니다.
+def requeue_chat_job(job_id: str, worker_id: str, run_after: float, error: Optional[str] = None,
+                     error_status: Optional[int] = None) -> bool:
+    """
+    실행되지 못한 시도이므로 시도 횟수를 되돌리고, 마지막 오류는 기록해 둡니다.
+    작업이 아직 이 워커의 실행 중 작업이면 True를 반환합니다.
+    """
+    with _get_manager().writer() as conn:
+        return conn.execute("""
+            UPDATE chat_jobs SET status = 'queued', run_after = ?, error = ?, error_status = ?, attempts = attempts - 1,
+                worker_id = NULL, lease_expires_at = NULL
+            WHERE job_id = ? AND worker_id = ? AND status = 'running'
+        """, (run_after, error, error_status, job_id, worker_id)).rowcount > 0
+
+# cancel_chat_job (함수 - 사용자 정의): 작업 취소를 요청합니다.
+def cancel_chat_job(job_id: str, now: float) -> Optional[Dict[str, Any]]:
+    """
+    대기 중인 작업은 바로 cancelled로 바꾸고, 실행 중인 작업은 cancel_requested를 표시합니다.
+    (실행 중인 작업은 맡은 워커가 멈춘 뒤 cancelled가 됩니다.) 이미 끝난 작업은 바꾸지 않습니다.
+    바뀐 뒤의 작업 정보를 반환하며, 작업이 없으면 None을 반환합니다.
+    """
+    with _get_manager().writer() as conn:
+        conn.execute("UPDATE chat_jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                     (now, job_id))
+        conn.execute("UPDATE chat_jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM chat_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _job_row_to_dict(row) if row is not None else None
+
+# get_chat_job (함수 - 사용자 정의): 작업 정보를 가져옵니다.
+def get_chat_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """작업 정보를 반환합니다. 대기 중인 작업이면 앞에 기다리는 작업 수(queue_position)도 넣습니다. 없으면 None입니다."""
+    with _get_manager().reader() as conn:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM chat_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _job_row_to_dict(row)
+        if job["status"] == "queued":
+            job["queue_position"] = conn.execute(
+                "SELECT COUNT(*) FROM chat_jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+            ).fetchone()[0]
+    return job
+
+# get_chat_job_counts (함수 - 사용자 정의): 상태별 작업 수를 반환합니다.
+def get_chat_job_counts() -> Dict[str, int]:
+    with _get_manager().reader() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM chat_jobs GROUP BY status").fetchall()
+    counts = {status: 0 for status in ("queued", "running") + JOB_FINISHED_STATUSES}
+    counts.update({row[0]: row[1] for row in rows})
+    return counts
+
+# purge_chat_jobs (함수 - 사용자 정의): before 이전에 끝난 작업을 지웁니다.
+def purge_chat_jobs(before: float) -> int:
+    """끝난 작업 중 finished_at이 before보다 오래된 작업을 지우고 지운 개수를 반환합니다."""
+    with _get_manager().writer() as conn:
+        return conn.execute(
+            f"DELETE FROM chat_jobs WHERE status IN ({','.join('?' * len(JOB_FINISHED_STATUSES))}) AND finished_at < ?",
+            (*JOB_FINISHED_STATUSES, before),
+        ).rowcount
+
 def delete_chat_session(session_id: str) -> bool: # delete_chat_session (함수 - 사용자 정의)
     """
     특정 채팅 세션 ID에 해당하는 대화 기록을 DB에서 삭제합니다.
     성공 시 True, 실패 시 False를 반환합니다.
     """
-    conn = sqlite3.connect(DB_FILE) # sqlite3.connect (함수)
-    cursor = conn.cursor() # .cursor (메서드)
-    # .execute (메서드): DELETE (SQL 구문) 쿼리를 실행하여 특정 조건(session_id가 일치하는)의 행을 삭제합니다.
-    cursor.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
-    conn.commit() # .commit (메서드): 변경 사항을 DB에 저장합니다.
-    # .rowcount (속성): 마지막으로 실행된 쿼리에 의해 영향을 받은 행의 수를 반환합니다.
-    deleted_rows = cursor.rowcount
-    conn.close() # .close (메서드)
+    with _get_manager().writer() as conn:
+        # .execute (메서드): DELETE (SQL 구문) 쿼리를 실행하여 특정 조건(session_id가 일치하는)의 행을 삭제합니다.
+        # .rowcount (속성): 마지막으로 실행된 쿼리에 의해 영향을 받은 행의 수를 반환합니다.
+        deleted_rows = conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount
+        # 세션에 속한 메시지 행도 함께 삭제합니다.
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+        if deleted_rows > 0:
+            _bump_sessions_version(conn)
     # if (조건문): deleted_rows (변수)가 0보다 크다면 (삭제된 행이 있다면)
     if deleted_rows > 0:
         # print (함수 - 파이썬 내장)
@@ -156,3 +881,132 @@ def delete_chat_session(session_id: str) -> bool: # delete_chat_session (함수
     # print (함수 - 파이썬 내장)
     # print(f"[DB DEBUG] Chat session '{session_id}' not found for deletion.") # DEBUG 제거
     return False # 삭제 실패 시 False 반환
+
+# --- 비동기 데이터 접근 API ---
+# 아래 함수들은 위의 동기 함수들을 DB 전용 스레드 풀에서 실행합니다.
+# FastAPI의 async 엔드포인트와 LangGraph의 채팅 처리에서는 이 함수들을 사용해야
+# 느린 디스크 쓰기가 이벤트 루프의 다른 요청들을 멈추게 하지 않습니다.
+
+# _db_executor (변수): DB 작업 전용 스레드 풀입니다. 읽기 연결 수 + 쓰기 연결 1개만큼의 스레드를 둡니다.
+#                      asyncio 기본 스레드 풀(도구 실행 등)과 분리하여 서로 자리를 빼앗지 않게 합니다.
+_db_executor = ThreadPoolExecutor(max_workers=DB_READER_POOL_SIZE + 1, thread_name_prefix="db")
+
+_T = TypeVar("_T")
+
+async def _run_db(func: Callable[..., _T], *args: Any) -> _T:
+    """동기 DB 함수를 DB 전용 스레드 풀에서 실행하고 결과를 기다립니다."""
+    loop = asyncio.get_running_loop()
+    with span(f"db.{func.__name__}"):
+        return await loop.run_in_executor(_db_executor, functools.partial(func, *args))
+
+async def init_db_async() -> ConnectionManager:
+    """init_db()의 비동기 버전입니다."""
+    return await _run_db(init_db)
+
+async def append_chat_messages_async(session_id: str, title: str, new_messages: List[Dict]) -> None:
+    """append_chat_messages()의 비동기 버전입니다."""
+    await _run_db(append_chat_messages, session_id, title, new_messages)
+
+async def save_chat_session_async(session_id: str, title: str, messages: List[Dict]) -> None:
+    """save_chat_session()의 비동기 버전입니다."""
+    await _run_db(save_chat_session, session_id, title, messages)
+
+async def load_chat_session_async(session_id: str) -> Optional[List[Dict]]:
+    """load_chat_session()의 비동기 버전입니다."""
+    return await _run_db(load_chat_session, session_id)
+
+async def get_all_session_titles_async() -> List[Dict[str, str]]:
+    """get_all_session_titles()의 비동기 버전입니다."""
+    return await _run_db(get_all_session_titles)
+
+async def get_session_titles_page_async(limit: int = SESSION_PAGE_DEFAULT_LIMIT, before: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """get_session_titles_page()의 비동기 버전입니다."""
+    return await _run_db(get_session_titles_page, limit, before)
+
+async def get_sessions_version_async() -> int:
+    """get_sessions_version()의 비동기 버전입니다."""
+    return await _run_db(get_sessions_version)
+
+async def search_chat_messages_async(query: str, limit: int = SEARCH_PAGE_DEFAULT_LIMIT, offset: int = 0,
+                                     order: str = "rank") -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """search_chat_messages()의 비동기 버전입니다."""
+    return await _run_db(search_chat_messages, query, limit, offset, order)
+
+async def rebuild_chat_search_index_async() -> None:
+    """rebuild_chat_search_index()의 비동기 버전입니다."""
+    await _run_db(rebuild_chat_search_index)
+
+async def load_session_summary_async(session_id: str) -> Optional[Tuple[str, int]]:
+    """load_session_summary()의 비동기 버전입니다."""
+    return await _run_db(load_session_summary, session_id)
+
+async def save_session_summary_async(session_id: str, summary: str, covered_count: int) -> None:
+    """save_session_summary()의 비동기 버전입니다."""
+    await _run_db(save_session_summary, session_id, summary, covered_count)
+
+async def delete_chat_session_async(session_id: str) -> bool:
+    """delete_chat_session()의 비동기 버전입니다."""
+    return await _run_db(delete_chat_session, session_id)
+
+async def load_cached_response_async(cache_key: str, now: float) -> Optional[str]:
+    """load_cached_response()의 비동기 버전입니다."""
+    return await _run_db(load_cached_response, cache_key, now)
+
+async def find_cached_response_candidates_async(model: str, context_hash: str, now: float) -> List[Tuple[str, List[float], str]]:
+    """find_cached_response_candidates()의 비동기 버전입니다."""
+    return await _run_db(find_cached_response_candidates, model, context_hash, now)
+
+async def touch_cached_response_async(cache_key: str, now: float) -> None:
+    """touch_cached_response()의 비동기 버전입니다."""
+    await _run_db(touch_cached_response, cache_key, now)
+
+async def save_cached_response_async(cache_key: str, model: str, context_hash: str, query: str, embedding: Optional[List[float]],
+                                     response: str, now: float, ttl_s: float, max_entries: int) -> int:
+    """save_cached_response()의 비동기 버전입니다."""
+    return await _run_db(save_cached_response, cache_key, model, context_hash, query, embedding, response, now, ttl_s, max_entries)
+
+async def get_response_cache_size_async() -> int:
+    """get_response_cache_size()의 비동기 버전입니다."""
+    return await _run_db(get_response_cache_size)
+
+async def clear_response_cache_async() -> int:
+    """clear_response_cache()의 비동기 버전입니다."""
+    return await _run_db(clear_response_cache)
+
+async def enqueue_chat_job_async(job_id: str, session_id: str, message: str, now: float, max_queued: int) -> Optional[Dict[str, Any]]:
+    """enqueue_chat_job()의 비동기 버전입니다."""
+    return await _run_db(enqueue_chat_job, job_id, session_id, message, now, max_queued)
+
+async def claim_chat_job_async(worker_id: str, now: float, lease_s: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+    """claim_chat_job()의 비동기 버전입니다."""
+    return await _run_db(claim_chat_job, worker_id, now, lease_s, max_attempts)
+
+async def heartbeat_chat_job_async(job_id: str, worker_id: str, now: float, lease_s: float) -> Optional[bool]:
+    """heartbeat_chat_job()의 비동기 버전입니다."""
+    return await _run_db(heartbeat_chat_job, job_id, worker_id, now, lease_s)
+
+async def finish_chat_job_async(job_id: str, worker_id: str, status: str, now: float, response: Optional[str] = None,
+                                error: Optional[str] = None, error_status: Optional[int] = None) -> bool:
+    """finish_chat_job()의 비동기 버전입니다."""
+    return await _run_db(finish_chat_job, job_id, worker_id, status, now, response, error, error_status)
+
+async def requeue_chat_job_async(job_id: str, worker_id: str, run_after: float, error: Optional[str] = None,
+                                 error_status: Optional[int] = None) -> bool:
+    """requeue_chat_job()의 비동기 버전입니다."""
+    return await _run_db(requeue_chat_job, job_id, worker_id, run_after, error, error_status)
+
+async def cancel_chat_job_async(job_id: str, now: float) -> Optional[Dict[str, Any]]:
+    """cancel_chat_job()의 비동기 버전입니다."""
+    return await _run_db(cancel_chat_job, job_id, now)
+
+async def get_chat_job_async(job_id: str) -> Optional[Dict[str, Any]]:
+    """get_chat_job()의 비동기 버전입니다."""
+    return await _run_db(get_chat_job, job_id)
+
+async def get_chat_job_counts_async() -> Dict[str, int]:
+    """get_chat_job_counts()의 비동기 버전입니다."""
+    return await _run_db(get_chat_job_counts)
+
+async def purge_chat_jobs_async(before: float) -> int:
+    """purge_chat_jobs()의 비동기 버전입니다."""
+    return await _run_db(purge_chat_jobs, before)
@@ -0,0 +1,134 @@
+# history.py
+
+# 대화 기록이 길어져도 LLM에 보내는 프롬프트 크기가 일정한 범위를 넘지 않도록 관리하는 모듈입니다.
+# - 최근 N턴은 토큰 예산 안에서 원문 그대로 유지합니다.
+# - 그보다 오래된 턴은 롤링 요약(rolling summary) 하나로 대체하고, 요약은 db.py의 session_summaries에 캐시합니다.
+# - 요약은 대화 창(window)이 밀려날 때만, 새로 밀려난 메시지만 반영하여 점진적으로 다시 계산합니다.
+
+from dataclasses import dataclass, field
+from typing import List, Dict
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from db import load_session_summary_async, save_session_summary_async
+from llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE
+from ollama_pool import ollama_pool
+from metrics import span, record_llm_usage
+
+# --- 대화 창(window) 설정값 정의 ---
+# HISTORY_TOKEN_BUDGET (변수 - 사용자 정의): 원문으로 유지할 최근 대화의 최대 토큰 수(추정치)입니다.
+HISTORY_TOKEN_BUDGET = 3000
+# HISTORY_MAX_TURNS (변수 - 사용자 정의): 원문으로 유지할 최근 턴(사용자 메시지 + AI 응답)의 최대 개수입니다.
+HISTORY_MAX_TURNS = 10
+# HISTORY_SLIDE_RATIO (변수 - 사용자 정의): 예산을 넘었을 때 원문 구간을 예산의 이 비율까지 줄입니다.
+#   매 턴마다 창이 한 칸씩 밀리면 요약을 매번 다시 계산해야 하므로, 한 번에 여유 있게 밀어서
+#   요약 재계산(추가 LLM 호출) 횟수를 줄이고 프롬프트 앞부분도 여러 턴 동안 그대로 유지되게 합니다.
+HISTORY_SLIDE_RATIO = 0.5
+# SUMMARY_MAX_CHARS (변수 - 사용자 정의): 요약문이 이 길이를 넘으면 잘라냅니다. (요약 자체가 무한히 커지는 것 방지)
+SUMMARY_MAX_CHARS = 2000
+
+@dataclass
+class HistoryWindow:
+    """
+    LLM에 보낼 대화 기록 창입니다.
+    summary: 창 밖으로 밀려난 오래된 대화의 요약 (없으면 빈 문자열)
+    messages: 원문 그대로 보낼 최근 메시지들 (db.py 형식의 dict 리스트)
+    """
+    summary: str = ""
+    messages: List[Dict] = field(default_factory=list)
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 토큰 수를 대략 추정합니다.
+    ASCII 문자는 약 4자당 1토큰, 한글 등 그 외 문자는 1자당 약 1토큰으로 계산합니다.
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def _turn_count(messages: List[Dict]) -> int:
+    """메시지 목록에 포함된 턴 수(사용자 메시지 수)를 셉니다."""
+    return sum(1 for msg in messages if msg["sender"] == "user")
+
+def _fits(messages: List[Dict], token_budget: int, max_turns: int) -> bool:
+    """메시지 목록이 토큰 예산과 턴 수 제한을 모두 지키는지 확인합니다."""
+    if _turn_count(messages) > max_turns:
+        return False
+    return sum(estimate_tokens(msg["text"]) for msg in messages) <= token_budget
+
+def _choose_window_start(chat_history: List[Dict], start: int) -> int:
+    """
+    원문으로 남길 구간의 시작 위치를 고릅니다.
+    뒤에서부터 (예산 x HISTORY_SLIDE_RATIO) 안에 들어가는 만큼만 남기고, 턴이 중간에 잘리지 않도록
+    시작 위치를 사용자 메시지에 맞춥니다. 최소한 마지막 한 턴은 항상 남깁니다.
+    """
+    token_budget = int(HISTORY_TOKEN_BUDGET * HISTORY_SLIDE_RATIO)
+    max_turns = max(1, int(HISTORY_MAX_TURNS * HISTORY_SLIDE_RATIO))
+    new_start = len(chat_history)
+    used_tokens = 0
+    turns = 0
+    for index in range(len(chat_history) - 1, start - 1, -1):
+        msg = chat_history[index]
+        used_tokens += estimate_tokens(msg["text"])
+        if msg["sender"] == "user":
+            turns += 1
+            if (used_tokens > token_budget or turns > max_turns) and new_start < len(chat_history):
+                break
+            # 사용자 메시지에서만 시작 위치를 옮겨서 (질문, 답변) 쌍이 갈라지지 않게 합니다.
+            new_start = index
+    return max(new_start, start)
+
+async def _summarize(llm, session_id: str, previous_summary: str, evicted: List[Dict]) -> str:
+    """
+    이전 요약과 새로 창 밖으로 밀려난 메시지들만 LLM에 보내 갱신된 요약을 만듭니다.
+    (전체 대화를 다시 요약하지 않으므로 비용이 밀려난 메시지 양에만 비례합니다.)
+    """
+    transcript = "\n".join(
+        f"{'사용자' if msg['sender'] == 'user' else 'AI'}: {msg['text']}" for msg in evicted
+    )
+    prompt = [
+        SystemMessage(content="당신은 대화 요약기입니다. 이후 대화에 필요한 사실, 결정 사항, 사용자 요청만 간결하게 한국어로 요약하십시오."),
+        HumanMessage(content=(
+            f"기존 요약:\n{previous_summary or '(없음)'}\n\n"
+            f"새로 추가할 대화:\n{transcript}\n\n"
+            "기존 요약과 새 대화를 합친 갱신된 요약만 출력하십시오."
+        )),
+    ]
+    async with llm_scheduler.slot(PRIORITY_INTERACTIVE):
+        # 요약도 세션이 쓰는 서버로 보내 대화 창 계산과 같은 서버의 캐시를 활용합니다.
+        with span("llm.summary"):
+            response = await ollama_pool.call(llm, session_id, lambda model: model.ainvoke(prompt))
+    record_llm_usage("summary", getattr(response, "response_metadata", None))
+    return str(response.content).strip()[:SUMMARY_MAX_CHARS]
+
+async def build_history_window(session_id: str, chat_history: List[Dict], llm) -> HistoryWindow:
+    """
+    저장된 전체 대화 기록(chat_history)으로부터 LLM에 보낼 대화 창을 만듭니다.
+    - 캐시된 요약이 다루는 앞부분(covered_count)은 건너뜁니다.
+    - 나머지가 예산 안에 들어가면 그대로 사용합니다. (추가 비용 없음)
+    - 예산을 넘으면 창을 밀고, 새로 밀려난 메시지만 기존 요약에 합쳐 요약을 갱신/저장합니다.
+      요약에 실패하면 요약 없이 잘라낸 최근 대화만 사용합니다.
+    """
+    cached = await load_session_summary_async(session_id)
+    summary, covered = cached if cached else ("", 0)
+    if covered > len(chat_history):
+        # 기록이 요약보다 짧아졌다면(세션 교체 등) 캐시된 요약을 버립니다.
+        summary, covered = "", 0
+
+    recent = chat_history[covered:]
+    if _fits(recent, HISTORY_TOKEN_BUDGET, HISTORY_MAX_TURNS):
+        return HistoryWindow(summary=summary, messages=recent)
+
+    new_start = _choose_window_start(chat_history, covered)
+    evicted = chat_history[covered:new_start]
+    if not evicted:
+        # 마지막 한 턴만으로도 예산을 넘는 경우입니다. 더 밀어낼 메시지가 없으므로 그대로 보냅니다.
+        return HistoryWindow(summary=summary, messages=recent)
+    try:
+        new_summary = await _summarize(llm, session_id, summary, evicted)
+        await save_session_summary_async(session_id, new_summary, new_start)
+        print(f"[History DEBUG] Session '{session_id}' summary updated: covers {new_start} messages "
+              f"(+{len(evicted)} newly summarized).")
+        return HistoryWindow(summary=new_summary, messages=chat_history[new_start:])
+    except Exception as e:
+        print(f"[History DEBUG] ERROR summarizing session '{session_id}': {type(e).__name__} - {e}. Truncating instead.")
+        return HistoryWindow(summary=summary, messages=chat_history[new_start:])
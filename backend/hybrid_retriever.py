@@ -0,0 +1,172 @@
+# hybrid_retriever.py
+
+# RAG 검색을 위한 하이브리드 검색기 모듈입니다.
+# - 벡터 검색(Chroma): 의미가 비슷한 문장을 잘 찾지만, 제품명/정책 번호 같은 정확한 용어는 자주 놓칩니다.
+# - BM25 검색(로컬 역색인): Chroma에 저장된 것과 같은 청크(RecursiveCharacterTextSplitter 결과)로 만든 키워드 검색입니다.
+#   한국어는 형태소 분석기 없이도 부분 일치가 되도록 한글을 2글자 단위(bigram)로 나눠 색인합니다.
+# - 두 결과를 RRF(Reciprocal Rank Fusion)로 합치고, 선택적으로 가벼운 재정렬(rerank)을 거쳐
+#   k를 키우지 않고도 더 정확한 소수의 청크만 프롬프트에 넣습니다.
+
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from ingest import CHROMA_DB_DIR, get_index_state
+
+# --- 하이브리드 검색 설정값 정의 ---
+# HYBRID_CANDIDATES (변수 - 사용자 정의): 벡터 검색과 BM25 검색에서 각각 가져올 후보 수입니다.
+HYBRID_CANDIDATES = 20
+# RRF_K (변수 - 사용자 정의): RRF 점수 1 / (RRF_K + 순위)의 상수입니다. 일반적으로 60을 사용합니다.
+RRF_K = 60
+# BM25_K1 / BM25_B (변수 - 사용자 정의): BM25 공식의 단어 빈도 포화 정도와 문서 길이 보정 정도입니다.
+BM25_K1 = 1.5
+BM25_B = 0.75
+# RERANK_CANDIDATES (변수 - 사용자 정의): 재정렬할 RRF 상위 후보 수입니다.
+RERANK_CANDIDATES = 10
+# RERANK_MIN_RELATIVE_SCORE (변수 - 사용자 정의): 재정렬 점수가 1위 점수의 이 비율보다 낮은 청크는 버립니다.
+#   관련성이 약한 청크가 k개를 채우려고 프롬프트에 들어가는 것을 막습니다.
+RERANK_MIN_RELATIVE_SCORE = 0.5
+
+_WORD_PATTERN = re.compile(r"[0-9a-z]+(?:[-_.][0-9a-z]+)*|[가-힣]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    BM25용 토큰화입니다. 영문/숫자는 단어 단위(예: 'x-200', 'a.1'), 한글은 2글자 단위로 나눕니다.
+    ('스마트폰은' -> '스마', '마트', '트폰', '폰은') 조사가 붙어도 앞부분 bigram이 일치하므로 검색됩니다.
+    """
+    tokens: List[str] = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if "가" <= word[0] <= "힣":
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+class BM25Index:
+    """
+    메모리 역색인 기반 BM25 검색기입니다. (외부 라이브러리 없음)
+    postings: 단어 -> [(청크 번호, 단어 빈도), ...] 이므로 질문에 나온 단어의 문서만 점수를 계산합니다.
+    """
+
+    def __init__(self, documents: Sequence[Document]):
+        self.documents = list(documents)
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for index, document in enumerate(self.documents):
+            counts = Counter(tokenize(document.page_content))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((index, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.documents) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """질문과 BM25 점수가 높은 청크 k개를 (Document, 점수) 목록으로 반환합니다."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for index, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / (self.avg_length or 1))
+                scores[index] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[index], score) for index, score in ranked]
+
+def _doc_key(document: Document) -> str:
+    """벡터 검색 결과와 BM25 결과에서 같은 청크를 알아보기 위한 키입니다. (ingest.py의 chunk_id)"""
+    return document.metadata.get("chunk_id") or document.id or document.page_content
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Document]], rrf_k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """여러 검색 결과 순위를 RRF로 합칩니다. 점수 = 각 목록에서의 1 / (rrf_k + 순위)의 합"""
+    scores: Dict[str, float] = defaultdict(float)
+    documents: Dict[str, Document] = {}
+    for ranked in ranked_lists:
+        for rank, document in enumerate(ranked, start=1):
+            key = _doc_key(document)
+            scores[key] += 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    return sorted(((documents[key], score) for key, score in scores.items()), key=lambda item: item[1], reverse=True)
+
+def coverage_reranker(index: BM25Index, query: str, fused: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """
+    가벼운 재정렬기입니다. (추가 모델 호출 없음)
+    점수 = 0.5 x (RRF 점수 / 1위 RRF 점수) + 0.5 x (질문 단어 중 청크에 들어 있는 비율, IDF 가중)
+    제품명/정책 번호처럼 드물고 중요한 단어를 실제로 포함한 청크가 위로 올라옵니다.
+    """
+    terms = set(tokenize(query))
+    if not fused or not terms:
+        return fused
+    weights = {term: index.idf(term) for term in terms}
+    total_weight = sum(weights.values()) or 1.0
+    top_fused = fused[0][1] or 1.0
+    rescored = []
+    for document, fused_score in fused:
+        chunk_terms = set(tokenize(document.page_content))
+        coverage = sum(weight for term, weight in weights.items() if term in chunk_terms) / total_weight
+        rescored.append((document, 0.5 * fused_score / top_fused + 0.5 * coverage))
+    return sorted(rescored, key=lambda item: item[1], reverse=True)
+
+# RERANKERS (변수): 이름으로 고를 수 있는 재정렬기 목록입니다. (None이면 재정렬하지 않음)
+RERANKERS: Dict[str, Callable[[BM25Index, str, List[Tuple[Document, float]]], List[Tuple[Document, float]]]] = {
+    "coverage": coverage_reranker,
+}
+
+class HybridSearcher:
+    """
+    벡터 검색 + BM25 검색 + RRF (+ 선택적 재정렬) 검색기입니다.
+    BM25 색인은 Chroma 컬렉션의 청크로 만들고, 수집으로 인덱스 상태(ingest manifest)가 바뀌면 다음 검색 때 다시 만듭니다.
+    retrieval_cache.CachedRetriever의 searcher로 사용됩니다.
+    """
+
+    def __init__(self, vectorstore: Any, chroma_dir: str = CHROMA_DB_DIR,
+                 candidates: int = HYBRID_CANDIDATES, reranker: Optional[str] = "coverage"):
+        self.vectorstore = vectorstore
+        self.chroma_dir = chroma_dir
+        self.candidates = candidates
+        self.reranker = RERANKERS[reranker] if reranker else None
+        self._index: Optional[BM25Index] = None
+        self._index_state: Any = None
+        self._lock = threading.Lock()
+
+    def _get_index(self) -> BM25Index:
+        """BM25 색인을 반환합니다. 인덱스 상태가 바뀌었으면 Chroma에서 청크를 다시 읽어 색인을 새로 만듭니다."""
+        state = get_index_state(self.chroma_dir)
+        with self._lock:
+            if self._index is None or state != self._index_state:
+                started = time.perf_counter()
+                data = self.vectorstore.get(include=["documents", "metadatas"])
+                documents = [
+                    Document(id=chunk_id, page_content=text or "", metadata=metadata or {})
+                    for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+                ]
+                self._index = BM25Index(documents)
+                self._index_state = state
+                print(f"[HybridRetriever DEBUG] BM25 index built over {len(documents)} chunks "
+                      f"in {time.perf_counter() - started:.2f}s.")
+            return self._index
+
+    def search(self, query: str, embedding: List[float], k: int) -> List[Document]:
+        """질문과 질문 임베딩으로 하이브리드 검색을 하여 최대 k개의 청크를 반환합니다."""
+        index = self._get_index()
+        vector_hits = self.vectorstore.similarity_search_by_vector(embedding, k=self.candidates)
+        bm25_hits = [document for document, _score in index.search(query, self.candidates)]
+        fused = reciprocal_rank_fusion([vector_hits, bm25_hits])
+        if self.reranker:
+            reranked = self.reranker(index, query, fused[:RERANK_CANDIDATES])
+            if reranked:
+                threshold = reranked[0][1] * RERANK_MIN_RELATIVE_SCORE
+                fused = [(document, score) for document, score in reranked if score >= threshold]
+        return [document for document, _score in fused[:k]]
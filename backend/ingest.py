@@ -0,0 +1,392 @@
+# ingest.py
+
+# RAG 문서(./data)를 ChromaDB에 점진적으로(incremental) 반영하는 수집(ingestion) 모듈입니다.
+# - 파일별 내용 해시(sha256), 수정 시각(mtime), 크기와 그 파일에서 만든 청크 ID 목록을 manifest 파일에 기록합니다.
+# - mtime과 크기가 그대로인 파일은 읽지도 않고 건너뛰므로, 변경이 없을 때 재시작 비용은 stat 호출 정도입니다.
+# - 내용이 바뀐 파일은 다시 분할한 뒤, 청크 ID(파일 경로 + 청크 내용 해시)를 비교하여
+#   새로 생긴 청크만 임베딩하고 사라진 청크의 벡터는 삭제합니다.
+# - ./data에서 삭제된 파일의 벡터도 삭제합니다.
+# - 파일을 하나씩 읽어 청크를 흘려보내고(streaming), 배치 단위로 묶어 제한된 개수의 임베딩 요청을 동시에 보냅니다.
+# - 여러 프로세스(멀티 워커 서버, 명령줄 실행)가 같은 chroma_db를 쓰므로, 수집은 파일 잠금(index_file_lock)을 잡고 한 번에 하나만 실행합니다.
+#
+# 명령줄 실행 예시 (backend 폴더에서, Ollama 서버 실행 중):
+#   python ingest.py            # 변경분만 반영
+#   python ingest.py --full     # manifest를 무시하고 전체 다시 임베딩
+#   python ingest.py --batch-size 128 --concurrency 8
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_chroma import Chroma
+from chromadb.api.client import SharedSystemClient
+from filelock import FileLock
+
+from model import OLLAMA_EMBEDDING_MODEL_NAME
+
+# --- 수집 설정값 정의 ---
+# DATA_DIR (변수 - 사용자 정의): RAG 원본 문서(.txt)가 있는 폴더입니다.
+DATA_DIR = "./data"
+# CHROMA_DB_DIR (변수 - 사용자 정의): ChromaDB가 벡터를 저장하는 폴더입니다.
+CHROMA_DB_DIR = "./chroma_db"
+# MANIFEST_FILE_NAME (변수 - 사용자 정의): CHROMA_DB_DIR 안에 저장되는 manifest 파일 이름입니다.
+#   벡터 저장소와 같은 폴더에 두어, chroma_db 폴더를 지우면 manifest도 함께 초기화되게 합니다.
+MANIFEST_FILE_NAME = "ingest_manifest.json"
+# CHUNK_SIZE / CHUNK_OVERLAP (변수 - 사용자 정의): 문서 분할 설정입니다.
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# EMBED_BATCH_SIZE (변수 - 사용자 정의): 임베딩 요청 하나에 담아 보낼 청크 수입니다.
+EMBED_BATCH_SIZE = 64
+# EMBED_CONCURRENCY (변수 - 사용자 정의): 동시에 진행할 임베딩 요청의 최대 개수입니다.
+#   Ollama 서버의 OLLAMA_NUM_PARALLEL 값보다 크게 잡아도 서버에서 줄을 서므로 이득이 없습니다.
+EMBED_CONCURRENCY = 4
+# PROGRESS_LOG_INTERVAL_S (변수 - 사용자 정의): 진행 상황(처리량 chunks/s)을 출력하는 주기(초)입니다.
+PROGRESS_LOG_INTERVAL_S = 5.0
+# MANIFEST_SAVE_INTERVAL_S (변수 - 사용자 정의): 수집 도중 manifest를 중간 저장하는 주기(초)입니다.
+MANIFEST_SAVE_INTERVAL_S = 10.0
+# MANIFEST_FORMAT (변수): manifest 구조가 바뀌면 올려서 전체 재수집을 유도합니다.
+MANIFEST_FORMAT = 1
+# INDEX_LOCK_TIMEOUT_S (변수 - 사용자 정의): 다른 프로세스의 수집(처음 인덱스 만들기 포함)이 끝나기를 기다리는 최대 시간(초)입니다.
+#   넘으면 filelock.Timeout 예외가 발생하고, 서버는 다음 백그라운드 수집 주기에 다시 시도합니다.
+INDEX_LOCK_TIMEOUT_S = 600.0
+
+# _ingest_lock (변수): 한 프로세스 안에서 수집 작업이 동시에 두 번 실행되지 않도록 막는 잠금입니다.
+#   (서버 시작 시 수집과 백그라운드 주기 수집이 겹치는 경우 등)
+_ingest_lock = threading.Lock()
+# _index_file_locks (변수): chroma_db 폴더별 파일 잠금입니다. 같은 경로는 같은 FileLock을 재사용하여 다시 잡을 수 있게(재진입) 합니다.
+_index_file_locks: Dict[str, FileLock] = {}
+_index_file_locks_guard = threading.Lock()
+
+@dataclass
+class IngestReport:
+    """한 번의 수집 실행 결과입니다."""
+    files_added: int = 0
+    files_updated: int = 0
+    files_removed: int = 0
+    files_unchanged: int = 0
+    files_retouched: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    files_to_check: int = 0
+    full_rebuild: bool = False
+    chunks_per_s: float = 0.0
+    duration_s: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        """벡터 저장소 내용이 바뀌었는지 여부입니다."""
+        return bool(self.chunks_added or self.chunks_deleted)
+
+    @property
+    def manifest_changed(self) -> bool:
+        """manifest 내용이 바뀌었는지 여부입니다. (변경이 없으면 manifest 파일을 다시 쓰지 않습니다.)"""
+        return bool(self.changed or self.full_rebuild or self.files_added or self.files_updated
+                    or self.files_removed or self.files_retouched)
+
+@dataclass
+class _FileUpdate:
+    """한 파일의 새 청크를 모두 내보낸 뒤 manifest에 반영할 내용입니다."""
+    rel_path: str
+    entry: Dict[str, Any]
+    stale_ids: List[str]
+    is_new: bool
+
+@dataclass
+class _Batch:
+    """임베딩 요청 하나로 보낼 청크 묶음과, 이 배치가 저장되면 완료되는 파일들입니다."""
+    ids: List[str] = field(default_factory=list)
+    documents: List[Document] = field(default_factory=list)
+    file_updates: List[_FileUpdate] = field(default_factory=list)
+
+def _manifest_path(chroma_dir: str) -> str:
+    return os.path.join(chroma_dir, MANIFEST_FILE_NAME)
+
+def _index_settings() -> Dict[str, Any]:
+    """청크 ID와 벡터 값에 영향을 주는 설정들입니다. 하나라도 바뀌면 전체를 다시 임베딩해야 합니다."""
+    return {
+        "format": MANIFEST_FORMAT,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": OLLAMA_EMBEDDING_MODEL_NAME,
+    }
+
+def load_manifest(chroma_dir: str = CHROMA_DB_DIR) -> Optional[Dict[str, Any]]:
+    """manifest를 읽습니다. 없거나 손상되었으면 None을 반환합니다."""
+    try:
+        with open(_manifest_path(chroma_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"[Ingest DEBUG] WARNING: Ignoring unreadable manifest: {type(e).__name__} - {e}")
+        return None
+
+def get_index_state(chroma_dir: str = CHROMA_DB_DIR) -> Optional[Tuple[int, int]]:
+    """
+    manifest 파일의 (수정 시각 ns, 크기)를 인덱스 상태 토큰으로 반환합니다. (manifest가 없으면 None)
+    수집으로 벡터 저장소가 바뀔 때만 manifest가 다시 쓰이므로, 토큰이 달라지면 인덱스가 바뀐 것입니다.
+    JSON을 읽지 않고 stat만 하므로 검색할 때마다 호출해도 비용이 거의 없고, 다른 프로세스(ingest.py 명령줄 등)의 변경도 감지합니다.
+    """
+    try:
+        stat = os.stat(_manifest_path(chroma_dir))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _save_manifest(chroma_dir: str, manifest: Dict[str, Any]) -> None:
+    """manifest를 임시 파일에 쓴 뒤 교체하여, 쓰는 도중 중단되어도 파일이 깨지지 않게 합니다."""
+    os.makedirs(chroma_dir, exist_ok=True)
+    path = _manifest_path(chroma_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def _scan_data_dir(data_dir: str) -> Dict[str, os.stat_result]:
+    """data_dir의 .txt 파일들을 (상대 경로 -> stat 결과)로 반환합니다."""
+    files = {}
+    for root, _dirs, names in os.walk(data_dir):
+        for name in names:
+            if name.endswith(".txt"):
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, data_dir).replace(os.sep, "/")
+                files[rel_path] = os.stat(full_path)
+    return files
+
+def _split_file(data_dir: str, rel_path: str, content: bytes) -> Tuple[List[str], List[Document]]:
+    """
+    파일 내용을 청크로 나누고 (청크 ID 목록, Document 목록)을 반환합니다.
+    청크 ID는 파일 경로와 청크 내용의 해시로 만들어, 내용이 같은 청크는 수정 전후에 같은 ID를 갖습니다.
+    (한 파일 안에 같은 내용의 청크가 여러 개면 뒤에 순번을 붙여 구분합니다.)
+    """
+    source = os.path.join(data_dir, rel_path)
+    text = content.decode("utf-8", errors="replace")
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_documents([Document(page_content=text, metadata={"source": source})])
+    ids: List[str] = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        digest = hashlib.sha1(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunk_id = f"{rel_path}#{digest}-{occurrence}"
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return ids, chunks
+
+def index_file_lock(chroma_dir: str = CHROMA_DB_DIR) -> FileLock:
+    """
+    chroma_dir를 쓰는 모든 프로세스가 공유하는 파일 잠금(chroma_db.lock)을 반환합니다. (with 문으로 사용)
+    잠금 파일은 chroma_db 폴더 옆에 두어, 폴더를 지우고 다시 만드는 동안에도 잠금이 유지되게 합니다.
+    """
+    path = os.path.abspath(chroma_dir)
+    with _index_file_locks_guard:
+        lock = _index_file_locks.get(path)
+        if lock is None:
+            lock = FileLock(path.rstrip(os.sep) + ".lock", timeout=INDEX_LOCK_TIMEOUT_S)
+            _index_file_locks[path] = lock
+        return lock
+
+def open_vectorstore(embedding_model: Any, chroma_dir: str = CHROMA_DB_DIR, reopen: bool = False) -> Chroma:
+    """
+    ChromaDB 벡터 저장소를 엽니다. (폴더가 없으면 새로 만듭니다.)
+    ChromaDB는 프로세스 안에서 경로별 클라이언트와 벡터(HNSW) 인덱스를 메모리에 캐시하므로, 다른 프로세스가 추가한 벡터는
+    이미 열린 저장소의 검색 결과에 나오지 않습니다. reopen=True이면 이 캐시를 비우고 디스크에서 다시 엽니다.
+    """
+    if reopen:
+        SharedSystemClient.clear_system_cache()
+    return Chroma(persist_directory=chroma_dir, embedding_function=embedding_model)
+
+def _iter_changes(data_dir: str, files: Dict[str, Dict[str, Any]], candidates: List[str],
+                  current: Dict[str, os.stat_result], report: IngestReport) -> Iterator[Any]:
+    """
+    변경 후보 파일을 한 번에 하나씩 읽어 임베딩할 청크를 흘려보내는(streaming) 생성기입니다.
+    - (청크 ID, Document) 튜플: 새로 임베딩해야 하는 청크
+    - _FileUpdate: 그 파일의 청크를 모두 내보냈다는 표시 (모든 청크가 저장된 뒤 manifest에 반영)
+    파일 전체를 미리 메모리에 올리지 않으므로 문서가 아무리 많아도 메모리 사용량은 파일 하나 + 진행 중인 배치 정도입니다.
+    """
+    for rel_path in candidates:
+        stat = current[rel_path]
+        entry = files.get(rel_path)
+        with open(os.path.join(data_dir, rel_path), "rb") as f:
+            content = f.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        if entry and entry["sha256"] == content_hash:
+            # 수정 시각만 바뀐 경우 (touch, 복사 등): 다시 임베딩하지 않고 manifest만 갱신합니다.
+            entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            report.files_unchanged += 1
+            report.files_retouched += 1
+            continue
+
+        new_ids, chunks = _split_file(data_dir, rel_path, content)
+        old_ids = set(entry["chunk_ids"]) if entry else set()
+        new_id_set = set(new_ids)
+        for chunk_id, chunk in zip(new_ids, chunks):
+            if chunk_id not in old_ids:
+                yield chunk_id, chunk
+        yield _FileUpdate(
+            rel_path=rel_path,
+            entry={"sha256": content_hash, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "chunk_ids": new_ids},
+            stale_ids=[chunk_id for chunk_id in old_ids if chunk_id not in new_id_set],
+            is_new=entry is None,
+        )
+
+def _iter_batches(changes: Iterator[Any], batch_size: int) -> Iterator[_Batch]:
+    """_iter_changes의 출력을 청크 batch_size개 단위의 배치로 묶습니다. (여러 파일의 청크가 한 배치에 섞일 수 있습니다.)"""
+    batch = _Batch()
+    for item in changes:
+        if isinstance(item, _FileUpdate):
+            batch.file_updates.append(item)
+            continue
+        chunk_id, chunk = item
+        batch.ids.append(chunk_id)
+        batch.documents.append(chunk)
+        if len(batch.ids) >= batch_size:
+            yield batch
+            batch = _Batch()
+    if batch.ids or batch.file_updates:
+        yield batch
+
+def ingest(vectorstore: Chroma, data_dir: str = DATA_DIR, chroma_dir: str = CHROMA_DB_DIR, full: bool = False,
+           batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+           progress: Optional[Callable[[IngestReport], None]] = None) -> IngestReport:
+    """
+    data_dir의 변경분을 vectorstore에 반영하고 manifest를 갱신합니다. (동기 함수 - 서버에서는 스레드에서 실행)
+    full=True이거나 manifest가 없거나 분할/임베딩 설정이 바뀌었으면 기존 벡터를 모두 지우고 다시 임베딩합니다.
+    청크는 batch_size개씩 묶어 최대 concurrency개의 임베딩 요청을 동시에 보내고, 끝난 순서대로 저장합니다.
+    progress가 주어지면 배치가 저장될 때마다 현재까지의 IngestReport로 호출합니다.
+    다른 프로세스가 수집 중이면 index_file_lock으로 끝나기를 기다렸다가, 그 결과(manifest)를 기준으로 남은 변경분만 반영합니다.
+    """
+    with index_file_lock(chroma_dir), _ingest_lock:
+        started = time.perf_counter()
+        report = IngestReport()
+        manifest = None if full else load_manifest(chroma_dir)
+        if manifest is None or manifest.get("settings") != _index_settings():
+            # manifest가 없으면 어떤 벡터가 어느 파일에서 왔는지 알 수 없으므로 전부 지우고 새로 만듭니다.
+            existing_ids = vectorstore.get(include=[])["ids"]
+            if existing_ids:
+                vectorstore.delete(ids=existing_ids)
+                report.chunks_deleted += len(existing_ids)
+            manifest = {"settings": _index_settings(), "index_version": (manifest or {}).get("index_version", 0), "files": {}}
+            report.full_rebuild = True
+
+        files: Dict[str, Dict[str, Any]] = manifest["files"]
+        current = _scan_data_dir(data_dir) if os.path.isdir(data_dir) else {}
+        # mtime과 크기가 manifest와 다른 파일만 읽어 볼 후보로 고릅니다. (같으면 파일을 읽지 않고 건너뜀)
+        candidates = []
+        for rel_path in sorted(current):
+            entry = files.get(rel_path)
+            stat = current[rel_path]
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                report.files_unchanged += 1
+            else:
+                candidates.append(rel_path)
+        report.files_to_check = len(candidates)
+
+        embedding_model = vectorstore.embeddings
+        # _collection: 미리 계산한 임베딩을 그대로 저장하기 위해 Chroma 컬렉션에 직접 upsert합니다.
+        collection = vectorstore._collection
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed")
+        in_flight: Deque[Tuple[_Batch, Optional[Future]]] = deque()
+        embed_started = time.perf_counter()
+        last_log = last_save = embed_started
+
+        def commit(batch: _Batch, future: Optional[Future]) -> None:
+            """임베딩이 끝난 배치를 저장하고, 청크를 모두 저장한 파일을 manifest에 반영합니다."""
+            nonlocal last_log, last_save
+            if future is not None:
+                collection.upsert(
+                    ids=batch.ids,
+                    embeddings=future.result(),
+                    metadatas=[chunk.metadata for chunk in batch.documents],
+                    documents=[chunk.page_content for chunk in batch.documents],
+                )
+                report.chunks_added += len(batch.ids)
+            for update in batch.file_updates:
+                # 새 청크가 모두 저장된 뒤에 옛 청크를 지워서, 수정 중에도 검색 결과가 비지 않게 합니다.
+                if update.stale_ids:
+                    vectorstore.delete(ids=update.stale_ids)
+                report.chunks_deleted += len(update.stale_ids)
+                if update.is_new:
+                    report.files_added += 1
+                else:
+                    report.files_updated += 1
+                files[update.rel_path] = update.entry
+            now = time.perf_counter()
+            report.chunks_per_s = round(report.chunks_added / max(now - embed_started, 1e-9), 1)
+            if now - last_log >= PROGRESS_LOG_INTERVAL_S:
+                last_log = now
+                print(f"[Ingest DEBUG] Progress: {report.files_added + report.files_updated}/{report.files_to_check} files, "
+                      f"{report.chunks_added} chunks embedded ({report.chunks_per_s} chunks/s).")
+            if now - last_save >= MANIFEST_SAVE_INTERVAL_S:
+                # 오래 걸리는 수집이 중간에 중단되어도 이미 저장한 파일은 다시 임베딩하지 않도록 manifest를 수시로 저장합니다.
+                last_save = now
+                _save_manifest(chroma_dir, manifest)
+            if progress:
+                progress(report)
+
+        try:
+            # 1. 삭제된 파일의 벡터 제거
+            for rel_path in sorted(set(files) - set(current)):
+                chunk_ids = files[rel_path]["chunk_ids"]
+                if chunk_ids:
+                    vectorstore.delete(ids=chunk_ids)
+                report.chunks_deleted += len(chunk_ids)
+                report.files_removed += 1
+                del files[rel_path]
+
+            # 2. 새 파일/수정된 파일 반영: 최대 concurrency개의 임베딩 요청을 동시에 보내고, 보낸 순서대로 저장합니다.
+            #    진행 중인 배치 수가 제한되므로 파일 읽기/분할이 임베딩보다 앞서 나가도 메모리가 늘어나지 않습니다.
+            for batch in _iter_batches(_iter_changes(data_dir, files, candidates, current, report), max(1, batch_size)):
+                texts = [chunk.page_content for chunk in batch.documents]
+                future = executor.submit(embedding_model.embed_documents, texts) if texts else None
+                in_flight.append((batch, future))
+                if len(in_flight) >= max(1, concurrency):
+                    commit(*in_flight.popleft())
+            while in_flight:
+                commit(*in_flight.popleft())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            # 중간에 실패해도 그때까지 반영된 파일은 manifest에 남겨, 다음 실행에서 다시 임베딩하지 않게 합니다.
+            # (실패한 파일은 manifest에 없거나 이전 해시로 남아 있으므로 다음 실행에서 다시 시도됩니다.)
+            # 변경이 없으면 manifest를 다시 쓰지 않습니다. (manifest 파일의 수정 시각이 곧 인덱스 상태 변경 신호입니다.)
+            if report.changed or report.full_rebuild:
+                manifest["index_version"] = manifest.get("index_version", 0) + 1
+            if report.manifest_changed:
+                _save_manifest(chroma_dir, manifest)
+            report.duration_s = round(time.perf_counter() - started, 3)
+
+        print(f"[Ingest DEBUG] Ingestion finished in {report.duration_s}s: "
+              f"+{report.files_added} added, ~{report.files_updated} updated, -{report.files_removed} removed, "
+              f"{report.files_unchanged} unchanged files; +{report.chunks_added}/-{report.chunks_deleted} chunks "
+              f"({report.chunks_per_s} chunks/s).")
+        return report
+
+def main() -> None:
+    """명령줄 진입점입니다. 서버를 띄우지 않고 ./data를 ChromaDB에 반영합니다."""
+    from model import create_embedding_model
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default=DATA_DIR, help="RAG 원본 문서 폴더")
+    parser.add_argument("--chroma-dir", default=CHROMA_DB_DIR, help="ChromaDB 저장 폴더")
+    parser.add_argument("--full", action="store_true", help="manifest를 무시하고 전체 다시 임베딩")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="임베딩 요청 하나에 담을 청크 수")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="동시에 보낼 임베딩 요청 수")
+    args = parser.parse_args()
+
+    vectorstore = open_vectorstore(create_embedding_model(), args.chroma_dir)
+    report = ingest(vectorstore, args.data_dir, args.chroma_dir, full=args.full,
+                    batch_size=args.batch_size, concurrency=args.concurrency)
+    print(json.dumps(report.__dict__, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# jobs.py
+
+# 오래 걸리는 채팅/에이전트 턴을 위한 백그라운드 작업 대기열입니다.
+# - POST /api/jobs는 채팅 턴을 chat_jobs 테이블(SQLite, db.py)에 넣고 바로 작업 ID를 돌려줍니다.
+#   HTTP 연결은 LLM 생성 시간과 관계없이 바로 끝나므로 프록시 시간 제한이나 연결 끊김으로 작업이 버려지지 않습니다.
+# - 워커 JOB_WORKERS개가 대기열에서 오래된 작업부터 가져와 process_chat_job으로 실행하고 결과를 DB에 저장합니다.
+# - 클라이언트는 GET /api/jobs/{id}로 조회(wait로 롱 폴링)하거나, /api/jobs/{id}/events로 진행 이벤트를 구독합니다.
+# - 워커는 실행 중인 작업의 임대(lease)를 주기적으로 연장합니다. 서버가 재시작되거나 죽으면 임대가 만료되고,
+#   다시 시작한 서버(또는 다른 프로세스)의 워커가 그 작업을 처음부터 다시 실행합니다. (최대 JOB_MAX_ATTEMPTS번)
+#   턴은 끝난 뒤에만 대화 기록을 저장하므로, 중단된 턴을 다시 실행해도 기록이 중복되지 않습니다.
+# - 취소: 대기 중인 작업은 바로 취소되고, 실행 중인 작업은 맡은 워커가 턴을 멈춘 뒤 cancelled가 됩니다.
+#   (다른 프로세스가 실행 중인 작업은 그 워커가 임대를 연장할 때 취소 요청을 확인합니다.)
+
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from coalesce import EventBroadcast
+from db import (enqueue_chat_job_async, claim_chat_job_async, heartbeat_chat_job_async, finish_chat_job_async,
+                requeue_chat_job_async, cancel_chat_job_async, get_chat_job_async, get_chat_job_counts_async,
+                purge_chat_jobs_async, JOB_FINISHED_STATUSES)
+from LangGraph import process_chat_job
+from metrics import start_request, request_tag
+
+# --- 작업 대기열 설정값 정의 ---
+# JOB_WORKERS (변수 - 사용자 정의): 작업을 동시에 실행하는 워커 수입니다. 환경 변수 JOB_WORKERS로 바꿀 수 있습니다.
+#   0이면 이 프로세스는 작업을 받기만 하고 실행하지 않습니다. (다른 프로세스의 워커가 실행)
+#   LLM 호출은 llm_scheduler가 따로 제한하므로, 이 값은 대화형 요청의 자리를 얼마나 내줄지를 정합니다.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# JOB_MAX_QUEUED (변수 - 사용자 정의): 대기 중인 작업의 최대 수입니다. 넘으면 429로 거절합니다.
+JOB_MAX_QUEUED = 1000
+# JOB_LEASE_S (변수 - 사용자 정의): 작업 임대 시간(초)입니다. 워커가 이 시간 동안 연장하지 못하면 다른 워커가 가져갑니다.
+#   서버가 재시작된 경우에도 이 시간이 지나야 중단된 작업을 다시 실행합니다.
+JOB_LEASE_S = 30.0
+# JOB_HEARTBEAT_INTERVAL_S (변수 - 사용자 정의): 임대 연장과 취소 요청 확인 주기(초)입니다. JOB_LEASE_S보다 충분히 짧아야 합니다.
+JOB_HEARTBEAT_INTERVAL_S = 10.0
+# JOB_MAX_ATTEMPTS (변수 - 사용자 정의): 중단된 작업을 포함한 최대 실행 시도 횟수입니다.
+JOB_MAX_ATTEMPTS = 3
+# JOB_POLL_INTERVAL_S (변수 - 사용자 정의): 쉬는 워커가 대기열을 다시 확인하는 주기(초)입니다.
+#   같은 프로세스에 들어온 작업은 바로 깨우므로, 이 값은 다른 프로세스가 넣은 작업과 재시도 시각을 확인하는 데 쓰입니다.
+#   작업 조회(wait)와 이벤트 구독도 다른 프로세스가 실행 중인 작업은 이 주기로 DB를 확인합니다.
+JOB_POLL_INTERVAL_S = 1.0
+# JOB_OVERLOAD_RETRY_S (변수 - 사용자 정의): LLM 대기열이 가득 차(429/503) 작업을 다시 넣을 때, Retry-After가 없으면 기다리는 시간(초)입니다.
+JOB_OVERLOAD_RETRY_S = 5.0
+# JOB_MAX_WAIT_S (변수 - 사용자 정의): LLM 과부하로 다시 넣은 작업을 포기하기까지의 시간(초, 작업 생성 시각부터)입니다.
+JOB_MAX_WAIT_S = 30 * 60
+# JOB_RETENTION_S (변수 - 사용자 정의): 끝난 작업을 DB에 남겨 두는 시간(초)입니다. JOB_PURGE_INTERVAL_S마다 정리합니다.
+JOB_RETENTION_S = 7 * 24 * 60 * 60
+JOB_PURGE_INTERVAL_S = 60 * 60
+
+class JobQueue:
+    """
+    chat_jobs 테이블을 대기열로 쓰는 워커 풀입니다.
+    사용 순서: start() (lifespan 시작) -> submit / get / wait / events / cancel -> stop() (lifespan 종료)
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        # 프로세스마다 다른 워커 ID 앞부분입니다. (여러 프로세스가 같은 DB를 쓸 때 임대 주인을 구분)
+        self.instance_id = uuid.uuid4().hex[:8]
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        # 이 프로세스에서 실행 중인 작업: 작업 ID -> 턴 태스크 / 진행 이벤트
+        self._running: Dict[str, asyncio.Task] = {}
+        self._broadcasts: Dict[str, EventBroadcast] = {}
+        self._counts = {"submitted": 0, "rejected": 0, "started": 0, "resumed": 0, "succeeded": 0, "failed": 0,
+                        "cancelled": 0, "requeued": 0}
+
+    # --- 수명 관리 ---
+    def start(self) -> None:
+        """워커와 오래된 작업 정리 태스크를 시작합니다."""
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(f"{self.instance_id}-{index}")) for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+        print(f"[Jobs DEBUG] Job queue started with {self.workers} worker(s) (instance {self.instance_id}).")
+
+    async def stop(self) -> None:
+        """
+        워커를 멈춥니다. 실행 중이던 작업은 DB에 running으로 남고, 임대가 만료되면 다음에 시작한 워커가 다시 실행합니다.
+        """
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- 클라이언트 API ---
+    async def submit(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """작업을 대기열에 넣고 작업 정보를 반환합니다. 세션 ID가 없으면 새 세션 ID를 정합니다."""
+        job = await enqueue_chat_job_async(str(uuid.uuid4()), session_id or str(uuid.uuid4()), message, time.time(), JOB_MAX_QUEUED)
+        if job is None:
+            self._counts["rejected"] += 1
+            raise HTTPException(status_code=429, detail="작업 대기열이 가득 찼습니다. 잠시 후 다시 시도해 주세요.",
+                                headers={"Retry-After": str(int(JOB_OVERLOAD_RETRY_S))})
+        self._counts["submitted"] += 1
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await get_chat_job_async(job_id)
+
+    async def wait(self, job_id: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+        """작업이 끝나거나 timeout_s초가 지날 때까지 기다린 뒤 작업 정보를 반환합니다. (롱 폴링)"""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            job = await get_chat_job_async(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in JOB_FINISHED_STATUSES or remaining <= 0:
+                return job
+            broadcast = self._broadcasts.get(job_id)
+            if broadcast is not None:
+                # 이 프로세스에서 실행 중이면 턴이 끝나는 즉시 깨어납니다.
+                try:
+                    await asyncio.wait_for(_drain(broadcast), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(JOB_POLL_INTERVAL_S, remaining))
+
+    async def events(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        작업 진행 이벤트를 {"event": 이름, "data": dict} 형태로 내보냅니다.
+        - job: 작업 상태(대기 순번 포함)가 바뀔 때마다 작업 정보
+        - session, token, tool_call, tool_result, saved: 이 프로세스에서 실행 중인 턴의 스트리밍 이벤트 (처음부터 다시 보냄)
+        - done: 작업이 끝났을 때 최종 작업 정보 (마지막 이벤트)
+        다른 프로세스가 실행 중인 작업은 스트리밍 이벤트 없이 job/done 이벤트만 보냅니다.
+        """
+        last_job = None
+        while True:
+            job = await get_chat_job_async(job_id)
+            if job is None:
+                return
+            if job["status"] in JOB_FINISHED_STATUSES:
+                yield {"event": "done", "data": job}
+                return
+            if job != last_job:
+                yield {"event": "job", "data": job}
+                last_job = job
+            broadcast = self._broadcasts.get(job_id)
+            if broadcast is not None:
+                async for item in broadcast.subscribe():
+                    yield item
+            else:
+                await asyncio.sleep(JOB_POLL_INTERVAL_S)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """작업 취소를 요청하고 작업 정보를 반환합니다. 이 프로세스에서 실행 중이면 턴을 바로 멈춥니다."""
+        job = await cancel_chat_job_async(job_id, time.time())
+        if job is None:
+            return None
+        turn = self._running.get(job_id)
+        if turn is not None and job["status"] == "running":
+            turn.cancel()
+            # 워커가 취소를 기록할 때까지 잠시 기다려 바뀐 상태를 돌려줍니다.
+            await asyncio.wait({turn}, timeout=5)
+            job = await get_chat_job_async(job_id) or job
+        return job
+
+    async def stats(self) -> Dict[str, Any]:
+        """DB의 상태별 작업 수와 이 프로세스의 처리 횟수입니다."""
+        return {
+            "workers": self.workers,
+            "running_here": len(self._running),
+            "jobs": await get_chat_job_counts_async(),
+            **self._counts,
+        }
+
+    def counts(self) -> Dict[str, int]:
+        """이 프로세스에서 작업을 받고, 시작하고, 끝낸 횟수입니다."""
+        return dict(self._counts)
+
+    # --- 워커 ---
+    async def _worker(self, worker_id: str) -> None:
+        while True:
+            # 대기열을 확인하기 전에 깨움 신호를 지워야, 확인한 뒤에 들어온 작업의 신호를 놓치지 않습니다.
+            self._wake.clear()
+            try:
+                job = await claim_chat_job_async(worker_id, time.time(), JOB_LEASE_S, JOB_MAX_ATTEMPTS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Jobs DEBUG] Worker {worker_id} failed to claim a job: {type(e).__name__} - {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job, worker_id)
+
+    async def _run_job(self, job: Dict[str, Any], worker_id: str) -> None:
+        """작업 하나를 실행하고 결과(성공/실패/취소/재시도)를 DB에 기록합니다."""
+        job_id = job["job_id"]
+        # 작업 ID로 요청 ID를 정해, 턴 처리 로그와 단계별 추적에 같은 ID가 찍히게 합니다.
+        start_request(f"job-{job_id[:8]}")
+        self._counts["started"] += 1
+        if job["attempts"] > 1:
+            self._counts["resumed"] += 1
+            print(f"[Jobs DEBUG] {request_tag()}Resuming job {job_id} (attempt {job['attempts']}).")
+        broadcast = EventBroadcast()
+        self._broadcasts[job_id] = broadcast
+
+        async def emit(event: str, data: Dict[str, Any]) -> None:
+            broadcast.publish({"event": event, "data": data})
+
+        turn = asyncio.create_task(process_chat_job(job["message"], job["session_id"], emit))
+        self._running[job_id] = turn
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker_id, turn))
+        status, response, error, error_status, retry_at = "failed", None, None, None, None
+        try:
+            response, _ = await turn
+            status = "succeeded"
+        except asyncio.CancelledError:
+            if self._stopping:
+                # 서버 종료: 작업은 running으로 남겨 두고, 임대가 만료되면 다시 실행합니다.
+                turn.cancel()
+                raise
+            status, error = "cancelled", "작업이 취소되었습니다."
+        except HTTPException as e:
+            error, error_status = str(e.detail), e.status_code
+            # LLM 대기열이 가득 찬 경우(429/503)는 작업 실패가 아니므로, Retry-After 뒤에 다시 실행합니다.
+            if e.status_code in (429, 503) and time.time() - job["created_at"] < JOB_MAX_WAIT_S:
+                retry_after = float((e.headers or {}).get("Retry-After", JOB_OVERLOAD_RETRY_S))
+                retry_at = time.time() + max(1.0, retry_after)
+        except Exception as e:
+            print(f"[Jobs DEBUG] {request_tag()}Job {job_id} failed: {type(e).__name__} - {e}")
+            traceback.print_exc()
+            error, error_status = f"작업 처리 중 오류: {type(e).__name__}", 500
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            if self._stopping:
+                broadcast.close()
+                self._broadcasts.pop(job_id, None)
+
+        try:
+            if retry_at is not None:
+                recorded = await requeue_chat_job_async(job_id, worker_id, retry_at, error, error_status)
+                self._counts["requeued"] += 1
+                print(f"[Jobs DEBUG] {request_tag()}Job {job_id} requeued after LLM overload ({error_status}); retry in {retry_at - time.time():.0f}s.")
+            else:
+                recorded = await finish_chat_job_async(job_id, worker_id, status, time.time(), response, error, error_status)
+                self._counts[status] += 1
+                print(f"[Jobs DEBUG] {request_tag()}Job {job_id} {status}.")
+            if not recorded:
+                # 임대를 잃은 경우(다른 워커가 가져감): 그 워커의 결과가 기록됩니다.
+                print(f"[Jobs DEBUG] {request_tag()}Job {job_id} lease was lost; result not recorded.")
+        except Exception as e:
+            print(f"[Jobs DEBUG] {request_tag()}Failed to record job {job_id} result: {type(e).__name__} - {e}")
+        finally:
+            # 결과를 DB에 기록한 뒤에 구독자를 깨워, 구독자가 다시 조회할 때 최종 상태를 보게 합니다.
+            broadcast.close()
+            self._broadcasts.pop(job_id, None)
+
+    async def _heartbeat(self, job_id: str, worker_id: str, turn: asyncio.Task) -> None:
+        """임대를 주기적으로 연장하고, 다른 프로세스에서 들어온 취소 요청이나 임대 상실을 확인하면 턴을 멈춥니다."""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL_S)
+            try:
+                cancel_requested = await heartbeat_chat_job_async(job_id, worker_id, time.time(), JOB_LEASE_S)
+            except Exception as e:
+                print(f"[Jobs DEBUG] Heartbeat for job {job_id} failed: {type(e).__name__} - {e}")
+                continue
+            if cancel_requested is None or cancel_requested:
+                print(f"[Jobs DEBUG] Stopping job {job_id}: {'lease lost' if cancel_requested is None else 'cancel requested'}.")
+                turn.cancel()
+                return
+
+    async def _purge_loop(self) -> None:
+        """끝난 지 JOB_RETENTION_S가 지난 작업을 주기적으로 지웁니다."""
+        while True:
+            try:
+                purged = await purge_chat_jobs_async(time.time() - JOB_RETENTION_S)
+                if purged:
+                    print(f"[Jobs DEBUG] Purged {purged} finished job(s).")
+            except Exception as e:
+                print(f"[Jobs DEBUG] Job purge failed: {type(e).__name__} - {e}")
+            await asyncio.sleep(JOB_PURGE_INTERVAL_S)
+
+async def _drain(broadcast: EventBroadcast) -> None:
+    """진행 이벤트가 끝날 때(broadcast.close)까지 기다립니다."""
+    async for _ in broadcast.subscribe():
+        pass
+
+# --- 작업 대기열 인스턴스 (모듈 전역, 프로세스당 하나) ---
+job_queue = JobQueue()
@@ -0,0 +1,178 @@
+# llm_scheduler.py
+
+# 로컬 Ollama 서버 앞에 두는 LLM 호출 수락 제어(admission control) 모듈입니다.
+# - 동시에 Ollama로 보내는 LLM 호출 수를 서버당 LLM_MAX_IN_FLIGHT개로 제한합니다.
+#   (제한이 없으면 요청이 Ollama 안에 쌓여 모두 함께 OLLAMA_REQUEST_TIMEOUT에 걸립니다.)
+# - 자리가 없으면 대기열에서 기다리고, 대기열은 우선순위 순서로 처리합니다.
+#   새 대화 턴의 첫 호출(사용자가 응답을 기다리는 호출)이 도구 실행 뒤 이어지는 호출보다 먼저 처리됩니다.
+# - 대기열이 가득 차면 바로 429를, 대기 시간이 LLM_QUEUE_TIMEOUT_S를 넘으면 503을 Retry-After와 함께 반환합니다.
+# - 대기열 길이, 대기 시간, 거절 횟수 등의 통계를 stats()로 제공합니다.
+# 이벤트 루프 하나(프로세스 하나) 안에서만 동작합니다.
+# 멀티 워커 서버(main.py --workers N)에서는 위 한도를 워커 수로 나누어 각 프로세스가 자기 몫만 사용합니다.
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from ollama_pool import ollama_pool
+
+# --- 수락 제어 설정값 정의 ---
+# LLM_MAX_IN_FLIGHT (변수 - 사용자 정의): Ollama 서버 하나에 동시에 보내는 LLM 호출 수입니다.
+#   Ollama 서버의 OLLAMA_NUM_PARALLEL 값과 맞추는 것이 좋습니다.
+#   전체 동시 호출 수는 이 값 x 백엔드 풀(ollama_pool.py)의 서버 수입니다.
+LLM_MAX_IN_FLIGHT = 2
+# LLM_MAX_QUEUE (변수 - 사용자 정의): 자리를 기다릴 수 있는 새 호출 수입니다. 넘으면 429로 바로 거절합니다.
+#   (이미 진행 중인 턴의 후속 호출은 거절하지 않습니다. 앞서 한 작업이 버려지지 않도록)
+LLM_MAX_QUEUE = 16
+# LLM_QUEUE_TIMEOUT_S (변수 - 사용자 정의): 대기열에서 기다리는 최대 시간(초)입니다. 넘으면 503을 반환합니다.
+LLM_QUEUE_TIMEOUT_S = 60.0
+# LLM_PRIORITY_STEP_S (변수 - 사용자 정의): 우선순위 한 단계의 차이를 대기 시간(초)으로 나타낸 값입니다.
+#   우선순위가 한 단계 낮은 호출은 이 시간만큼 늦게 도착한 것처럼 줄을 섭니다.
+#   (낮은 우선순위 호출도 충분히 오래 기다리면 차례가 오므로 무한히 밀리지 않습니다.)
+LLM_PRIORITY_STEP_S = 10.0
+# SERVER_WORKERS (변수): 같은 Ollama 서버를 함께 쓰는 서버 프로세스(uvicorn 워커) 수입니다. main.py가 환경 변수로 넘겨줍니다.
+#   동시 호출 수와 대기열 길이를 이 값으로 나눕니다. (프로세스당 최소 1이므로 워커가 동시 호출 수보다 많으면 전체 한도를 넘을 수 있습니다.)
+SERVER_WORKERS = max(1, int(os.environ.get("SERVER_WORKERS", "1")))
+
+# --- 우선순위 (숫자가 작을수록 먼저 처리) ---
+# PRIORITY_INTERACTIVE: 새 대화 턴의 첫 LLM 호출과 대화 요약 (사용자가 첫 응답을 기다리는 중)
+PRIORITY_INTERACTIVE = 0
+# PRIORITY_FOLLOWUP: 도구 실행 결과를 받아 이어지는 LLM 호출 (대기열이 가득 차도 거절하지 않음)
+PRIORITY_FOLLOWUP = 1
+# PRIORITY_BACKGROUND: 워밍업(모델 미리 로드)처럼 사용자가 기다리지 않는 호출
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_FOLLOWUP: "followup", PRIORITY_BACKGROUND: "background"}
+
+# 대기 시간 백분위 계산에 쓰는 최근 기록 수
+_WAIT_SAMPLES = 1000
+
+class LLMScheduler:
+    """
+    LLM 호출 자리(slot)를 나누어 주는 우선순위 세마포어입니다.
+    사용 예:
+        async with llm_scheduler.slot(PRIORITY_INTERACTIVE):
+            response = await llm.ainvoke(messages)
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE,
+                 queue_timeout_s: float = LLM_QUEUE_TIMEOUT_S, priority_step_s: float = LLM_PRIORITY_STEP_S):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.priority_step_s = priority_step_s
+        self._in_flight = 0
+        # 대기열: [정렬 키(도착 시각 + 우선순위 보정), 도착 순번, 우선순위, 자리를 넘겨받을 Future]
+        self._waiters: List[List[Any]] = []
+        self._sequence = itertools.count()
+        # 통계
+        self._admitted: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self._rejected = 0
+        self._timed_out = 0
+        self._peak_queue = 0
+        self._waits_ms: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._max_wait_ms = 0.0
+        # 호출 한 번이 자리를 차지하는 평균 시간(지수 이동 평균). Retry-After 추정에 사용합니다.
+        self._avg_service_s: Optional[float] = None
+
+    def _retry_after(self) -> int:
+        """지금 대기열이 모두 처리될 때까지 걸릴 것으로 추정되는 시간(초)입니다. (Retry-After 헤더 값)"""
+        service_s = self._avg_service_s or 5.0
+        rounds = (len(self._waiters) + 1) / max(1, self.max_in_flight)
+        return max(1, min(120, math.ceil(service_s * rounds)))
+
+    def _overloaded(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self._retry_after())})
+
+    def _record_admission(self, priority: int, waited_s: float) -> None:
+        waited_ms = waited_s * 1000
+        self._admitted[PRIORITY_NAMES.get(priority, "background")] += 1
+        self._waits_ms.append(waited_ms)
+        self._max_wait_ms = max(self._max_wait_ms, waited_ms)
+
+    async def _acquire(self, priority: int) -> None:
+        enqueued = time.monotonic()
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._record_admission(priority, 0.0)
+            return
+        if priority != PRIORITY_FOLLOWUP and len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            print(f"[LLMScheduler DEBUG] Queue full ({len(self._waiters)} waiting). Rejecting {PRIORITY_NAMES.get(priority)} call.")
+            raise self._overloaded(429, "LLM 요청이 많아 대기열이 가득 찼습니다. 잠시 후 다시 시도하십시오.")
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        entry = [enqueued + priority * self.priority_step_s, next(self._sequence), priority, future]
+        heapq.heappush(self._waiters, entry)
+        self._peak_queue = max(self._peak_queue, len(self._waiters))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 포기하는 순간 자리를 넘겨받았다면 다음 대기자에게 다시 넘깁니다.
+                self._release(None)
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self._timed_out += 1
+                print(f"[LLMScheduler DEBUG] {PRIORITY_NAMES.get(priority)} call waited over {self.queue_timeout_s}s. Giving up.")
+                raise self._overloaded(503, "LLM 서버가 바빠 응답을 시작하지 못했습니다. 잠시 후 다시 시도하십시오.")
+            raise
+        self._record_admission(priority, time.monotonic() - enqueued)
+
+    def _release(self, service_s: Optional[float]) -> None:
+        if service_s is not None:
+            self._avg_service_s = service_s if self._avg_service_s is None else 0.8 * self._avg_service_s + 0.2 * service_s
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[3]
+            if not future.done():
+                # 자리를 그대로 다음 대기자에게 넘깁니다. (in_flight 수는 그대로)
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """LLM 호출 자리를 얻을 때까지 기다렸다가, 블록이 끝나면 자리를 반납합니다."""
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """현재 동시 호출 수, 대기열 길이, 대기 시간 분포, 거절/시간 초과 횟수를 반환합니다."""
+        waits = sorted(self._waits_ms)
+
+        def percentile(fraction: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * fraction))], 1) if waits else 0.0
+
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "queue_depth_by_priority": {
+                name: sum(1 for entry in self._waiters if entry[2] == priority) for priority, name in PRIORITY_NAMES.items()
+            },
+            "max_queue": self.max_queue,
+            "peak_queue_depth": self._peak_queue,
+            "admitted": dict(self._admitted),
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": round(self._max_wait_ms, 1)},
+            "avg_service_s": round(self._avg_service_s, 3) if self._avg_service_s is not None else None,
+        }
+
+# --- 스케줄러 인스턴스 (모듈 전역, 프로세스당 하나) ---
+llm_scheduler = LLMScheduler(max_in_flight=max(1, LLM_MAX_IN_FLIGHT * len(ollama_pool.backends) // SERVER_WORKERS),
+                             max_queue=max(1, LLM_MAX_QUEUE // SERVER_WORKERS))
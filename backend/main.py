@@ -1,8 +1,48 @@
 # main.py
+
+# 서버 실행 진입점입니다.
+# - 개발 모드 (기본): 프로세스 하나, 코드가 바뀌면 자동 재시작(reload)합니다.
+#     python main.py
+# - 운영 모드: 자동 재시작 없이 uvicorn 워커 프로세스 N개로 요청을 나누어 처리합니다. (CPU 코어를 모두 사용)
+#     python main.py --workers 4 --host 0.0.0.0
+#     python main.py --workers 0          # 0이면 CPU 코어 수만큼
+#   각 워커는 별도 프로세스이므로 캐시(검색 결과, 작업 공간 인덱스 등), LLM 호출 스케줄러, 지표(/metrics)는 워커마다 따로 있습니다.
+#   여러 프로세스가 함께 쓰는 상태는 다음과 같이 맞춥니다.
+#   - SQLite(chat_history.db): WAL 모드 + 쓰기마다 BEGIN IMMEDIATE와 busy_timeout으로 프로세스 간 쓰기를 순서대로 처리합니다.
+#     스키마 생성과 예전 데이터 마이그레이션은 워커를 띄우기 전에 이 프로세스에서 한 번 실행합니다.
+#   - ChromaDB(chroma_db): 파일 잠금(chroma_db.lock)으로 한 워커만 인덱스를 만들고/수집하며, 나머지는 끝난 뒤 다시 엽니다.
+#   - 백그라운드 작업(/api/jobs): DB 임대(lease)로 한 작업을 한 워커만 실행합니다.
+#   - Ollama 동시 호출 수(llm_scheduler.py): 워커 수(SERVER_WORKERS 환경 변수)로 나누어 각 워커가 자기 몫만 사용합니다.
+
+import argparse
+import os
+
 import uvicorn
-from server import app # server.py에서 정의된 FastAPI 앱 인스턴스를 임포트합니다.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", help="서버 주소")
+    parser.add_argument("--port", type=int, default=8000, help="서버 포트")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="워커 프로세스 수 (운영 모드, 자동 재시작 없음). 0이면 CPU 코어 수만큼 실행합니다.")
+    args = parser.parse_args()
+
+    if args.workers is None:
+        # 개발 모드: reload를 쓰려면 앱을 인스턴스가 아닌 "모듈:변수" 문자열로 넘겨야 합니다.
+        uvicorn.run("server:app", host=args.host, port=args.port, reload=True)
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+    # 워커 프로세스는 환경 변수를 물려받습니다. (llm_scheduler.py가 워커 수로 Ollama 동시 호출 수를 나눕니다.)
+    os.environ["SERVER_WORKERS"] = str(workers)
+    # 워커들이 동시에 시작하며 스키마 생성/마이그레이션을 겹쳐 실행하지 않도록 여기서 먼저 한 번 실행합니다.
+    # (워커의 init_db는 이미 있는 테이블을 확인만 합니다.)
+    from db import init_db, close_db
+    init_db()
+    close_db()
+    print(f"[Main DEBUG] Starting {workers} worker process(es) on {args.host}:{args.port}.")
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=workers)
 
 # 서버 실행 (스크립트로 직접 실행 시)
 if __name__ == "__main__":
-    # server.py에서 정의된 'app' 인스턴스를 Uvicorn으로 실행합니다.
-    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
+    main()
@@ -0,0 +1,221 @@
+# metrics.py
+
+# Prometheus 텍스트 형식의 지표(/metrics)와 요청 단위 구간(span) 시간 측정 모듈입니다. (외부 라이브러리 없음)
+# - Counter / Histogram: 요청 수, 단계별 소요 시간, 도구 실행 시간, LLM 토큰 수와 생성 속도(tokens/s)를 기록합니다.
+# - span("단계 이름"): with 블록의 소요 시간을 단계별 히스토그램에 기록하고, 현재 요청의 추적(trace)에도 남깁니다.
+# - 요청 ID: server.py 미들웨어가 요청마다 ID를 정해 contextvars에 넣습니다. asyncio 태스크와 asyncio.to_thread로
+#   실행되는 함수에도 그대로 전달되므로, 로그(request_tag())와 요청 추적 요약에 같은 ID가 찍힙니다.
+# - 스케줄러 대기열, 백엔드 풀, 캐시처럼 현재 값을 보여 주는 지표는 register_collector로 등록한 함수가 수집 시점에 만듭니다.
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# --- 지표 설정값 정의 ---
+# LATENCY_BUCKETS_S (변수 - 사용자 정의): 소요 시간 히스토그램의 구간 경계(초)입니다.
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# TOKENS_PER_S_BUCKETS (변수 - 사용자 정의): 생성 속도(tokens/s) 히스토그램의 구간 경계입니다.
+TOKENS_PER_S_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """증가만 하는 누적 값입니다."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    """값의 분포를 구간(bucket)별 누적 개수와 합계로 기록합니다."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_S):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 레이블 값 -> [구간별 개수..., 합계, 전체 개수]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                labels = _format_labels(self.label_names + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(state[-2], 6))}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+# --- 레지스트리 ---
+_registry: List[_Metric] = []
+# 수집 시점에 (이름, 설명, 종류, [(레이블 dict, 값), ...]) 목록을 돌려주는 함수들
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+_collectors: List[Collector] = []
+
+def register_collector(collector: Collector) -> None:
+    """수집 시점에 현재 값을 만드는 함수를 등록합니다. (게이지 등)"""
+    _collectors.append(collector)
+
+def render_metrics() -> str:
+    """등록된 모든 지표를 Prometheus 텍스트 형식(0.0.4)으로 만듭니다."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"[Metrics DEBUG] Collector failed: {type(e).__name__} - {e}")
+            continue
+        for name, help_text, kind, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- 파이프라인 지표 ---
+http_requests_total = Counter("llmlocal_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+http_request_duration = Histogram("llmlocal_http_request_duration_seconds", "HTTP request duration until the response is fully sent.", ("method", "route"))
+stage_duration = Histogram("llmlocal_stage_duration_seconds", "Duration of each chat pipeline stage (span).", ("stage",))
+tool_calls_total = Counter("llmlocal_tool_calls_total", "Tool calls by tool and outcome.", ("tool", "outcome"))
+llm_calls_total = Counter("llmlocal_llm_calls_total", "LLM calls by pipeline stage.", ("stage",))
+llm_tokens_total = Counter("llmlocal_llm_tokens_total", "Tokens reported by Ollama (prompt = prompt_eval_count, completion = eval_count).", ("kind",))
+llm_tokens_per_second = Histogram("llmlocal_llm_tokens_per_second", "Generation speed per LLM call (eval_count / eval_duration).", ("stage",), TOKENS_PER_S_BUCKETS)
+llm_prompt_tokens_per_second = Histogram("llmlocal_llm_prompt_tokens_per_second", "Prompt processing speed per LLM call (prompt_eval_count / prompt_eval_duration).", ("stage",), (50, 100, 250, 500, 1000, 2000, 5000, 10000))
+
+# --- 요청 ID와 요청 추적 ---
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("trace", default=None)
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def start_request(request_id: Optional[str] = None) -> str:
+    """현재 컨텍스트(요청)에 요청 ID와 빈 추적 목록을 설정하고 요청 ID를 반환합니다."""
+    request_id = request_id or new_request_id()
+    _request_id.set(request_id)
+    _trace.set([])
+    return request_id
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+def request_tag() -> str:
+    """로그 줄 앞에 붙일 요청 ID 표시입니다. 요청 밖(백그라운드 작업 등)에서는 빈 문자열입니다."""
+    request_id = _request_id.get()
+    return f"[req={request_id}] " if request_id else ""
+
+def record_stage(stage: str, elapsed: float) -> None:
+    """이미 잰 소요 시간(초)을 단계별 히스토그램과 현재 요청의 추적 목록에 기록합니다."""
+    stage_duration.observe(elapsed, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, elapsed))
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """with 블록의 소요 시간을 단계별 히스토그램과 현재 요청의 추적 목록에 기록합니다."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+def format_trace() -> str:
+    """현재 요청에서 기록된 단계들을 '단계=ms' 형식으로 이어 붙입니다. (같은 단계는 합계와 횟수)"""
+    trace = _trace.get() or []
+    totals: Dict[str, List[float]] = {}
+    for stage, elapsed in trace:
+        total = totals.setdefault(stage, [0.0, 0])
+        total[0] += elapsed
+        total[1] += 1
+    return " ".join(
+        f"{stage}={total[0] * 1000:.0f}ms" + (f"(x{total[1]})" if total[1] > 1 else "") for stage, total in totals.items()
+    )
+
+def record_llm_usage(stage: str, metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """
+    Ollama 응답 메타데이터(response_metadata)의 토큰 수와 소요 시간(나노초)으로 토큰 지표를 기록합니다.
+    기록한 값(prompt_tokens, completion_tokens, tokens_per_s)을 반환합니다. 메타데이터가 없으면 None입니다.
+    """
+    llm_calls_total.inc(stage=stage)
+    if not metadata or metadata.get("eval_count") is None:
+        return None
+    prompt_tokens = float(metadata.get("prompt_eval_count") or 0)
+    completion_tokens = float(metadata.get("eval_count") or 0)
+    llm_tokens_total.inc(prompt_tokens, kind="prompt")
+    llm_tokens_total.inc(completion_tokens, kind="completion")
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+    eval_duration_s = (metadata.get("eval_duration") or 0) / 1e9
+    if eval_duration_s > 0 and completion_tokens:
+        usage["tokens_per_s"] = completion_tokens / eval_duration_s
+        llm_tokens_per_second.observe(usage["tokens_per_s"], stage=stage)
+    prompt_duration_s = (metadata.get("prompt_eval_duration") or 0) / 1e9
+    if prompt_duration_s > 0 and prompt_tokens:
+        llm_prompt_tokens_per_second.observe(prompt_tokens / prompt_duration_s, stage=stage)
+    return usage
@@ -27,10 +27,55 @@ OLLAMA_LLM_MODEL_NAME = "aroxima/eeve-korean_instruct-10.8b-expo:latest"
 OLLAMA_EMBEDDING_MODEL_NAME = "daynice/kure-v1:latest" 
 # OLLAMA_BASE_URL (변수 - 사용자 정의):
 # Ollama 서버의 기본 URL을 정의합니다. 일반적으로 로컬에서 Ollama가 실행되는 주소를 가리킵니다.
+# 여러 대의 Ollama 서버를 쓰려면 ollama_pool.py의 OLLAMA_BACKENDS 환경 변수나 설정 파일을 사용합니다.
 OLLAMA_BASE_URL = "http://localhost:11434"
 # OLLAMA_REQUEST_TIMEOUT (변수 - 사용자 정의):
 # Ollama 서버에 요청을 보낼 때의 최대 대기 시간(초)을 정의합니다. 이 시간 안에 응답이 없으면 타임아웃 오류가 발생합니다.
 OLLAMA_REQUEST_TIMEOUT = 120.0
+# OLLAMA_KEEP_ALIVE (변수 - 사용자 정의):
+# 마지막 요청 이후 Ollama가 모델을 메모리(GPU)에 유지하는 시간입니다. (예: "30m", "1h", -1은 무기한)
+# 요청 사이에 모델이 내려가면 다음 요청이 모델 로딩 시간과 프롬프트 캐시(KV 캐시) 손실을 모두 겪게 됩니다.
+OLLAMA_KEEP_ALIVE = "30m"
+# OLLAMA_NUM_CTX (변수 - 사용자 정의):
+# 모델의 컨텍스트 창 크기(토큰 수)입니다. 요청마다 값이 달라지면 Ollama가 모델을 다시 로드하므로 항상 같은 값을 사용합니다.
+# history.py의 HISTORY_TOKEN_BUDGET과 도구 설명, 응답 길이를 모두 담을 수 있을 만큼 잡아야 합니다.
+OLLAMA_NUM_CTX = 8192
+
+# def (키워드): 새로운 '함수(Function)'를 정의할 때 사용하는 키워드입니다.
+# create_chat_llm (함수 - 사용자 정의): 위 설정값으로 ChatOllama 인스턴스를 만드는 함수입니다.
+def create_chat_llm(base_url: str = OLLAMA_BASE_URL) -> ChatOllama:
+    """
+    프로젝트 공통 설정(모델 이름, 서버 주소, 타임아웃, keep_alive, num_ctx)으로 ChatOllama 인스턴스를 만듭니다.
+    LLM을 만드는 모든 곳에서 이 함수를 사용하여 설정이 한 곳에만 있도록 합니다.
+    base_url을 주면 해당 Ollama 서버용 인스턴스를 만듭니다. (ollama_pool.py의 서버별 클라이언트)
+    """
+    # ChatOllama (클래스): LLM 인스턴스를 생성합니다.
+    # model (속성): 사용할 LLM 모델 이름 (OLLAMA_LLM_MODEL_NAME 변수 값 사용).
+    # base_url (속성): Ollama 서버 주소 (base_url 인자, 기본값은 OLLAMA_BASE_URL 변수 값).
+    # request_timeout (속성): 요청 타임아웃 (OLLAMA_REQUEST_TIMEOUT 변수 값 사용).
+    # keep_alive (속성): 요청 후 모델을 메모리에 유지할 시간 (OLLAMA_KEEP_ALIVE 변수 값 사용).
+    # num_ctx (속성): 컨텍스트 창 크기 (OLLAMA_NUM_CTX 변수 값 사용).
+    return ChatOllama(
+        model=OLLAMA_LLM_MODEL_NAME,
+        base_url=base_url,
+        request_timeout=OLLAMA_REQUEST_TIMEOUT,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        num_ctx=OLLAMA_NUM_CTX,
+    )
+
+# create_embedding_model (함수 - 사용자 정의): 위 설정값으로 OllamaEmbeddings 인스턴스를 만드는 함수입니다.
+def create_embedding_model() -> OllamaEmbeddings:
+    """
+    프로젝트 공통 설정(임베딩 모델 이름, 서버 주소)으로 OllamaEmbeddings 인스턴스를 만듭니다.
+    서버와 ingest.py 명령줄 실행이 같은 임베딩 설정을 쓰도록 이 함수를 사용합니다.
+    """
+    # OllamaEmbeddings (클래스): 임베딩 모델 인스턴스를 생성합니다.
+    # model (속성): 사용할 임베딩 모델 이름 (OLLAMA_EMBEDDING_MODEL_NAME 변수 값 사용).
+    # base_url (속성): Ollama 서버 주소 (OLLAMA_BASE_URL 변수 값 사용).
+    return OllamaEmbeddings(
+        model=OLLAMA_EMBEDDING_MODEL_NAME,
+        base_url=OLLAMA_BASE_URL
+    )
 
 # async (키워드): 이 함수가 비동기적으로 실행될 수 있음을 나타냅니다. (다른 작업을 기다리지 않고 동시에 진행 가능)
 # def (키워드): 새로운 '함수(Function)'를 정의할 때 사용하는 키워드입니다.
@@ -47,22 +92,10 @@ async def load_llm_and_embedding_instance() -> Tuple[Optional[ChatOllama], Optio
     embed_model = None
     # try (키워드): 특정 코드 블록을 실행해보고, 오류(예외)가 발생하면 except 블록으로 넘어갑니다.
     try:
-        # ChatOllama (클래스): LLM 인스턴스를 생성합니다.
-        # model (속성): 사용할 LLM 모델 이름 (OLLAMA_LLM_MODEL_NAME 변수 값 사용).
-        # base_url (속성): Ollama 서버 주소 (OLLAMA_BASE_URL 변수 값 사용).
-        # request_timeout (속성): 요청 타임아웃 (OLLAMA_REQUEST_TIMEOUT 변수 값 사용).
-        llm = ChatOllama(
-            model=OLLAMA_LLM_MODEL_NAME,
-            base_url=OLLAMA_BASE_URL,
-            request_timeout=OLLAMA_REQUEST_TIMEOUT
-        )
-        # OllamaEmbeddings (클래스): 임베딩 모델 인스턴스를 생성합니다.
-        # model (속성): 사용할 임베딩 모델 이름 (OLLAMA_EMBEDDING_MODEL_NAME 변수 값 사용).
-        # base_url (속성): Ollama 서버 주소 (OLLAMA_BASE_URL 변수 값 사용).
-        embed_model = OllamaEmbeddings(
-            model=OLLAMA_EMBEDDING_MODEL_NAME,
-            base_url=OLLAMA_BASE_URL
-        )
+        # create_chat_llm (함수): 공통 설정(keep_alive, num_ctx 포함)으로 LLM 인스턴스를 생성합니다.
+        llm = create_chat_llm()
+        # create_embedding_model (함수): 공통 설정으로 임베딩 모델 인스턴스를 생성합니다.
+        embed_model = create_embedding_model()
         # return (키워드): 함수의 실행을 종료하고 값을 반환합니다.
         # Tuple (타입): LLM 인스턴스와 임베딩 모델 인스턴스를 튜플 형태로 함께 반환합니다.
         return llm, embed_model 
@@ -0,0 +1,229 @@
+# ollama_pool.py
+
+# 여러 대의 Ollama 서버를 하나의 LLM 백엔드처럼 사용하는 백엔드 풀 모듈입니다.
+# - 설정: 환경 변수 OLLAMA_BACKENDS(쉼표로 구분한 URL) 또는 JSON 설정 파일(OLLAMA_BACKENDS_FILE, 기본 ollama_backends.json).
+#   둘 다 없으면 model.py의 OLLAMA_BASE_URL 하나만 사용합니다. (기존 동작과 같음)
+# - 상태 확인: 주기적으로 각 서버의 /api/tags를 호출해 응답 여부와 모델 설치 여부를 확인합니다.
+# - 라우팅: 진행 중인 요청 수가 가장 적은 서버로 보냅니다. 단, 같은 세션은 가능하면 이전에 쓴 서버로 보내서
+#   그 서버에 남아 있는 프롬프트 캐시(KV 캐시)를 재사용합니다.
+# - 장애 조치: 연결 실패, 서버 오류, 모델 없음 오류가 나면 그 서버를 잠시 제외하고 다른 서버로 다시 보냅니다.
+#   (스트리밍 토큰을 이미 보낸 뒤의 실패는 응답이 섞이지 않도록 다시 보내지 않습니다.)
+# 이벤트 루프 하나(프로세스 하나) 안에서만 동작합니다.
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+from ollama import ResponseError
+
+from model import OLLAMA_BASE_URL, OLLAMA_LLM_MODEL_NAME, create_chat_llm
+
+# --- 백엔드 풀 설정값 정의 ---
+# OLLAMA_BACKENDS_ENV / OLLAMA_BACKENDS_FILE_ENV (변수): 백엔드 목록을 읽을 환경 변수 이름입니다.
+#   OLLAMA_BACKENDS="http://gpu1:11434,http://gpu2:11434"
+#   OLLAMA_BACKENDS_FILE="/etc/llmlocal/ollama_backends.json"
+OLLAMA_BACKENDS_ENV = "OLLAMA_BACKENDS"
+OLLAMA_BACKENDS_FILE_ENV = "OLLAMA_BACKENDS_FILE"
+# DEFAULT_BACKENDS_FILE (변수 - 사용자 정의): 환경 변수가 없을 때 찾는 설정 파일입니다. (backend 폴더 기준)
+#   형식: ["http://gpu1:11434", "http://gpu2:11434"] 또는 {"backends": [{"url": "http://gpu1:11434"}, ...]}
+DEFAULT_BACKENDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ollama_backends.json")
+# HEALTH_CHECK_INTERVAL_S (변수 - 사용자 정의): 상태 확인 주기(초)입니다.
+HEALTH_CHECK_INTERVAL_S = 10
+# HEALTH_CHECK_TIMEOUT_S (변수 - 사용자 정의): 상태 확인 요청 하나의 최대 대기 시간(초)입니다.
+HEALTH_CHECK_TIMEOUT_S = 3.0
+# FAILURE_COOLDOWN_S (변수 - 사용자 정의): 요청이 실패한 서버를 라우팅에서 제외하는 시간(초)입니다.
+#   이 시간이 지나거나 상태 확인이 성공하면 다시 사용합니다.
+FAILURE_COOLDOWN_S = 15
+# AFFINITY_MAX_EXTRA_OUTSTANDING (변수 - 사용자 정의): 세션 고정(affinity)을 지키는 한도입니다.
+#   세션이 쓰던 서버의 진행 중 요청 수가 가장 한가한 서버보다 이 값보다 더 많으면 한가한 서버로 옮깁니다.
+AFFINITY_MAX_EXTRA_OUTSTANDING = 1
+# AFFINITY_MAX_SESSIONS (변수 - 사용자 정의): 기억하는 세션 -> 서버 매핑 수입니다. (오래 안 쓴 세션부터 잊음)
+AFFINITY_MAX_SESSIONS = 10000
+
+# 다른 서버로 다시 보내도 되는 Ollama 응답 상태 코드 (모델 없음, 서버 오류, 과부하)
+_FAILOVER_STATUS_CODES = {404, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+class OllamaBackend:
+    """Ollama 서버 하나의 상태(정상 여부, 진행 중 요청 수, 누적 통계)와 전용 ChatOllama 클라이언트입니다."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.llm = create_chat_llm(base_url=self.url)
+        self.healthy = True
+        self.unhealthy_until = 0.0
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self) -> bool:
+        return self.healthy and time.monotonic() >= self.unhealthy_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "available": self.available(),
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check_age_s": round(time.monotonic() - self.last_check, 1) if self.last_check else None,
+        }
+
+def load_backend_urls() -> List[str]:
+    """
+    백엔드 URL 목록을 읽습니다. 우선순위: OLLAMA_BACKENDS 환경 변수 > 설정 파일 > OLLAMA_BASE_URL.
+    중복된 URL은 한 번만 사용합니다.
+    """
+    urls: List[str] = []
+    env_value = os.environ.get(OLLAMA_BACKENDS_ENV, "").strip()
+    config_file = os.environ.get(OLLAMA_BACKENDS_FILE_ENV, DEFAULT_BACKENDS_FILE)
+    if env_value:
+        urls = [url.strip() for url in env_value.split(",") if url.strip()]
+    elif os.path.exists(config_file):
+        with open(config_file, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        entries = config.get("backends", []) if isinstance(config, dict) else config
+        urls = [entry["url"] if isinstance(entry, dict) else str(entry) for entry in entries]
+    if not urls:
+        urls = [OLLAMA_BASE_URL]
+    return list(dict.fromkeys(url.rstrip("/") for url in urls))
+
+def is_failover_error(error: BaseException) -> bool:
+    """다른 서버로 다시 보내면 성공할 수 있는 오류(연결 실패, 시간 초과, 서버 오류, 모델 없음)인지 확인합니다."""
+    if isinstance(error, ResponseError):
+        return error.status_code in _FAILOVER_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+class OllamaPool:
+    """
+    Ollama 백엔드 풀입니다.
+    사용 예:
+        response = await ollama_pool.call(llm, session_id, lambda model: model.ainvoke(messages))
+    llm이 풀의 클라이언트가 아니면(다른 모델 객체를 넣은 경우 등) 라우팅 없이 llm을 그대로 사용합니다.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self._by_url = {backend.url: backend for backend in self.backends}
+        self._affinity: "OrderedDict[str, str]" = OrderedDict()
+        self._round_robin = itertools.count()
+        self.failovers = 0
+
+    @property
+    def primary(self) -> OllamaBackend:
+        return self.backends[0]
+
+    def manages(self, llm: Any) -> bool:
+        return any(backend.llm is llm for backend in self.backends)
+
+    def choose(self, session_id: Optional[str] = None, exclude: Optional[set] = None) -> OllamaBackend:
+        """
+        요청을 보낼 서버를 고릅니다.
+        1. 사용 가능한 서버 중 세션이 쓰던 서버가 충분히 한가하면 그 서버 (KV 캐시 재사용)
+        2. 아니면 진행 중 요청 수가 가장 적은 서버 (같으면 돌아가며 선택)
+        사용 가능한 서버가 없으면 제외되지 않은 서버 중에서 고릅니다. (모두 장애라도 요청은 시도해 봄)
+        """
+        exclude = exclude or set()
+        candidates = [backend for backend in self.backends if backend.url not in exclude and backend.available()]
+        if not candidates:
+            candidates = [backend for backend in self.backends if backend.url not in exclude] or list(self.backends)
+        least = min(backend.outstanding for backend in candidates)
+
+        if session_id:
+            preferred = self._by_url.get(self._affinity.get(session_id, ""))
+            if preferred in candidates and preferred.outstanding <= least + AFFINITY_MAX_EXTRA_OUTSTANDING:
+                self._affinity.move_to_end(session_id)
+                return preferred
+
+        idle = [backend for backend in candidates if backend.outstanding == least]
+        chosen = idle[next(self._round_robin) % len(idle)]
+        if session_id:
+            self._affinity[session_id] = chosen.url
+            self._affinity.move_to_end(session_id)
+            while len(self._affinity) > AFFINITY_MAX_SESSIONS:
+                self._affinity.popitem(last=False)
+        return chosen
+
+    def _mark_failure(self, backend: OllamaBackend, error: BaseException) -> None:
+        backend.failures += 1
+        backend.last_error = f"{type(error).__name__}: {error}"
+        backend.unhealthy_until = time.monotonic() + FAILURE_COOLDOWN_S
+        print(f"[OllamaPool DEBUG] Backend {backend.url} failed ({backend.last_error}). Excluded for {FAILURE_COOLDOWN_S}s.")
+
+    async def call(self, llm: Any, session_id: Optional[str], invoke: Callable[[Any], Awaitable[T]],
+                   can_retry: Callable[[], bool] = lambda: True) -> T:
+        """
+        invoke(서버의 ChatOllama)를 실행합니다. 장애 조치 대상 오류가 나면 다른 서버로 다시 실행합니다.
+        can_retry()가 False를 반환하면(예: 스트리밍 토큰을 이미 보냄) 다시 보내지 않고 오류를 그대로 올립니다.
+        """
+        if not self.manages(llm):
+            return await invoke(llm)
+        tried: set = set()
+        while True:
+            backend = self.choose(session_id, exclude=tried)
+            tried.add(backend.url)
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                return await invoke(backend.llm)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                self._mark_failure(backend, e)
+                if len(tried) >= len(self.backends) or not can_retry():
+                    raise
+                self.failovers += 1
+                if session_id and self._affinity.get(session_id) == backend.url:
+                    del self._affinity[session_id]
+            finally:
+                backend.outstanding -= 1
+
+    async def _check_backend(self, client: httpx.AsyncClient, backend: OllamaBackend) -> None:
+        try:
+            response = await client.get(f"{backend.url}/api/tags")
+            response.raise_for_status()
+            models = {item.get("name") for item in response.json().get("models", [])}
+            if OLLAMA_LLM_MODEL_NAME not in models and f"{OLLAMA_LLM_MODEL_NAME}:latest" not in models:
+                raise LookupError(f"model '{OLLAMA_LLM_MODEL_NAME}' not found")
+        except Exception as e:
+            if backend.healthy:
+                print(f"[OllamaPool DEBUG] Backend {backend.url} is unhealthy: {type(e).__name__} - {e}")
+            backend.healthy = False
+            backend.last_error = f"{type(e).__name__}: {e}"
+        else:
+            if not backend.healthy or backend.unhealthy_until:
+                print(f"[OllamaPool DEBUG] Backend {backend.url} is healthy again.")
+            backend.healthy = True
+            backend.unhealthy_until = 0.0
+        backend.last_check = time.monotonic()
+
+    async def check_health(self) -> None:
+        """모든 서버의 상태를 동시에 확인합니다."""
+        async with httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT_S) as client:
+            await asyncio.gather(*(self._check_backend(client, backend) for backend in self.backends))
+
+    async def health_check_loop(self, interval_s: float = HEALTH_CHECK_INTERVAL_S) -> None:
+        """server.py lifespan에서 실행하는 주기적 상태 확인 작업입니다."""
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval_s)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": [backend.stats() for backend in self.backends],
+            "failovers": self.failovers,
+            "affinity_sessions": len(self._affinity),
+        }
+
+# --- 백엔드 풀 인스턴스 (모듈 전역, 프로세스당 하나) ---
+ollama_pool = OllamaPool(load_backend_urls())
@@ -0,0 +1,65 @@
+# prompt.py
+
+# LLM에 보낼 메시지 목록을 조립하는 모듈입니다.
+# Ollama는 직전 요청과 앞부분이 같은 프롬프트의 KV 캐시를 재사용하므로,
+# 턴마다 바뀌지 않는 내용(도구 목록, 응답 형식 안내)은 맨 앞의 시스템 메시지에 고정하고
+# 대화 기록은 DB에 저장된 원문 그대로, 새 사용자 메시지는 맨 끝에 둡니다.
+# 이렇게 하면 새 메시지 직전까지의 프롬프트가 턴마다 바이트 단위로 동일하게 유지됩니다.
+
+import textwrap
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# 도구 호출 응답 형식 안내 (도구 목록 뒤에 붙는 고정 문구)
+TOOL_RESPONSE_FORMAT = (
+    "응답은 다음 형식으로 주십시오:\n"
+    "Call: tool_name(param1='value1', param2='value2')\n"
+    "(서로 독립적인 도구 호출이 여러 개 필요하면 Call: 줄을 여러 개 써서 한 번에 요청할 수 있습니다.)\n"
+    "Thought: 도구 사용 후 다음 단계에 대한 생각\n"
+    "Final Answer: 최종 답변 (도구를 사용하지 않을 경우 바로 이 형식으로 응답)\n"
+    "최종 답변만 할 경우: 최종 답변 내용\n"
+)
+
+# 모델이 도구 호출(tools)을 직접 지원할 때의 고정 시스템 프롬프트입니다.
+# 도구 목록과 인자 스키마는 Ollama API의 tools 필드로 전달되므로 여기에는 넣지 않습니다.
+NATIVE_TOOL_SYSTEM_PROMPT = (
+    "당신은 사용자를 돕는 한국어 AI 비서입니다.\n"
+    "회사 정책/제품 정보나 작업 공간의 파일이 필요하면 제공된 도구를 호출하고, "
+    "도구가 필요 없으면 바로 최종 답변을 하십시오."
+)
+
+@lru_cache(maxsize=8)
+def _render_system_prompt(tool_specs: Tuple[Tuple[str, str], ...]) -> str:
+    """
+    (도구 이름, 설명) 튜플 목록으로 시스템 프롬프트 문자열을 만듭니다.
+    같은 도구 목록이면 항상 같은 문자열(같은 객체)을 돌려주므로 매 요청 다시 조립하지 않습니다.
+    """
+    lines = ["사용 가능한 도구:"]
+    for name, description in tool_specs:
+        # textwrap.dedent: 삼중 따옴표 설명의 들여쓰기를 제거해 불필요한 공백 토큰을 줄입니다.
+        lines.append(f"- {name}: {textwrap.dedent(description).strip()}")
+    return "\n".join(lines) + "\n\n" + TOOL_RESPONSE_FORMAT
+
+def build_system_prompt(tools: Sequence) -> str:
+    """도구 목록(LangChain Tool 리스트)으로 고정 시스템 프롬프트를 만듭니다. 도구 순서가 같으면 결과도 같습니다."""
+    return _render_system_prompt(tuple((tool.name, tool.description) for tool in tools))
+
+def assemble_prompt(tools: Sequence, summary: str, history: List[BaseMessage], user_message: str,
+                    native_tools: bool = False) -> List[BaseMessage]:
+    """
+    LLM에 보낼 메시지 목록을 다음 순서로 조립합니다.
+    1. 고정 시스템 메시지 (도구 목록 + 응답 형식) - 도구 목록이 같으면 모든 턴에서 동일
+       native_tools=True이면 도구는 bind_tools로 전달되므로 NATIVE_TOOL_SYSTEM_PROMPT만 넣습니다.
+    2. 이전 대화 요약 (있을 때만) - 대화 창이 밀려날 때만 바뀜
+    3. 최근 대화 기록 (DB에 저장된 원문 그대로)
+    4. 새 사용자 메시지
+    """
+    system_prompt = NATIVE_TOOL_SYSTEM_PROMPT if native_tools else build_system_prompt(tools)
+    messages: List[BaseMessage] = [SystemMessage(content=system_prompt)]
+    if summary:
+        messages.append(SystemMessage(content=f"이전 대화 요약:\n{summary}"))
+    messages.extend(history)
+    messages.append(HumanMessage(content=user_message))
+    return messages
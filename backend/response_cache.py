@@ -0,0 +1,150 @@
+# response_cache.py
+
+# 반복되는 질문(FAQ형 지식 기반 질문 등)에 대한 LLM 최종 응답 캐시입니다. (기본값: 꺼짐, 선택 사용)
+# - 정확 일치: (정규화된 질문, 모델 이름, 검색 문맥 해시, 시스템 프롬프트 해시)가 같으면 저장된 응답을 그대로 사용합니다.
+#   검색 문맥 해시는 질문으로 RAG 검색한 상위 문서들의 해시이므로, 관련 문서가 바뀌면 자연히 캐시를 쓰지 않습니다.
+# - 의미 유사(선택): 정확 일치가 없으면, 같은 모델/같은 검색 문맥으로 저장된 응답 중 질문 임베딩의
+#   코사인 유사도가 RESPONSE_CACHE_SEMANTIC_THRESHOLD 이상인 응답을 사용합니다.
+# - TTL 만료와 최대 항목 수(LRU 제거)로 크기를 제한하고, chat_history.db의 response_cache 테이블에 저장합니다. (db.py)
+# - 대화 맥락에 따라 답이 달라지지 않도록 대화 기록이 없는 첫 질문만 캐시합니다.
+# - 지식 기반 검색 외의 도구(파일 생성/삭제, 작업 공간 읽기 등)를 사용한 턴의 응답은 저장하지 않습니다.
+
+import hashlib
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from db import (load_cached_response_async, find_cached_response_candidates_async, touch_cached_response_async,
+                save_cached_response_async, get_response_cache_size_async)
+from retrieval_cache import normalize_query, embed_query_cached
+
+# --- 응답 캐시 설정값 정의 ---
+# RESPONSE_CACHE_ENABLED (변수 - 사용자 정의): 응답 캐시 사용 여부입니다. 환경 변수 RESPONSE_CACHE_ENABLED=1로 켭니다.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "0") == "1"
+# RESPONSE_CACHE_TTL_S (변수 - 사용자 정의): 캐시된 응답의 만료 시간(초)입니다.
+RESPONSE_CACHE_TTL_S = 24 * 60 * 60
+# RESPONSE_CACHE_MAX_ENTRIES (변수 - 사용자 정의): 저장할 최대 응답 수입니다. 넘으면 가장 오래 사용하지 않은 응답부터 지웁니다.
+RESPONSE_CACHE_MAX_ENTRIES = 2000
+# RESPONSE_CACHE_SEMANTIC_THRESHOLD (변수 - 사용자 정의): 의미 유사 캐시를 사용할 코사인 유사도 기준입니다.
+#   None이면 정확 일치만 사용합니다. 너무 낮추면 뜻이 다른 질문에 같은 답을 줄 수 있습니다.
+RESPONSE_CACHE_SEMANTIC_THRESHOLD: Optional[float] = 0.95
+# RESPONSE_CACHE_SAFE_TOOLS (변수 - 사용자 정의): 사용해도 응답을 캐시할 수 있는 도구입니다.
+#   검색 문맥은 캐시 키에 들어가지만, 작업 공간 파일의 내용과 변경은 키에 들어가지 않으므로 파일 도구를 쓴 턴은 저장하지 않습니다.
+RESPONSE_CACHE_SAFE_TOOLS = {"query_knowledge_base"}
+
+@dataclass
+class ResponseCacheRequest:
+    """한 턴의 응답 캐시 조회/저장에 필요한 값들입니다."""
+    key: str
+    query: str
+    model: str
+    context_hash: str
+    embedding: Optional[List[float]] = None
+
+def context_hash(documents: Sequence[Document]) -> str:
+    """검색된 문서들(출처 + 내용)의 해시입니다. 문서가 없으면 빈 문자열의 해시입니다."""
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(str(document.metadata.get("source", "")).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(document.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class ResponseCache:
+    """
+    SQLite에 저장되는 응답 캐시입니다. 조회/저장 횟수 통계를 함께 기록합니다.
+    사용 순서: build_request -> lookup -> (없으면 LLM 실행) -> store
+    """
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, ttl_s: float = RESPONSE_CACHE_TTL_S,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 semantic_threshold: Optional[float] = RESPONSE_CACHE_SEMANTIC_THRESHOLD):
+        self.enabled = enabled
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self._counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "evicted": 0}
+
+    def build_request(self, user_message: str, model: str, system_prompt: str, retriever: Optional[Any]) -> ResponseCacheRequest:
+        """
+        캐시 키를 만듭니다. retriever(retrieval_cache.CachedRetriever)가 있으면 질문으로 검색한 문서들의 해시를
+        키에 넣고, 의미 유사 캐시를 쓰면 질문 임베딩도 구합니다. (둘 다 검색 캐시를 거치므로 반복 질문은 비용이 거의 없음)
+        블로킹 호출(임베딩, Chroma 검색)이 있으므로 스레드에서 실행합니다.
+        """
+        query = normalize_query(user_message)
+        documents = retriever.invoke(user_message) if retriever is not None else []
+        docs_hash = context_hash(documents)
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        key = hashlib.sha256(json.dumps([query, model, docs_hash, prompt_hash], ensure_ascii=False).encode("utf-8")).hexdigest()
+        embedding = None
+        if self.semantic_threshold is not None and retriever is not None:
+            embedding = embed_query_cached(retriever.vectorstore.embeddings, query)
+        # 의미 유사 비교는 같은 프롬프트(도구 구성)로 만든 응답끼리만 하도록 프롬프트 해시를 문맥 해시에 포함합니다.
+        return ResponseCacheRequest(key=key, query=query, model=model, context_hash=f"{docs_hash}:{prompt_hash}", embedding=embedding)
+
+    async def lookup(self, request: ResponseCacheRequest) -> Optional[str]:
+        """캐시된 응답을 반환합니다. 정확 일치를 먼저 찾고, 없으면 의미 유사 응답을 찾습니다."""
+        now = time.time()
+        response = await load_cached_response_async(request.key, now)
+        if response is not None:
+            self._counts["exact_hits"] += 1
+            print(f"[ResponseCache DEBUG] Exact hit for '{request.query[:30]}'.")
+            return response
+        if request.embedding is not None:
+            best_key, best_score, best_response = None, 0.0, None
+            for key, embedding, candidate in await find_cached_response_candidates_async(request.model, request.context_hash, now):
+                score = _cosine(request.embedding, embedding)
+                if score > best_score:
+                    best_key, best_score, best_response = key, score, candidate
+            if best_key is not None and best_score >= self.semantic_threshold:
+                await touch_cached_response_async(best_key, now)
+                self._counts["semantic_hits"] += 1
+                print(f"[ResponseCache DEBUG] Semantic hit for '{request.query[:30]}' (similarity {best_score:.3f}).")
+                return best_response
+        self._counts["misses"] += 1
+        return None
+
+    async def store(self, request: ResponseCacheRequest, response: str, tools_used: Sequence[str]) -> bool:
+        """응답을 저장합니다. 안전하지 않은 도구를 사용한 턴이면 저장하지 않고 False를 반환합니다."""
+        unsafe = sorted(set(tools_used) - RESPONSE_CACHE_SAFE_TOOLS)
+        if unsafe:
+            self._counts["bypassed"] += 1
+            print(f"[ResponseCache DEBUG] Not caching response that used tools: {', '.join(unsafe)}")
+            return False
+        self._counts["evicted"] += await save_cached_response_async(
+            request.key, request.model, request.context_hash, request.query, request.embedding,
+            response, time.time(), self.ttl_s, self.max_entries,
+        )
+        self._counts["stores"] += 1
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        """적중/실패/저장/제외/제거 횟수입니다."""
+        return dict(self._counts)
+
+    async def stats(self) -> Dict[str, Any]:
+        """적중률 등 통계와 현재 저장된 응답 수를 반환합니다."""
+        hits = self._counts["exact_hits"] + self._counts["semantic_hits"]
+        lookups = hits + self._counts["misses"]
+        return {
+            "enabled": self.enabled,
+            "size": await get_response_cache_size_async(),
+            "max_entries": self.max_entries,
+            "semantic_threshold": self.semantic_threshold,
+            **self._counts,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+# --- 응답 캐시 인스턴스 (모듈 전역, 프로세스당 하나) ---
+response_cache = ResponseCache()
@@ -0,0 +1,163 @@
+# retrieval_cache.py
+
+# query_knowledge_base(RAG 검색) 도구를 위한 2단계 캐시 모듈입니다.
+# - 1단계(임베딩 캐시): 정규화된 질문 -> 질문 임베딩 벡터. 같은 질문이면 Ollama 임베딩 요청을 다시 보내지 않습니다.
+# - 2단계(결과 캐시): (정규화된 질문, k) -> 상위 k개 검색 결과. 같은 질문이면 Chroma 유사도 검색도 건너뜁니다.
+# 두 캐시 모두 LRU(가장 오래 안 쓴 항목부터 제거) + TTL(만료 시간) 방식입니다.
+# 수집(ingest.py)으로 인덱스가 바뀌면 결과 캐시를 비웁니다. 임베딩 캐시는 문서가 아니라 임베딩 모델에만
+# 의존하므로, 임베딩 모델이 바뀐 경우(전체 재수집)에만 비웁니다.
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from ingest import CHROMA_DB_DIR, get_index_state
+
+# --- 캐시 설정값 정의 ---
+# EMBEDDING_CACHE_SIZE / EMBEDDING_CACHE_TTL_S (변수 - 사용자 정의): 질문 임베딩 캐시의 최대 항목 수와 만료 시간(초)입니다.
+EMBEDDING_CACHE_SIZE = 2048
+EMBEDDING_CACHE_TTL_S = 24 * 60 * 60
+# RESULT_CACHE_SIZE / RESULT_CACHE_TTL_S (변수 - 사용자 정의): 검색 결과 캐시의 최대 항목 수와 만료 시간(초)입니다.
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL_S = 10 * 60
+
+class TTLCache:
+    """
+    스레드 안전한 LRU + TTL 캐시입니다. 적중(hit)/실패(miss) 횟수를 함께 기록합니다.
+    (RAG 도구는 asyncio.to_thread로 여러 스레드에서 동시에 호출되므로 잠금으로 보호합니다.)
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """캐시된 값을 반환합니다. 없거나 만료되었으면 None을 반환합니다."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """값을 저장하고, 최대 항목 수를 넘으면 가장 오래 사용하지 않은 항목을 제거합니다."""
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_s, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """적중률 등 통계를 반환합니다."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+# --- 캐시 인스턴스 (모듈 전역, 프로세스당 하나) ---
+_embedding_cache = TTLCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL_S)
+_result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S)
+# _invalidations (변수): 인덱스 변경으로 결과 캐시를 비운 횟수입니다.
+_invalidations = 0
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?？!！.。,，~]+$")
+
+def normalize_query(query: str) -> str:
+    """
+    캐시 키로 쓸 질문 문자열을 정규화합니다.
+    유니코드 정규화(NFKC), 소문자 변환, 연속 공백 축소, 끝의 문장 부호 제거를 하여
+    '점심시간이 언제야?'와 '점심시간이  언제야'를 같은 질문으로 봅니다.
+    """
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = " ".join(text.split())
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+def embed_query_cached(embeddings: Any, key: str) -> List[float]:
+    """정규화된 질문(key)의 임베딩을 임베딩 캐시에서 찾고, 없으면 계산하여 캐시에 넣습니다."""
+    embedding = _embedding_cache.get(key)
+    if embedding is None:
+        embedding = embeddings.embed_query(key)
+        _embedding_cache.put(key, embedding)
+    return embedding
+
+class CachedRetriever:
+    """
+    Chroma 벡터 저장소 앞에 임베딩 캐시와 결과 캐시를 두는 검색기입니다.
+    invoke(query)는 vectorstore.as_retriever(k=k).invoke(query)와 같은 결과(Document 리스트)를 반환합니다.
+    searcher가 주어지면 벡터 검색 대신 searcher.search(질문, 질문 임베딩, k)의 결과를 캐시합니다.
+    (예: hybrid_retriever.HybridSearcher)
+    """
+
+    def __init__(self, vectorstore: Any, k: int = 3, chroma_dir: str = CHROMA_DB_DIR, searcher: Optional[Any] = None):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.searcher = searcher
+        self.chroma_dir = chroma_dir
+        self._index_state = get_index_state(chroma_dir)
+        self._embedding_model_name = getattr(vectorstore.embeddings, "model", None)
+        self._lock = threading.Lock()
+
+    def _check_index_state(self) -> None:
+        """인덱스(manifest) 상태가 바뀌었으면 결과 캐시를 비웁니다. 임베딩 모델이 바뀌었으면 임베딩 캐시도 비웁니다."""
+        global _invalidations
+        state = get_index_state(self.chroma_dir)
+        with self._lock:
+            if state == self._index_state:
+                return
+            self._index_state = state
+        _result_cache.clear()
+        _invalidations += 1
+        model_name = getattr(self.vectorstore.embeddings, "model", None)
+        if model_name != self._embedding_model_name:
+            self._embedding_model_name = model_name
+            _embedding_cache.clear()
+        print(f"[RetrievalCache DEBUG] Index changed; result cache cleared (invalidation #{_invalidations}).")
+
+    def _embed_query(self, key: str) -> List[float]:
+        return embed_query_cached(self.vectorstore.embeddings, key)
+
+    def invoke(self, query: str, k: Optional[int] = None) -> List[Document]:
+        """질문과 가장 관련성이 높은 문서 k개를 반환합니다. (캐시 적중 시 Ollama/Chroma 호출 없음)"""
+        k = k or self.k
+        key = normalize_query(str(query))
+        self._check_index_state()
+        documents = _result_cache.get((key, k))
+        if documents is None:
+            if self.searcher is not None:
+                documents = self.searcher.search(key, self._embed_query(key), k)
+            else:
+                documents = self.vectorstore.similarity_search_by_vector(self._embed_query(key), k=k)
+            _result_cache.put((key, k), documents)
+        # 호출한 쪽에서 리스트를 수정해도 캐시가 바뀌지 않도록 복사본을 반환합니다.
+        return list(documents)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """임베딩/결과 캐시의 적중률과 무효화 횟수를 반환합니다."""
+    return {
+        "embedding": _embedding_cache.stats(),
+        "results": _result_cache.stats(),
+        "invalidations": _invalidations,
+    }
@@ -1,26 +1,130 @@
 # server.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Match
 from pydantic import BaseModel
 import uvicorn
 from contextlib import asynccontextmanager
 import traceback
+import asyncio
+import json
+import hashlib
+import time
 from typing import Optional, List, Any, Tuple, Dict
 
 # LangGraph 모듈에서 핵심 함수들을 임포트합니다.
-from LangGraph import process_chat_request, get_all_session_titles, load_chat_session, save_chat_session, delete_chat_session
+from LangGraph import process_chat_request, process_chat_request_stream, warm_up, get_readiness, rag_ingest_loop
+# DB 작업은 이벤트 루프를 막지 않도록 스레드 풀에서 실행되는 비동기 API를 사용합니다.
+from db import init_db_async, close_db, get_session_titles_page_async, get_sessions_version_async, load_chat_session_async, delete_chat_session_async
+from db import search_chat_messages_async
+from db import SESSION_PAGE_DEFAULT_LIMIT, SESSION_PAGE_MAX_LIMIT, SEARCH_PAGE_DEFAULT_LIMIT, SEARCH_PAGE_MAX_LIMIT
+from retrieval_cache import get_cache_stats
+from llm_scheduler import llm_scheduler
+from ollama_pool import ollama_pool
+from response_cache import response_cache
+from jobs import job_queue
+from metrics import (render_metrics, register_collector, start_request, http_requests_total, http_request_duration)
 
 # --- FastAPI 애플리케이션 정의 시작 ---
 # Lifespan 이벤트 핸들러
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # DB 초기화는 LangGraph.py 내부에서 _load_llm_instance 호출 시 (첫 요청 시) 일어납니다.
+    # DB 연결 관리자(WAL, 읽기 연결 풀 + 전용 쓰기 연결)를 시작 시 한 번만 만들고 스키마를 준비합니다.
+    await init_db_async()
+    # LLM/임베딩 모델 로드와 RAG 검색기 생성을 백그라운드에서 미리 시작합니다.
+    # 서버는 바로 요청을 받을 수 있고, 워밍업이 끝나기 전에 들어온 요청은 같은 초기화 작업을 함께 기다립니다.
+    warm_up_task = asyncio.create_task(warm_up())
+    # ./data 변경분을 주기적으로 ChromaDB에 반영하는 백그라운드 수집 작업입니다.
+    ingest_task = asyncio.create_task(rag_ingest_loop())
+    # Ollama 백엔드 풀의 서버 상태를 주기적으로 확인합니다. (장애 서버 제외/복구)
+    health_task = asyncio.create_task(ollama_pool.health_check_loop())
+    # 백그라운드 작업(POST /api/jobs) 워커를 시작합니다. 재시작 전에 중단된 작업도 이어서 실행합니다.
+    job_queue.start()
     yield
-    # 애플리케이션 종료 시 실행될 코드 (예: DB 연결 종료 등)
+    for task in (warm_up_task, ingest_task, health_task):
+        if not task.done():
+            task.cancel()
+    # 실행 중인 작업은 DB에 남겨 두고 워커를 멈춥니다. (다음 시작 때 다시 실행)
+    await job_queue.stop()
+    # 애플리케이션 종료 시 DB 연결을 모두 닫습니다.
+    close_db()
 
 # FastAPI 애플리케이션 인스턴스를 생성합니다.
 app = FastAPI(lifespan=lifespan)
 
+# 요청 ID / HTTP 지표 미들웨어 (순수 ASGI)
+# 요청마다 X-Request-ID(없으면 새로 생성)를 contextvars에 설정하여 로그와 단계별 추적에 같은 ID가 찍히게 하고,
+# 응답 헤더로도 돌려줍니다. 스트리밍 응답은 본문 전송이 끝날 때까지의 시간을 기록합니다.
+class RequestContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        request_id = start_request(headers.get(b"x-request-id", b"").decode("latin-1")[:64] or None)
+        route = _route_label(scope)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            http_requests_total.inc(method=scope["method"], route=route, status=status["code"])
+            http_request_duration.observe(time.perf_counter() - started, method=scope["method"], route=route)
+
+def _route_label(scope) -> str:
+    """지표 레이블로 쓸 경로 템플릿입니다. (/api/chat/session/{session_id}처럼 ID가 레이블 수를 늘리지 않도록)"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unknown")
+    return "unmatched"
+
+def _collect_runtime_metrics():
+    """스케줄러 대기열, 백엔드 풀, 검색/응답 캐시의 현재 값을 /metrics 수집 시점에 만듭니다."""
+    scheduler = llm_scheduler.stats()
+    pool = ollama_pool.stats()
+    rag_cache = get_cache_stats()
+    families = [
+        ("llmlocal_llm_in_flight", "LLM calls currently holding a scheduler slot.", "gauge", [({}, scheduler["in_flight"])]),
+        ("llmlocal_llm_queue_depth", "LLM calls waiting for a scheduler slot.", "gauge",
+         [({"priority": name}, depth) for name, depth in scheduler["queue_depth_by_priority"].items()]),
+        ("llmlocal_llm_admitted_total", "LLM calls admitted by the scheduler.", "counter",
+         [({"priority": name}, count) for name, count in scheduler["admitted"].items()]),
+        ("llmlocal_llm_rejected_total", "LLM calls rejected because the queue was full (429).", "counter", [({}, scheduler["rejected"])]),
+        ("llmlocal_llm_queue_timeouts_total", "LLM calls that gave up waiting for a slot (503).", "counter", [({}, scheduler["timed_out"])]),
+        ("llmlocal_llm_queue_wait_p95_ms", "95th percentile scheduler wait over recent calls.", "gauge", [({}, scheduler["wait_ms"]["p95"])]),
+        ("llmlocal_backend_available", "Whether an Ollama backend is currently routable.", "gauge",
+         [({"backend": backend["url"]}, 1 if backend["available"] else 0) for backend in pool["backends"]]),
+        ("llmlocal_backend_outstanding", "Requests in flight per Ollama backend.", "gauge",
+         [({"backend": backend["url"]}, backend["outstanding"]) for backend in pool["backends"]]),
+        ("llmlocal_backend_failures_total", "Failed requests per Ollama backend.", "counter",
+         [({"backend": backend["url"]}, backend["failures"]) for backend in pool["backends"]]),
+        ("llmlocal_backend_failovers_total", "Requests retried on another Ollama backend.", "counter", [({}, pool["failovers"])]),
+        ("llmlocal_rag_cache_hits_total", "RAG retrieval cache hits.", "counter",
+         [({"cache": name}, rag_cache[name]["hits"]) for name in ("embedding", "results")]),
+        ("llmlocal_rag_cache_misses_total", "RAG retrieval cache misses.", "counter",
+         [({"cache": name}, rag_cache[name]["misses"]) for name in ("embedding", "results")]),
+        ("llmlocal_response_cache_events_total", "Response cache lookups and stores by outcome.", "counter",
+         [({"event": name}, count) for name, count in response_cache.counts().items()]),
+        ("llmlocal_jobs_total", "Background chat jobs handled by this process, by event.", "counter",
+         [({"event": name}, count) for name, count in job_queue.counts().items()]),
+    ]
+    return families
+
+register_collector(_collect_runtime_metrics)
+
 # CORS 설정
 origins = [
     "http://localhost",
@@ -33,13 +137,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# 가장 바깥에서 실행되도록 마지막에 추가합니다.
+app.add_middleware(RequestContextMiddleware)
 
 # 기본 루트 엔드포인트
 @app.get("/")
 def read_root():
     return {"message": "FastAPI Backend is running."}
 
+# 준비 상태(readiness) 엔드포인트
+# 워밍업(LLM/임베딩 모델 로드, RAG 검색기 생성)이 모두 끝나면 200, 아니면 503과 컴포넌트별 상태를 반환합니다.
+@app.get("/health/ready")
+def readiness_endpoint():
+    ready, components = get_readiness()
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "components": components})
+
+# Prometheus 지표 엔드포인트 (텍스트 형식 0.0.4)
+# 요청 수/시간, 채팅 단계별 시간(DB, 프롬프트, LLM 호출, 도구, 저장), LLM 토큰 수와 tokens/s, 대기열/백엔드/캐시 상태
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# RAG 검색 캐시 통계 엔드포인트 (임베딩/결과 캐시 적중률, 무효화 횟수)
+@app.get("/api/rag/cache/stats")
+def rag_cache_stats_endpoint():
+    return get_cache_stats()
+
+# LLM 호출 수락 제어 통계 엔드포인트 (동시 호출 수, 대기열 길이, 대기 시간, 거절/시간 초과 횟수)
+@app.get("/api/llm/scheduler/stats")
+async def llm_scheduler_stats_endpoint():
+    return llm_scheduler.stats()
+
+# 응답 캐시 통계 엔드포인트 (정확/의미 적중 수, 저장/제외/제거 수, 저장된 응답 수)
+@app.get("/api/chat/cache/stats")
+async def response_cache_stats_endpoint():
+    return await response_cache.stats()
+
+# Ollama 백엔드 풀 상태 엔드포인트 (서버별 정상 여부, 진행 중 요청 수, 실패 횟수, 장애 조치 횟수)
+@app.get("/api/llm/backends")
+async def llm_backends_endpoint():
+    return ollama_pool.stats()
+
 # Pydantic 모델
 class ChatMessage(BaseModel):
     message: str
@@ -62,22 +202,143 @@ async def chat_endpoint(chat_message: ChatMessage):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"채팅 처리 중 예상치 못한 오류 발생: {type(e).__name__}.")
 
-# 세션 목록 가져오기 엔드포인트
+# 스트리밍 채팅 엔드포인트 (Server-Sent Events)
+# 토큰이 생성되는 즉시 'token' 이벤트로 전송하고, 도구 호출/결과와 저장 완료('saved') 이벤트도 순서대로 보냅니다.
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(chat_message: ChatMessage):
+    async def event_source():
+        async for event in process_chat_request_stream(chat_message.message, chat_message.session_id):
+            # SSE 형식: "event: 이름\ndata: JSON\n\n"
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # 프록시 버퍼링 방지
+    )
+
+# --- 백그라운드 작업 엔드포인트 ---
+# 긴 턴을 HTTP 연결 하나로 기다리지 않도록, 작업으로 넣고(202) 결과는 조회/롱 폴링/이벤트 구독으로 받습니다.
+
+# 작업 생성 엔드포인트: 채팅 턴을 대기열에 넣고 작업 ID와 세션 ID를 바로 반환합니다. (대기열이 가득 차면 429)
+@app.post("/api/jobs", status_code=202)
+async def create_job_endpoint(chat_message: ChatMessage):
+    try:
+        return await job_queue.submit(chat_message.message, chat_message.session_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"ERROR: Unhandled exception in /api/jobs: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"작업 생성 중 오류: {type(e).__name__}.")
+
+# 작업 대기열 통계 엔드포인트 (상태별 작업 수, 이 프로세스의 워커 수와 처리 횟수)
+@app.get("/api/jobs/stats")
+async def job_stats_endpoint():
+    return await job_queue.stats()
+
+# 작업 조회 엔드포인트: 상태(queued/running/succeeded/failed/cancelled)와 응답을 반환합니다.
+# ?wait=초 를 주면 작업이 끝나거나 그 시간이 지날 때까지 기다렸다가 응답합니다. (롱 폴링)
+@app.get("/api/jobs/{job_id}")
+async def get_job_endpoint(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    try:
+        job = await (job_queue.wait(job_id, wait) if wait else job_queue.get(job_id))
+    except Exception as e:
+        print(f"ERROR: Unhandled exception in /api/jobs/{job_id}: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"작업 조회 중 오류: {type(e).__name__}.")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+# 작업 이벤트 구독 엔드포인트 (Server-Sent Events)
+# job(상태 변화), 실행 중인 턴의 session/token/tool_call/tool_result/saved, 마지막에 done(최종 작업 정보)을 보냅니다.
+# 연결이 끊겨도 작업은 계속되며, 다시 구독하면 현재 상태부터 받습니다.
+@app.get("/api/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+
+    async def event_source():
+        async for event in job_queue.events(job_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 작업 취소 엔드포인트: 대기 중이면 바로, 실행 중이면 턴을 멈춘 뒤 cancelled가 됩니다. 이미 끝난 작업은 그대로 반환합니다.
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job_endpoint(job_id: str):
+    try:
+        job = await job_queue.cancel(job_id)
+    except Exception as e:
+        print(f"ERROR: Unhandled exception in /api/jobs/{job_id} (DELETE): {type(e).__name__} - {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"작업 취소 중 오류: {type(e).__name__}.")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+# 세션 목록 가져오기 엔드포인트 (키셋 페이지네이션 + ETag)
+# ?limit=개수&before=커서 로 최신순 페이지를 가져옵니다. 응답의 next_before를 다음 요청의 before로 넘기면 됩니다.
+# 목록이 바뀌지 않았다면 If-None-Match 요청에 304로 응답하여 DB 조회와 JSON 직렬화를 건너뜁니다.
 @app.get("/api/chat/sessions")
-async def get_sessions_endpoint():
+async def get_sessions_endpoint(
+    request: Request,
+    limit: int = Query(SESSION_PAGE_DEFAULT_LIMIT, ge=1, le=SESSION_PAGE_MAX_LIMIT),
+    before: Optional[str] = None,
+):
     try:
-        sessions = get_all_session_titles()
-        return {"sessions": sessions}
+        # ETag: 세션 목록 버전 + 페이지 조건으로 만듭니다. 목록이 바뀔 때마다 버전이 올라가므로 ETag도 바뀝니다.
+        version = await get_sessions_version_async()
+        etag_source = f"{version}:{limit}:{before or ''}"
+        etag = f'W/"{hashlib.sha1(etag_source.encode("utf-8")).hexdigest()[:16]}"'
+        # Cache-Control: no-cache -> 브라우저가 캐시를 쓰기 전에 항상 ETag로 재검증하게 합니다.
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=cache_headers)
+
+        sessions, next_before = await get_session_titles_page_async(limit, before)
+        return Response(
+            content=json.dumps({"sessions": sessions, "next_before": next_before}, ensure_ascii=False),
+            media_type="application/json",
+            headers=cache_headers,
+        )
     except Exception as e:
         print(f"ERROR: Unhandled exception in /api/chat/sessions: {type(e).__name__} - {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"세션 목록 로드 중 오류: {type(e).__name__}.")
 
+# 대화 기록 검색 엔드포인트 (FTS5 전문 검색)
+# ?q=검색어 로 모든 세션의 메시지를 검색하여 세션 ID와 발췌문을 관련도순(order=rank) 또는 최신순(order=recent)으로 반환합니다.
+# 모든 단어가 들어간 메시지만 찾으며, 단어는 접두어로 일치합니다. (예: "휴가" -> 휴가는, 휴가를)
+# 응답의 next_offset을 다음 요청의 offset으로 넘기면 다음 페이지를 가져옵니다. (마지막 페이지이면 null)
+@app.get("/api/chat/search")
+async def search_chat_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_DEFAULT_LIMIT, ge=1, le=SEARCH_PAGE_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    order: str = Query("rank", pattern="^(rank|recent)$"),
+):
+    try:
+        results, next_offset = await search_chat_messages_async(q, limit, offset, order)
+        return {"results": results, "next_offset": next_offset}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"ERROR: Unhandled exception in /api/chat/search: {type(e).__name__} - {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"대화 기록 검색 중 오류: {type(e).__name__}.")
+
 # 특정 세션 로드 엔드포인트 추가 (GET 메서드)
 @app.get("/api/chat/session/{session_id}")
 async def get_specific_session_endpoint(session_id: str):
     try:
-        messages = load_chat_session(session_id)
+        messages = await load_chat_session_async(session_id)
         if messages is None:
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found.")
         return {"messages": messages} # 프론트엔드에서 기대하는 형식으로 반환
@@ -90,7 +351,7 @@ async def get_specific_session_endpoint(session_id: str):
 @app.delete("/api/chat/session/{session_id}")
 async def delete_session_endpoint(session_id: str):
     try:
-        success = delete_chat_session(session_id)
+        success = await delete_chat_session_async(session_id)
         if success:
             return {"message": f"Session {session_id} deleted successfully."}
         else:
@@ -0,0 +1,174 @@
+# tool_calling.py
+
+# LLM의 도구 호출을 해석하고 검증하는 모듈입니다.
+# - 도구 호출을 지원하는 모델: ChatOllama.bind_tools로 JSON 스키마를 함께 보내고, 응답의 tool_calls를 그대로 사용합니다.
+# - 지원하지 않는 모델: 'Call: tool_name(param='value')' 텍스트 형식을 ast로 안전하게 해석합니다. (eval 사용 안 함)
+# 어느 경로든 실행 전에 도구의 인자 스키마로 검증하고, 잘못된 호출은 예외 대신 오류 메시지로 LLM에 돌려줍니다.
+
+import ast
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
+# --- 도구 호출 방식 설정 ---
+# TOOL_CALLING_MODE (변수 - 사용자 정의):
+#   "auto"   : Ollama에 모델 정보를 물어 도구 호출(tools) 기능이 있으면 native, 없으면 text 방식을 사용합니다.
+#   "native" : 항상 bind_tools(JSON 스키마) 방식을 사용합니다.
+#   "text"   : 항상 'Call: ...' 텍스트 방식을 사용합니다.
+TOOL_CALLING_MODE = "auto"
+
+# MUTATING_TOOLS (변수 - 사용자 정의): 작업 공간을 변경하는 도구 이름입니다.
+#   한 단계에서 여러 도구를 동시에 실행할 때, 이 도구들은 요청된 순서를 지키도록 앞뒤 호출과 겹치지 않게 실행합니다.
+MUTATING_TOOLS = {"create_file", "append_file", "delete_file"}
+
+# _native_support (변수): 모델 이름 -> 도구 호출 지원 여부 캐시입니다. (모델 정보는 한 번만 조회)
+_native_support: Dict[str, bool] = {}
+
+class ToolArgumentError(ValueError):
+    """도구 호출 인자가 도구의 스키마에 맞지 않을 때 발생하는 예외입니다."""
+
+@dataclass
+class ToolCallRequest:
+    """LLM이 요청한 도구 호출 하나입니다. (native/text 방식 공통 형식)"""
+    name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: f"call_{uuid.uuid4().hex[:12]}")
+    # error: 텍스트 방식에서 호출 형식을 해석하지 못했을 때의 오류 메시지입니다.
+    error: Optional[str] = None
+
+async def supports_native_tools(llm: Any) -> bool:
+    """
+    현재 모델이 Ollama의 도구 호출(tools) 기능을 지원하는지 확인합니다.
+    Ollama /api/show의 capabilities(또는 오래된 서버에서는 템플릿의 .Tools 사용 여부)를 보고 결과를 캐시합니다.
+    서버에 연결할 수 없으면 캐시하지 않고 False를 반환합니다. (다음 요청에서 다시 확인)
+    """
+    if TOOL_CALLING_MODE != "auto":
+        return TOOL_CALLING_MODE == "native"
+    model_name = getattr(llm, "model", None)
+    if model_name is None or not hasattr(llm, "bind_tools"):
+        return False
+    if model_name in _native_support:
+        return _native_support[model_name]
+    try:
+        from ollama import AsyncClient
+        info = await AsyncClient(host=getattr(llm, "base_url", None)).show(model_name)
+    except Exception as e:
+        print(f"[ToolCalling DEBUG] Could not query model capabilities for '{model_name}': {type(e).__name__} - {e}")
+        return False
+    if info.capabilities is not None:
+        supported = "tools" in info.capabilities
+    else:
+        supported = ".Tools" in (info.template or "")
+    _native_support[model_name] = supported
+    print(f"[ToolCalling DEBUG] Model '{model_name}' native tool calling: {supported}")
+    return supported
+
+def mark_native_unsupported(llm: Any) -> None:
+    """도구 호출 요청이 'does not support tools' 오류로 거절되면 이후에는 텍스트 방식을 사용하도록 기록합니다."""
+    model_name = getattr(llm, "model", None)
+    if model_name is not None:
+        _native_support[model_name] = False
+
+def is_tools_unsupported_error(error: Exception) -> bool:
+    """Ollama가 모델의 도구 호출 미지원으로 요청을 거절한 오류인지 확인합니다."""
+    return "does not support tools" in str(error)
+
+def native_tool_calls(message: Any) -> List[ToolCallRequest]:
+    """bind_tools로 받은 AIMessage의 tool_calls를 ToolCallRequest 목록으로 바꿉니다."""
+    calls = []
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        calls.append(ToolCallRequest(
+            name=tool_call["name"],
+            args=dict(tool_call.get("args") or {}),
+            id=tool_call.get("id") or f"call_{uuid.uuid4().hex[:12]}",
+        ))
+    return calls
+
+# 'Call:' 다음의 도구 이름과 여는 괄호 위치를 찾습니다. (인자 부분은 정규식이 아니라 ast로 해석)
+_CALL_PREFIX = re.compile(r"Call:\s*([A-Za-z_]\w*)\s*\(")
+
+def _literal(node: ast.AST) -> Any:
+    """인자 값으로는 리터럴(문자열, 숫자, 리스트, 딕셔너리 등)만 허용합니다. 함수 호출이나 변수 참조는 거부합니다."""
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise ToolArgumentError(f"인자 값은 리터럴이어야 합니다: {ast.unparse(node)}")
+
+def _parse_call_at(text: str, match: "re.Match", tools: Sequence[Any]) -> Tuple[ToolCallRequest, int]:
+    """
+    match 위치의 'Call: tool_name(...)' 하나를 해석하여 (ToolCallRequest, 호출식이 끝나는 위치)를 반환합니다.
+    - 닫는 괄호를 앞에서부터 하나씩 늘려 가며 ast.parse가 성공하는 가장 짧은 호출식을 찾으므로,
+      문자열 인자 안의 괄호나 뒤따르는 'Thought:' 문장 때문에 해석이 틀어지지 않습니다.
+    - 위치 인자는 도구 스키마의 매개변수 순서대로 이름을 붙입니다.
+    해석할 수 없으면 error가 채워진 ToolCallRequest를 반환합니다.
+    """
+    name = match.group(1)
+    start = match.start(1)
+    call_node = None
+    position = match.end()
+    while True:
+        position = text.find(")", position)
+        if position == -1:
+            break
+        try:
+            node = ast.parse(text[start:position + 1].strip(), mode="eval").body
+        except SyntaxError:
+            position += 1
+            continue
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            call_node = node
+        break
+    if call_node is None:
+        return ToolCallRequest(name=name, error="도구 호출 형식을 해석할 수 없습니다. 예: Call: tool_name(param='value')"), match.end()
+
+    end = position + 1
+    try:
+        args: Dict[str, Any] = {}
+        tool = next((tool for tool in tools if tool.name == name), None)
+        param_names = list(tool.args.keys()) if tool is not None else []
+        for index, arg in enumerate(call_node.args):
+            if index >= len(param_names):
+                raise ToolArgumentError(f"위치 인자가 너무 많습니다. (최대 {len(param_names)}개)")
+            args[param_names[index]] = _literal(arg)
+        for keyword in call_node.keywords:
+            if keyword.arg is None:
+                raise ToolArgumentError("**kwargs 형식의 인자는 사용할 수 없습니다.")
+            args[keyword.arg] = _literal(keyword.value)
+    except ToolArgumentError as e:
+        return ToolCallRequest(name=name, error=str(e)), end
+    return ToolCallRequest(name=name, args=args), end
+
+def parse_text_tool_calls(text: str, tools: Sequence[Any]) -> List[ToolCallRequest]:
+    """
+    'Call: tool_name(param1='value1', param2='value2')' 형식의 텍스트에서 도구 호출들을 순서대로 해석합니다.
+    한 응답에 'Call:' 줄이 여러 개 있으면 모두 반환하고, 없으면 빈 리스트를 반환합니다.
+    """
+    calls: List[ToolCallRequest] = []
+    position = 0
+    while True:
+        match = _CALL_PREFIX.search(text, position)
+        if not match:
+            return calls
+        call, position = _parse_call_at(text, match, tools)
+        calls.append(call)
+
+def validate_tool_args(tool: Any, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    도구의 인자 스키마(args_schema)로 인자를 검증하고 변환된 인자를 반환합니다.
+    스키마에 없는 인자, 빠진 필수 인자, 타입이 맞지 않는 인자는 ToolArgumentError로 알립니다.
+    """
+    expected = tool.args
+    unknown = [key for key in args if key not in expected]
+    if unknown:
+        raise ToolArgumentError(f"도구 '{tool.name}'에 없는 인자입니다: {', '.join(unknown)} (사용 가능: {', '.join(expected) or '없음'})")
+    schema = tool.get_input_schema()
+    try:
+        validated = schema.model_validate(args)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+        raise ToolArgumentError(f"도구 '{tool.name}' 인자 검증 실패: {problems}")
+    # 호출자가 준 인자만 넘기고(기본값은 함수에 맡김), 값은 스키마로 변환된 값을 사용합니다.
+    return {key: getattr(validated, key) for key in args}
@@ -0,0 +1,136 @@
+# workspace_index.py
+
+# 에이전트 작업 공간(agent_workspace)의 파일 트리 인덱스(메모리 캐시) 모듈입니다.
+# - 작업 공간 전체를 한 번 훑어(os.scandir) 모든 파일/폴더의 (상대 경로, 종류, 크기, 수정 시각)을 경로순으로 저장합니다.
+# - list_workspace / search_workspace 도구는 매번 디렉토리를 다시 훑지 않고 이 인덱스를 사용합니다.
+# - 파일 도구(create_file, append_file, delete_file)가 작업 공간을 바꾸면 invalidate()로 인덱스를 버리고,
+#   다음 조회 때 다시 만듭니다. 도구 밖에서 파일이 바뀐 경우를 위해 WORKSPACE_INDEX_TTL_S가 지나도 다시 만듭니다.
+
+import bisect
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- 인덱스 설정값 정의 ---
+# WORKSPACE_INDEX_TTL_S (변수 - 사용자 정의): 인덱스를 다시 만들기 전까지 사용하는 시간(초)입니다.
+#   파일 도구의 변경은 즉시 반영되고, 이 값은 도구 밖(사용자가 직접 파일을 넣은 경우 등)의 변경에만 해당합니다.
+WORKSPACE_INDEX_TTL_S = 30
+# WORKSPACE_INDEX_MAX_ENTRIES (변수 - 사용자 정의): 인덱스에 넣을 최대 항목 수입니다. 넘으면 나머지는 인덱스에서 빠집니다.
+WORKSPACE_INDEX_MAX_ENTRIES = 100_000
+
+@dataclass(frozen=True)
+class WorkspaceEntry:
+    """작업 공간의 파일 또는 폴더 하나입니다. path는 작업 공간 기준 상대 경로('/' 구분)입니다."""
+    path: str
+    is_dir: bool
+    size: int
+    mtime: float
+
+class WorkspaceIndex:
+    """
+    스레드 안전한 작업 공간 트리 인덱스입니다.
+    (파일 도구는 asyncio.to_thread로 여러 스레드에서 동시에 호출되므로 잠금으로 보호합니다.)
+    """
+
+    def __init__(self, root: str, ttl_s: float = WORKSPACE_INDEX_TTL_S, max_entries: int = WORKSPACE_INDEX_MAX_ENTRIES):
+        self.root = root
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: Optional[List[WorkspaceEntry]] = None
+        # _paths (변수): _entries와 같은 순서의 경로 목록입니다. (bisect로 폴더 범위를 찾을 때 사용)
+        self._paths: List[str] = []
+        self._built_at = 0.0
+        self._truncated = False
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        self.invalidations = 0
+
+    def _scan(self) -> Tuple[List[WorkspaceEntry], bool]:
+        """작업 공간을 훑어 경로순으로 정렬된 항목 목록과, 최대 항목 수에 걸려 잘렸는지 여부를 반환합니다."""
+        root = os.path.abspath(self.root)
+        entries: List[WorkspaceEntry] = []
+        pending = [""]
+        while pending:
+            relative_dir = pending.pop()
+            try:
+                with os.scandir(os.path.join(root, relative_dir)) as iterator:
+                    items = list(iterator)
+            except OSError:
+                continue
+            for item in items:
+                # 심볼릭 링크는 작업 공간 밖을 가리킬 수 있으므로 건너뜁니다.
+                if item.is_symlink():
+                    continue
+                path = f"{relative_dir}/{item.name}" if relative_dir else item.name
+                try:
+                    stat = item.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = item.is_dir(follow_symlinks=False)
+                entries.append(WorkspaceEntry(path, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime))
+                if len(entries) >= self.max_entries:
+                    entries.sort(key=lambda entry: entry.path)
+                    return entries, True
+                if is_dir:
+                    pending.append(path)
+        entries.sort(key=lambda entry: entry.path)
+        return entries, False
+
+    def _current(self) -> List[WorkspaceEntry]:
+        """인덱스를 반환합니다. 없거나 TTL이 지났으면 다시 만듭니다. (잠금을 잡은 상태에서 호출)"""
+        if self._entries is None or time.monotonic() - self._built_at > self.ttl_s:
+            started = time.perf_counter()
+            self._entries, self._truncated = self._scan()
+            self._paths = [entry.path for entry in self._entries]
+            self._built_at = time.monotonic()
+            self.builds += 1
+            print(f"[WorkspaceIndex DEBUG] Indexed {len(self._entries)} entries in {(time.perf_counter() - started) * 1000:.1f}ms"
+                  + (" (truncated)" if self._truncated else ""))
+        else:
+            self.hits += 1
+        return self._entries
+
+    def list(self, directory: str = "", recursive: bool = True) -> Tuple[List[WorkspaceEntry], bool]:
+        """
+        directory(작업 공간 기준 상대 경로, ''는 루트) 아래의 항목을 경로순으로 반환합니다.
+        recursive=False이면 바로 아래 항목만 반환합니다. 두 번째 값은 인덱스가 최대 항목 수에 걸려 잘렸는지 여부입니다.
+        """
+        directory = directory.strip("/")
+        with self._lock:
+            entries = self._current()
+            truncated = self._truncated
+            if directory:
+                # 경로순 정렬에서 'dir/'로 시작하는 항목은 'dir/'부터 'dir0'('/' 다음 문자) 앞까지 연속해 있습니다.
+                start = bisect.bisect_left(self._paths, directory + "/")
+                end = bisect.bisect_left(self._paths, directory + "0")
+                entries = entries[start:end]
+        if not recursive:
+            depth = directory.count("/") + 1 if directory else 0
+            entries = [entry for entry in entries if entry.path.count("/") == depth]
+        return entries, truncated
+
+    def files(self, directory: str = "") -> List[WorkspaceEntry]:
+        """directory 아래의 모든 파일(폴더 제외)을 경로순으로 반환합니다."""
+        return [entry for entry in self.list(directory)[0] if not entry.is_dir]
+
+    def invalidate(self) -> None:
+        """인덱스를 버립니다. 다음 조회 때 다시 만듭니다. (파일 도구가 작업 공간을 바꾼 뒤 호출)"""
+        with self._lock:
+            if self._entries is not None:
+                self.invalidations += 1
+            self._entries = None
+            self._paths = []
+
+    def stats(self) -> Dict[str, Any]:
+        """인덱스 크기와 재생성/적중/무효화 횟수입니다."""
+        with self._lock:
+            return {
+                "entries": len(self._entries) if self._entries is not None else 0,
+                "truncated": self._truncated,
+                "builds": self.builds,
+                "hits": self.hits,
+                "invalidations": self.invalidations,
+            }